@@ -0,0 +1,99 @@
+"""
+Measures the per-command overhead of the wrapper's own logging, with logging set to WARNING and to INFO.
+
+* before: every command logged eagerly formatted f-strings through the module logger, filtered by the
+  stdlib logger only after structlog ran its processors (the original `_run_command`, reproduced below)
+* after: the level is checked once per command and the messages use deferred structured fields bound
+  to the session logger
+
+Siril is replaced by a producer answering each command with a `status: success` event, structlog is
+routed to the stdlib logging module (rendering to /dev/null) as in a typical application setup.
+
+    uv run benchmarks/command_logging.py
+"""
+
+import asyncio
+import logging
+import os
+import structlog
+import sys
+import time
+
+from async_siril import SirilCli
+from async_siril.event import SirilEvent, remove_pipe_directory
+
+COMMANDS = 5000
+
+logger = structlog.stdlib.get_logger("async_siril.siril")
+
+
+class InstantSiril:
+    """Stand-in for the producer, Siril completes every command as soon as it is sent"""
+
+    def __init__(self, queue: asyncio.Queue):
+        self._queue = queue
+        self.error = None
+
+    async def send(self, command: str):
+        self._queue.put_nowait(SirilEvent(f"status: success {command}"))
+
+
+class BeforeSiril(SirilCli):
+    """The command loop as it was, logging every step through the module logger"""
+
+    async def _run_command(self, _command: str, on_event=None, timeout=None):
+        logger.info(f"running command: '{_command}'")
+
+        started = time.monotonic()
+        deadline = self._deadline(timeout)
+        await self._producer.send(_command)
+
+        while True:
+            result = await self._next_event(_command, started, deadline)
+            self._consumer.queue.task_done()
+
+            if result.completed:
+                logger.info("result completed")
+                break
+        logger.info("Command completed")
+
+
+async def run(level: int, siril_type: type = SirilCli) -> float:
+    logging.getLogger().setLevel(level)
+    siril = siril_type(siril_exe=sys.executable)
+    siril._producer = InstantSiril(siril._consumer.queue)  # type: ignore
+
+    started = time.perf_counter()
+    for i in range(COMMANDS):
+        await siril.command(f"load image_{i:05d}.fit")
+    elapsed = time.perf_counter() - started
+
+    remove_pipe_directory(siril._pipe_dir)
+    return elapsed
+
+
+def report(name: str, elapsed: float, count: int):
+    print(f"{name:<24} {elapsed * 1000:9.1f} ms total {elapsed / count * 1e6:9.2f} us/command")
+
+
+async def main():
+    logging.basicConfig(stream=open(os.devnull, "w"), format="%(message)s")
+    structlog.configure(
+        processors=[
+            structlog.processors.add_log_level,
+            structlog.processors.TimeStamper(fmt="iso"),
+            structlog.dev.ConsoleRenderer(colors=False),
+        ],
+        wrapper_class=structlog.stdlib.BoundLogger,
+        logger_factory=structlog.stdlib.LoggerFactory(),
+    )
+
+    print(f"running {COMMANDS} commands")
+    report("before (WARNING)", await run(logging.WARNING, BeforeSiril), COMMANDS)
+    report("before (INFO)", await run(logging.INFO, BeforeSiril), COMMANDS)
+    report("after (WARNING)", await run(logging.WARNING), COMMANDS)
+    report("after (INFO)", await run(logging.INFO), COMMANDS)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,103 @@
+"""
+Measures the cost of turning Siril output lines into events, on a recorded-like stream of logs and progress.
+
+* before: every line is matched against the regexes of its kind when the event is created
+* after: the kind is found with `str.partition`, fields are parsed (without regexes) on first access only
+
+Each event is created then checked for completion, as the consumer and `SirilCli` do for every line.
+
+    uv run benchmarks/event_parsing.py
+"""
+
+import re
+import time
+import tracemalloc
+import typing as t
+
+from async_siril.event import SirilEvent
+
+LINES = 200_000
+ROUNDS = 5
+
+
+class RegexSirilEvent:
+    """The original regex based event, kept here for comparison"""
+
+    def __init__(self, raw_string: str):
+        self.status: t.Optional[str] = None
+        self.message: t.Optional[str] = None
+        self.progress: t.Optional[int] = 0
+        self._raw_string = raw_string
+
+        if raw_string.startswith("status:"):
+            self.value = "status"
+            matches = re.match(r"status\:\s(\S*)\s(.*)", raw_string)
+            if matches:
+                self.status = matches.group(1) or None
+                self.message = matches.group(2) or None
+        elif raw_string.startswith("progress:"):
+            self.value = "progress"
+            matches = re.match(r"progress\:\s(\d*)", raw_string)
+            self.progress = int(matches.group(1)) if matches and matches.group(1) else None
+        elif raw_string.startswith("log:"):
+            self.value = "log"
+            matches = re.match(r"log\:\s(.*)", raw_string)
+            self.message = matches.group(1) or None if matches else None
+        elif raw_string == "ready":
+            self.value = "status"
+            self.status = "ready"
+        else:
+            self.value = "log"
+            self.message = raw_string
+
+    @property
+    def completed(self) -> bool:
+        return self.status in ["success", "error", "exit"]
+
+
+def stream(count: int) -> list[str]:
+    """Mostly logs and progress, with the status of a command every 100 lines"""
+    lines = []
+    for i in range(count):
+        if i % 100 == 99:
+            lines.append("status: success register")
+        elif i % 3 == 0:
+            lines.append(f"progress: {i % 100}%")
+        else:
+            lines.append(f"log: Reading image {i:06d}: 4144x2822 pixels, 1 channel, 16 bits")
+    return lines
+
+
+def parse(event_type: type, lines: list[str]) -> float:
+    best = float("inf")
+    for _ in range(ROUNDS):
+        started = time.perf_counter()
+        for line in lines:
+            event_type(line).completed
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def memory(event_type: type, lines: list[str]) -> int:
+    """Bytes held by the events of the stream (as when they pile up in the consumer queue)"""
+    tracemalloc.start()
+    events = [event_type(line) for line in lines]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del events
+    return size
+
+
+def report(name: str, elapsed: float, size: int, count: int):
+    print(f"{name:<24} {elapsed * 1000:9.1f} ms {elapsed / count * 1e9:7.0f} ns/line {size / count:6.0f} B/event")
+
+
+def main():
+    lines = stream(LINES)
+    print(f"parsing {LINES} lines")
+    report("before (regex)", parse(RegexSirilEvent, lines), memory(RegexSirilEvent, lines), LINES)
+    report("after (partition, lazy)", parse(SirilEvent, lines), memory(SirilEvent, lines), LINES)
+
+
+if __name__ == "__main__":
+    main()
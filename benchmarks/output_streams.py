@@ -0,0 +1,66 @@
+"""
+Measures the cost of handling the stdout of the Siril process in each `StreamMode`.
+
+* before: every line is read with `readline`, decoded and logged at INFO on its own
+* after: chunks are read and their complete lines decoded at once, then kept in the ring and logged per mode
+
+The stream is fed in memory and logs are rendered to /dev/null, so only the wrapper is measured.
+
+    uv run benchmarks/output_streams.py
+"""
+
+import asyncio
+import logging
+import os
+import structlog
+import time
+
+from async_siril.output import OutputPolicy, OutputRing, StreamMode, read_stream
+
+LINES = 100_000
+
+logger = structlog.stdlib.get_logger("async_siril")
+
+
+def stream_of(data: bytes) -> asyncio.StreamReader:
+    stream = asyncio.StreamReader()
+    stream.feed_data(data)
+    stream.feed_eof()
+    return stream
+
+
+async def before(data: bytes) -> float:
+    stream = stream_of(data)
+    started = time.perf_counter()
+    while True:
+        line = await stream.readline()
+        if not line:
+            break
+        logger.info("siril_output", stream="stdout", message=line.decode().rstrip())
+    return time.perf_counter() - started
+
+
+async def after(data: bytes, mode: StreamMode) -> float:
+    stream = stream_of(data)
+    started = time.perf_counter()
+    await read_stream(stream, "stdout", OutputPolicy(mode=mode), OutputRing())
+    return time.perf_counter() - started
+
+
+def report(name: str, elapsed: float, count: int):
+    print(f"{name:<24} {elapsed * 1000:9.1f} ms total {elapsed / count * 1e9:7.0f} ns/line")
+
+
+async def main():
+    logging.basicConfig(stream=open(os.devnull, "w"), level=logging.INFO)
+    structlog.configure(logger_factory=structlog.stdlib.LoggerFactory())
+
+    data = b"".join(f"log: Reading image {i:06d}: 4144x2822 pixels, 16 bits\n".encode() for i in range(LINES))
+    print(f"handling {LINES} lines")
+    report("before (readline + log)", await before(data), LINES)
+    for mode in [StreamMode.FULL, StreamMode.SAMPLED, StreamMode.RING]:
+        report(f"after ({mode.value})", await after(data, mode), LINES)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
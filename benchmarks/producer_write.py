@@ -0,0 +1,94 @@
+"""
+Measures the per-command overhead of writing commands to the Siril input fifo.
+
+* before: one executor `write` + `flush` round trip per command (the original producer path)
+* after: the producer drains its queue and writes each batch with a single non-blocking `os.write`
+
+A thread stands in for Siril by draining the fifo. Linux only.
+
+    uv run benchmarks/producer_write.py
+"""
+
+import asyncio
+import os
+import threading
+import time
+
+from async_siril.event import AsyncSirilCommandProducer, PipeClient, PipeMode, remove_pipe_directory
+from async_siril.event import session_pipe_directory
+
+COMMANDS = 5000
+
+
+def drain(path: str, stop: threading.Event):
+    """Stand-in for Siril reading its input pipe"""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        while not stop.is_set() and os.read(fd, 65536):
+            pass
+    finally:
+        os.close(fd)
+
+
+def start_drain(path: str) -> threading.Event:
+    stop = threading.Event()
+    threading.Thread(target=drain, args=(path, stop), daemon=True).start()
+    return stop
+
+
+async def before(commands: list[str]) -> float:
+    directory = session_pipe_directory()
+    assert directory is not None
+    client = PipeClient(PipeMode.WRITE, directory=directory, nonblocking=False)
+    client.create()
+    stop = start_drain(client.path)
+    await client.connect()
+
+    started = time.perf_counter()
+    for command in commands:
+        await client.write_line(command)
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    client.close()
+    remove_pipe_directory(directory)
+    return elapsed
+
+
+async def after(commands: list[str], sequential: bool) -> float:
+    directory = session_pipe_directory()
+    producer = AsyncSirilCommandProducer(pipe_dir=directory)
+    producer.start()
+    stop = start_drain(producer.pipe_path)
+    # Wait for the producer to open the fifo
+    while producer._pipe._fd is None and producer._pipe._file is None:
+        await asyncio.sleep(0.001)
+
+    started = time.perf_counter()
+    for command in commands:
+        await producer.send(command)
+        if sequential:
+            await producer._queue.join()
+    await producer._queue.join()
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await producer.stop()
+    remove_pipe_directory(directory)
+    return elapsed
+
+
+def report(name: str, elapsed: float, count: int):
+    print(f"{name:<32} {elapsed * 1000:9.1f} ms total {elapsed / count * 1e6:9.2f} us/command")
+
+
+async def main():
+    commands = [f"load image_{i:05d}.fit" for i in range(COMMANDS)]
+    print(f"writing {COMMANDS} commands")
+    report("before (executor write+flush)", await before(commands), COMMANDS)
+    report("after (one command at a time)", await after(commands, sequential=True), COMMANDS)
+    report("after (queued batch)", await after(commands, sequential=False), COMMANDS)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,6 +1,39 @@
+from .admission import MemoryAdmission
+from .cache import SirilCache
 from .conversion_file import ConversionFile, ConversionEntry
+from .event import EventQueuePolicy
 from .helpers import BestRejection
-from .resources import SirilResource
-from .siril import SirilCli, SirilError
+from .output import OutputPolicy, StreamMode
+from .pressure import PressureMonitor, PressureThresholds
+from .resources import SirilResource, WorkerPlan
+from .siril import SirilCli, SirilError, SirilTimeoutError, SirilCrashError
+from .supervisor import RestartPolicy
+from .scheduler import Priority
+from .threads import ThreadPolicy, ThreadTable
+from .pool import SirilPool
+from .client import SirilClient
 
-__all__ = ["ConversionFile", "ConversionEntry", "BestRejection", "SirilResource", "SirilCli", "SirilError"]
+__all__ = [
+    "MemoryAdmission",
+    "SirilCache",
+    "ConversionFile",
+    "ConversionEntry",
+    "EventQueuePolicy",
+    "BestRejection",
+    "OutputPolicy",
+    "StreamMode",
+    "PressureMonitor",
+    "PressureThresholds",
+    "SirilResource",
+    "WorkerPlan",
+    "SirilCli",
+    "SirilError",
+    "SirilTimeoutError",
+    "SirilCrashError",
+    "RestartPolicy",
+    "Priority",
+    "ThreadPolicy",
+    "ThreadTable",
+    "SirilPool",
+    "SirilClient",
+]
@@ -0,0 +1,198 @@
+from __future__ import annotations
+
+import asyncio
+import collections
+import contextlib
+import itertools
+import structlog.stdlib
+import time
+import typing as t
+
+from dataclasses import dataclass
+from .command_types import SirilSetting, stack_type
+from .pressure import PressureMonitor
+from .system import available_memory, container_aware_memory_limit_bytes, human_readable_byte_size, total_memory
+
+
+logger = structlog.stdlib.get_logger("async_siril.admission")
+
+GB = 1024 * 1024 * 1024
+
+# Memory used by an idle Siril process (libraries, caches, gui-less state)
+SIRIL_BASE_MEMORY = 256 * 1024 * 1024
+
+
+@dataclass
+class MemorySettings:
+    """The Siril settings that change how much memory a job uses"""
+
+    # 0 = use `mem_ratio` of the available memory, 1 = use a fixed `mem_amount_gb`
+    mem_mode: int = 0
+
+    # Ratio of the available memory Siril allows itself to use with `mem_mode` 0
+    mem_ratio: float = 0.9
+
+    # Memory (in GB) Siril allows itself to use with `mem_mode` 1
+    mem_amount_gb: t.Optional[float] = None
+
+    # Bits per channel of the images processed (32 with `set32bits`, 16 with `set16bits`)
+    bit_depth: int = 32
+
+    @staticmethod
+    def from_settings(settings: t.Dict[str, str]) -> MemorySettings:
+        """Read the settings from `get -a` values (like `SirilCli.settings_snapshot`)"""
+        result = MemorySettings()
+        if SirilSetting.MEM_MODE.value in settings:
+            result.mem_mode = int(settings[SirilSetting.MEM_MODE.value])
+        if SirilSetting.MEM_RATIO.value in settings:
+            result.mem_ratio = float(settings[SirilSetting.MEM_RATIO.value])
+        if SirilSetting.MEM_AMOUNT.value in settings:
+            result.mem_amount_gb = float(settings[SirilSetting.MEM_AMOUNT.value])
+        if SirilSetting.FORCE_16BIT.value in settings:
+            result.bit_depth = 16 if settings[SirilSetting.FORCE_16BIT.value].lower() == "true" else 32
+        return result
+
+    @property
+    def bytes_per_sample(self) -> int:
+        return 2 if self.bit_depth == 16 else 4
+
+    def siril_limit(self) -> int:
+        """Returns the memory (in bytes) Siril allows itself to use for one job"""
+        if self.mem_mode == 1 and self.mem_amount_gb is not None:
+            return int(self.mem_amount_gb * GB)
+        return int(available_memory() * self.mem_ratio)
+
+
+def estimate_stack_memory(
+    frames: int,
+    width: int,
+    height: int,
+    channels: int = 1,
+    method: stack_type = stack_type.STACK_REJ,
+    threads: int = 1,
+    settings: t.Optional[MemorySettings] = None,
+) -> int:
+    """
+    Estimate the peak memory (in bytes) of a `stack` of `frames` images of `width` x `height` x `channels`.
+
+    Sum, min and max stacking stream the frames through an accumulator. Median and rejection stacking load the
+    whole stack when it fits in the Siril memory limit and otherwise split it into blocks of rows (at least one
+    row of every frame for each thread).
+    """
+    settings = settings or MemorySettings()
+    sample = settings.bytes_per_sample
+    pixels = width * height * channels
+    result = pixels * 4
+
+    if method in (stack_type.STACK_SUM, stack_type.STACK_MIN, stack_type.STACK_MAX):
+        # A double precision accumulator plus the frames being read by each thread
+        return SIRIL_BASE_MEMORY + pixels * 8 + result + pixels * sample * threads
+
+    whole_stack = frames * pixels * sample
+    smallest_block = frames * width * channels * sample * threads
+    stack = min(whole_stack, max(settings.siril_limit(), smallest_block))
+    return SIRIL_BASE_MEMORY + result + stack
+
+
+def estimate_register_memory(
+    width: int,
+    height: int,
+    channels: int = 1,
+    threads: int = 1,
+    settings: t.Optional[MemorySettings] = None,
+) -> int:
+    """Estimate the peak memory (in bytes) of a `register`, each thread holds an image and its transform"""
+    settings = settings or MemorySettings()
+    pixels = width * height * channels
+    reference = pixels * settings.bytes_per_sample
+    return SIRIL_BASE_MEMORY + reference + threads * 2 * pixels * 4
+
+
+class MemoryAdmission(object):
+    """
+    Admits memory hungry jobs (like `stack` and `register`) only while their estimated memory fits, so running
+    several in parallel queues them instead of getting the container OOM-killed.
+
+    A job is admitted when the reserved memory of the running jobs plus its own stays within `capacity`
+    (defaults to the cgroup memory limit, or the total memory) and `system.available_memory()` can hold it.
+    Jobs are admitted in FIFO order and a job is always admitted when nothing else is running, so one larger
+    than the capacity still runs (alone). Available memory is re-checked every `poll_interval` seconds.
+    With a `PressureMonitor` no other job is admitted while the container is under memory pressure.
+    """
+
+    def __init__(
+        self,
+        capacity: t.Optional[int] = None,
+        poll_interval: float = 1.0,
+        pressure: t.Optional[PressureMonitor] = None,
+    ):
+        self.capacity = capacity if capacity is not None else (container_aware_memory_limit_bytes() or total_memory())
+        self.poll_interval = poll_interval
+        self.pressure = pressure
+        self._reserved = 0
+        self._running = 0
+        self._queue: collections.deque[int] = collections.deque()
+        self._tickets = itertools.count()
+        self._condition = asyncio.Condition()
+
+    @property
+    def reserved(self) -> int:
+        """Returns the memory (in bytes) reserved by the running jobs"""
+        return self._reserved
+
+    @property
+    def running(self) -> int:
+        """Returns the number of admitted jobs"""
+        return self._running
+
+    @property
+    def waiting(self) -> int:
+        """Returns the number of jobs waiting to be admitted"""
+        return len(self._queue)
+
+    def fits(self, memory: int) -> bool:
+        """Whether a job needing `memory` bytes can be admitted now"""
+        if self._running == 0:
+            return True
+        if self.pressure is not None and self.pressure.memory_pressure:
+            return False
+        return self._reserved + memory <= self.capacity and memory <= available_memory()
+
+    @contextlib.asynccontextmanager
+    async def reserve(self, memory: int) -> t.AsyncIterator[float]:
+        """Wait until `memory` bytes can be reserved for the `async with` block, yields the seconds waited"""
+        started = time.perf_counter()
+        await self._admit(memory)
+        try:
+            yield time.perf_counter() - started
+        finally:
+            async with self._condition:
+                self._reserved -= memory
+                self._running -= 1
+                self._condition.notify_all()
+
+    async def _admit(self, memory: int):
+        async with self._condition:
+            ticket = next(self._tickets)
+            self._queue.append(ticket)
+            try:
+                while self._queue[0] != ticket or not self.fits(memory):
+                    logger.debug(
+                        "Waiting to reserve %s (%s reserved by %d jobs)",
+                        human_readable_byte_size(memory),
+                        human_readable_byte_size(self._reserved),
+                        self._running,
+                    )
+                    try:
+                        await asyncio.wait_for(self._condition.wait(), timeout=self.poll_interval)
+                    except asyncio.TimeoutError:
+                        pass
+            finally:
+                self._queue.remove(ticket)
+                # The next job in line may fit now
+                self._condition.notify_all()
+
+            if memory > self.capacity:
+                logger.warning(f"Job needs {human_readable_byte_size(memory)}, more than the memory capacity")
+            self._reserved += memory
+            self._running += 1
@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import asyncio
+import asyncio.subprocess
+import json
+import os
+import structlog.stdlib
+import sys
+import typing as t
+from pathlib import Path
+
+
+logger = structlog.stdlib.get_logger("async_siril.cache")
+
+
+def default_cache_directory() -> Path:
+    """Returns the per user cache directory used when persisting to disk"""
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA", os.path.expanduser("~/AppData/Local"))
+    else:
+        base = os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache"))
+    return Path(base) / "async_siril"
+
+
+def write_json(path: Path, data: t.Any):
+    """Write `data` as json through a temporary file replaced at once, so readers never see a partial file"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    with open(temp_path, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(temp_path, path)
+
+
+def read_json(path: Path, name: str) -> t.Dict[str, t.Any]:
+    """Read a json object saved by `write_json`, empty when the file is missing or unreadable (logged)"""
+    try:
+        with open(path) as f:
+            entries = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not read {name} {path}: {e}")
+        return {}
+    return entries if isinstance(entries, dict) else {}
+
+
+class SirilCache:
+    """
+    Caches values probed from a Siril executable (like its version) keyed by the executable path and
+    modification time, so upgrading Siril invalidates the entries. Values are always kept in memory
+    and optionally persisted as json in `directory` when `persist` is enabled.
+    """
+
+    FILE_NAME = "siril_cache.json"
+
+    def __init__(self, persist: bool = False, directory: t.Optional[Path] = None):
+        self.persist = persist
+        self.directory = directory or default_cache_directory()
+        self._entries: t.Dict[str, t.Dict[str, t.Any]] = {}
+        self._loaded = False
+
+    @property
+    def path(self) -> Path:
+        """Returns the path of the json file used when persisting to disk"""
+        return self.directory / self.FILE_NAME
+
+    @staticmethod
+    def executable_key(siril_exe: str) -> str:
+        """Returns the cache key for an executable (resolved path and modification time)"""
+        path = os.path.realpath(siril_exe)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            mtime = 0
+        return f"{path}:{mtime}"
+
+    def get(self, siril_exe: str, name: str) -> t.Optional[t.Any]:
+        """Get a cached value for the executable or `None`"""
+        self._load()
+        return self._entries.get(self.executable_key(siril_exe), {}).get(name)
+
+    def set(self, siril_exe: str, name: str, value: t.Any):
+        """Cache a value for the executable"""
+        self._load()
+        self._entries.setdefault(self.executable_key(siril_exe), {})[name] = value
+        self._save()
+
+    def clear(self):
+        """Remove all the cached values (and the file on disk when persisting)"""
+        self._entries = {}
+        if self.persist and self.path.exists():
+            self.path.unlink()
+
+    def _load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        if self.persist:
+            self._entries.update(read_json(self.path, "Siril cache"))
+
+    def _save(self):
+        if not self.persist:
+            return
+
+        try:
+            write_json(self.path, self._entries)
+        except OSError as e:
+            logger.warning(f"Could not write Siril cache {self.path}: {e}")
+
+
+# Shared in memory cache used by default by every `SirilCli`
+default_cache = SirilCache()
+
+# Version probes currently running, so concurrent starts share one process spawn
+_pending_probes: t.Dict[str, asyncio.Task] = {}
+
+
+async def probe_version(siril_exe: str, cache: SirilCache = default_cache) -> str:
+    """Get the version of a Siril executable with `--version`, only spawning a process on a cache miss"""
+    version = cache.get(siril_exe, "version")
+    if version is not None:
+        return version
+
+    key = SirilCache.executable_key(siril_exe)
+    task = _pending_probes.get(key)
+    if task is None or task.get_loop() is not asyncio.get_running_loop():
+        task = asyncio.create_task(_run_version_probe(siril_exe))
+        _pending_probes[key] = task
+        task.add_done_callback(lambda _: _pending_probes.pop(key, None))
+
+    version = await asyncio.shield(task)
+    cache.set(siril_exe, "version", version)
+    return version
+
+
+async def _run_version_probe(siril_exe: str) -> str:
+    logger.debug("Probing version of %s", siril_exe)
+    process = await asyncio.create_subprocess_exec(siril_exe, "--version", stdout=asyncio.subprocess.PIPE)
+    response, _ = await process.communicate()
+    return response.decode().rstrip()
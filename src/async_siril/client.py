@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import asyncio
+import itertools
+import json
+import structlog.stdlib
+import typing as t
+
+from .command import BaseCommand
+from .scheduler import Priority
+from .server import decode_result, default_socket_path, encode_message
+from .siril import CommandResult, SirilError
+
+
+logger = structlog.stdlib.get_logger("async_siril.client")
+
+
+class SirilClient(object):
+    """
+    Thin client for a warm Siril session kept alive by `async-siril serve`, without paying for the Siril
+    process startup on every run. `command()` takes the `pipelined`, `timeout`, `priority` and `memory`
+    arguments of `SirilCli.command` and returns its `CommandResult` (the usage without samples), the events
+    of the commands (`on_event`, `submit`) are not sent over the socket.
+
+    async with SirilClient() as siril:
+        await siril.command("stack")
+    """
+
+    def __init__(self, socket_path: t.Optional[str] = None):
+        self.socket_path = socket_path or default_socket_path()
+        self._reader: t.Optional[asyncio.StreamReader] = None
+        self._writer: t.Optional[asyncio.StreamWriter] = None
+        self._ids = itertools.count(1)
+        self._lock = asyncio.Lock()
+
+    async def start(self):
+        """Connect to the server (waits for a free worker when the first command is sent)"""
+        self._reader, self._writer = await asyncio.open_unix_connection(self.socket_path)
+        logger.info("Connected to Siril server %s", self.socket_path)
+
+    async def stop(self):
+        """Disconnect from the server, the worker stays warm for the next client"""
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except ConnectionError:
+                pass
+        self._reader = None
+        self._writer = None
+        logger.info("Disconnected from Siril server")
+
+    async def command(
+        self,
+        cmd: t.Union[str, t.List[str], BaseCommand, t.List[BaseCommand]],
+        pipelined: bool = False,
+        timeout: t.Optional[float] = None,
+        priority: int = Priority.NORMAL,
+        memory: t.Optional[int] = None,
+    ) -> CommandResult:
+        """Will run a command on the server's Siril session and throw `SirilError`'s as it sees them."""
+        if isinstance(cmd, list):
+            commands: t.Union[str, t.List[str]] = [str(c) for c in cmd]
+        else:
+            commands = str(cmd)
+
+        if commands == "exit":
+            await self.stop()
+            return CommandResult(commands=["exit"], priority=priority)
+
+        request: t.Dict[str, t.Any] = {"command": commands, "pipelined": pipelined}
+        if timeout is not None:
+            request["timeout"] = timeout
+        if priority != Priority.NORMAL:
+            request["priority"] = int(priority)
+        if memory is not None:
+            request["memory"] = memory
+        response = await self._request(request)
+        return decode_result(
+            response.get("result") or {"commands": commands if isinstance(commands, list) else [commands]}
+        )
+
+    async def failable_command(self, cmd: t.Union[str, BaseCommand]) -> bool:
+        """Will run a command on the server and return a bool result if successful (catching any errors)"""
+        try:
+            await self.command(cmd)
+            return True
+        except SirilError as siril_error:
+            logger.warn(f"Error caught by failable_command: {str(siril_error)}")
+            return False
+
+    async def _request(self, request: t.Dict[str, t.Any]) -> t.Dict[str, t.Any]:
+        if self._reader is None or self._writer is None:
+            raise RuntimeError("Client not connected")
+
+        async with self._lock:
+            request["id"] = next(self._ids)
+            self._writer.write(encode_message(request))
+            await self._writer.drain()
+
+            line = await self._reader.readline()
+            if not line:
+                raise ConnectionError("Siril server closed the connection")
+
+        response = json.loads(line)
+        if not response.get("ok"):
+            error = response.get("error") or {}
+            raise SirilError(error.get("command", ""), error.get("message", ""))
+        return response
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.stop()
@@ -2,62 +2,114 @@ import asyncio
 import structlog.stdlib
 import typing as t
 import os
-import re
+import shutil
 import sys
+import tempfile
+import uuid
+from dataclasses import dataclass
 from enum import Enum
 
 logger = structlog.stdlib.get_logger("async_siril")
 
 
+def _leading_int(text: str) -> t.Optional[int]:
+    """Returns the integer the text starts with, None when it doesn't start with a digit"""
+    digits = text[:-1] if text.endswith("%") else text
+    if not digits.isdecimal():
+        end = 0
+        while end < len(text) and text[end].isdecimal():
+            end += 1
+        digits = text[:end]
+    return int(digits) if digits else None
+
+
 class SirilEvent:
     """
     Represents an event from the Siril CLI
+
+    Events are created for every line Siril writes so they are kept small (`__slots__`): only the kind of
+    event is found up front from its prefix, the status, message and progress are parsed on first access.
     """
 
     LOG = "log"
     PROGRESS = "progress"
     STATUS = "status"
 
+    _PREFIXES = {"status": STATUS, "progress": PROGRESS, "log": LOG}
+
+    __slots__ = ("value", "_raw_string", "_offset", "_parsed", "_status", "_message", "_progress")
+
     def __init__(self, raw_string: str):
-        self.status = None
-        self.message = None
-        self.progress = 0
         self._raw_string = raw_string
-
-        if raw_string.startswith("status:"):
-            self.value = SirilEvent.STATUS
-            self._parse_status_output()
-        elif raw_string.startswith("progress:"):
-            self.value = SirilEvent.PROGRESS
-            self._parse_progress_output()
-        elif raw_string.startswith("log:"):
-            self.value = SirilEvent.LOG
-            self._parse_log_output()
-        elif raw_string == "ready":
-            self.value = SirilEvent.STATUS
-            self._parse_ready_output()
+        self._parsed = False
+
+        # Only the prefix is looked at, where the fields start is kept to parse them on access
+        kind, separator, _ = raw_string.partition(":")
+        value = self._PREFIXES.get(kind) if separator else None
+        if value is not None:
+            self.value = value
+            self._offset: t.Optional[int] = len(kind) + 1
         else:
-            self.value = SirilEvent.LOG
-            self.message = raw_string
+            # `ready` is a status without prefix, anything unrecognized is logged as is
+            self.value = SirilEvent.STATUS if raw_string == "ready" else SirilEvent.LOG
+            self._offset = None
 
     def __str__(self):
         return self._raw_string
 
-    def _parse_status_output(self):
-        matches = re.search(r"status\:\s(\S*)\s(.*)", self._raw_string)
-        self.status = matches.group(1) if matches and matches.group(1) else None
-        self.message = matches.group(2) if matches and matches.group(2) else None
+    @property
+    def status(self) -> t.Optional[str]:
+        if self.value != SirilEvent.STATUS:
+            return None
+        if not self._parsed:
+            self._parse()
+        return self._status
 
-    def _parse_log_output(self):
-        matches = re.search(r"log\:\s(.*)", self._raw_string)
-        self.message = matches.group(1) if matches and matches.group(1) else None
+    @property
+    def message(self) -> t.Optional[str]:
+        if not self._parsed:
+            self._parse()
+        return self._message
 
-    def _parse_progress_output(self):
-        matches = re.search(r"progress\:\s(\d*)", self._raw_string)
-        self.progress = int(matches.group(1)) if matches and matches.group(1) else None
+    @property
+    def progress(self) -> t.Optional[int]:
+        if not self._parsed:
+            self._parse()
+        return self._progress
+
+    def _parse(self):
+        self._parsed = True
+        self._status: t.Optional[str] = None
+        self._message: t.Optional[str] = None
+        self._progress: t.Optional[int] = 0
+
+        offset = self._offset
+        if offset is None:
+            if self.value == SirilEvent.STATUS:
+                self._status = self._raw_string
+            else:
+                self._message = self._raw_string
+            return
 
-    def _parse_ready_output(self):
-        self.status = self._raw_string
+        # The prefix is followed by a single whitespace, nothing is parsed without it
+        raw_string = self._raw_string
+        if not raw_string[offset : offset + 1].isspace():
+            if self.value == SirilEvent.PROGRESS:
+                self._progress = None
+            return
+
+        text = raw_string[offset + 1 :]
+        if self.value == SirilEvent.STATUS:
+            # `status: <status> <message>`
+            status, separator, message = text.partition(" ")
+            if separator:
+                self._status = status or None
+                self._message = message or None
+        elif self.value == SirilEvent.PROGRESS:
+            # `progress: <digits>` usually followed by `%`
+            self._progress = _leading_int(text)
+        else:
+            self._message = text or None
 
     @property
     def completed(self) -> bool:
@@ -71,19 +123,108 @@ class SirilEvent:
     def siril_ready(self) -> bool:
         return self.status == "ready"
 
+    @property
+    def closed(self) -> bool:
+        return self.status == "closed"
+
+    @staticmethod
+    def pipe_closed(message: str = "Siril closed its output pipe") -> "SirilEvent":
+        """The event queued when a fifo pipe to Siril closes (the consumer's at EOF, the producer's once writes fail)"""
+        return SirilEvent(f"status: closed {message}")
+
+
+@dataclass
+class EventQueuePolicy:
+    """How the queue of events read from Siril stays bounded when they are consumed slower than they arrive"""
+
+    # Queue size past which log events are sampled and progress events dropped (status events never are)
+    high_water: int = 10000
+
+    # Past the high-water mark keep one log event out of `log_sample` (0 drops them all)
+    log_sample: int = 0
+
+    # Queue size past which every log and progress event is dropped, even sampled ones
+    max_size: int = 20000
+
+    # Replace a progress event still waiting at the end of the queue with the newer one
+    coalesce_progress: bool = True
+
+
+@dataclass
+class EventQueueStats:
+    """Counters of the events a `SirilEventQueue` didn't queue as they arrived"""
+
+    # Log (or progress) events dropped past the high-water mark
+    dropped: int = 0
+
+    # Progress events replaced by a newer one before being consumed
+    coalesced: int = 0
+
+    # Log events kept by sampling past the high-water mark
+    sampled: int = 0
+
+    # Largest queue size seen
+    peak_size: int = 0
+
+
+class SirilEventQueue(asyncio.Queue):
+    """
+    The queue of `SirilEvent`s read from Siril, bounded by its `EventQueuePolicy`: status events are always
+    queued, consecutive progress events are coalesced and log events past the high-water mark are sampled
+    (progress events dropped) up to `max_size`. What happened to the events is counted in `stats`.
+    """
+
+    def __init__(self, policy: t.Optional[EventQueuePolicy] = None, stats: t.Optional[EventQueueStats] = None):
+        super().__init__()
+        self.policy = policy or EventQueuePolicy()
+        self.stats = stats or EventQueueStats()
+        self._logs_past_high_water = 0
+
+    def put_nowait(self, item: SirilEvent):
+        policy = self.policy
+        size = self.qsize()
+        if item.value == SirilEvent.PROGRESS and size:
+            tail = self._queue[-1]  # type: ignore[attr-defined]
+            if policy.coalesce_progress and tail.value == SirilEvent.PROGRESS:
+                self._queue[-1] = item  # type: ignore[attr-defined]
+                self.stats.coalesced += 1
+                return
+
+        if item.value != SirilEvent.STATUS and size >= policy.high_water:
+            if item.value == SirilEvent.LOG and size < policy.max_size and self._sample_log():
+                self.stats.sampled += 1
+            else:
+                self.stats.dropped += 1
+                return
+
+        super().put_nowait(item)
+        self.stats.peak_size = max(self.stats.peak_size, size + 1)
+
+    def _sample_log(self) -> bool:
+        self._logs_past_high_water += 1
+        return self.policy.log_sample > 0 and self._logs_past_high_water % self.policy.log_sample == 0
+
 
 class AsyncSirilEventConsumer:
     """
     Represents the async reader of events from the Siril CLI
     """
 
-    def __init__(self):
+    def __init__(
+        self,
+        pipe_dir: t.Optional[str] = None,
+        policy: t.Optional[EventQueuePolicy] = None,
+        stats: t.Optional[EventQueueStats] = None,
+        log: t.Optional[t.Any] = None,
+    ):
         self._loop = asyncio.get_event_loop()
-        self.queue = asyncio.Queue()
+        self._logger = log or logger
+        self.queue: asyncio.Queue = SirilEventQueue(policy, stats)
         self.fifo_closed = self._loop.create_future()
+        self.pipe_opened = self._loop.create_future()
         self.siril_ready = self._loop.create_future()
         self._running = False
-        self._pipe = PipeClient(mode=PipeMode.READ)
+        self._pipe = PipeClient(mode=PipeMode.READ, directory=pipe_dir)
 
     @property
     def pipe_path(self):
@@ -92,6 +233,7 @@ class AsyncSirilEventConsumer:
 
     def start(self):
         """Return a task that runs the consumer loop in the background."""
+        self._pipe.create()
         self._running = True
         self._task = asyncio.create_task(self._run(), name=type(self).__name__)
         return self._task
@@ -99,24 +241,24 @@ class AsyncSirilEventConsumer:
     async def stop(self):
         """Gracefully stop the background reader."""
         if self._running:
-            logger.info("Stopping consumer fifo pipe")
+            self._logger.info("Stopping consumer fifo pipe")
             self._running = False
 
         if self._task:
-            logger.info("Cancelling consumer task")
+            self._logger.info("Cancelling consumer task")
             self._task.cancel()
             try:
                 await asyncio.wait_for(self._task, timeout=1.0)
             except asyncio.TimeoutError:
-                logger.warning("Consumer task did not cancel in time")
+                self._logger.warning("Consumer task did not cancel in time")
             except asyncio.CancelledError:
                 pass
             except Exception as e:
-                logger.warning(f"Error stopping consumer task: {e}")
+                self._logger.warning("Error stopping consumer task", error=str(e))
 
         if self._pipe:
             self._pipe.close()
-        logger.info("Consumer stopped")
+        self._logger.info("Consumer stopped")
 
     async def _run(self):
         """Main consumer loop that waits for writers and reads FIFO."""
@@ -124,25 +266,28 @@ class AsyncSirilEventConsumer:
             return
 
         try:
-            logger.debug(f"consumer path: {self._pipe.path}")
-            logger.debug(f"consumer readable: {True}")
-            logger.debug(f"consumer writable: {False}")
+            self._logger.debug("consumer pipe", path=self._pipe.path, readable=True, writable=False)
 
             # Wait for the client to connect and create a stream (blocking)
             await self._pipe.connect()
 
-            logger.info("Consumer fifo pipe opened")
+            self._logger.info("Consumer fifo pipe opened")
+            if not self.pipe_opened.done():
+                self.pipe_opened.set_result(None)
 
             async for event in self._aiter_events():
                 if event.siril_ready:
-                    logger.info("Consumer received ready event")
+                    self._logger.info("Consumer received ready event")
                     self.siril_ready.set_result(None)
                 else:
                     self.queue.put_nowait(event)
 
-            logger.info("EOF from the consumer")
+            self._logger.info("EOF from the consumer")
+            # Let anyone waiting on a command know that Siril is gone
+            if self._running and self.fifo_closed.done():
+                self.queue.put_nowait(SirilEvent.pipe_closed())
         except Exception as e:
-            logger.info(f"Error in consumer task: {e}")
+            self._logger.info("Error in consumer task", error=str(e))
             await asyncio.sleep(1)
 
     async def _aiter_events(self) -> t.AsyncGenerator[SirilEvent, None]:
@@ -151,29 +296,40 @@ class AsyncSirilEventConsumer:
             while self._running:
                 line = await self._pipe.read_line()
                 if line == "":
-                    logger.info("Consumer fifo pipe closed")
+                    self._logger.info("Consumer fifo pipe closed")
                     if not self.fifo_closed.done():
                         self.fifo_closed.set_result(None)
                     break
 
                 yield SirilEvent(line)
         except asyncio.CancelledError:
-            logger.debug("Consumer event iteration cancelled")
+            self._logger.debug("Consumer event iteration cancelled")
             raise
 
 
 class AsyncSirilCommandProducer:
     """
     Represents the async writer of commands to the Siril CLI
+
+    When writing to the fifo fails the producer stops: the error is kept in `error`, every later `send` raises
+    and a closed event is queued on `events` (the consumer's queue) so commands waiting on Siril don't hang.
     """
 
-    def __init__(self):
+    def __init__(
+        self, pipe_dir: t.Optional[str] = None, log: t.Optional[t.Any] = None, events: t.Optional[asyncio.Queue] = None
+    ):
         self._loop = asyncio.get_event_loop()
+        self._logger = log or logger
         self._queue = asyncio.Queue()
+        self._events = events
         self._task = None
         self._running = False
+        self.error: t.Optional[OSError] = None
         self.fifo_closed = self._loop.create_future()
-        self._pipe = PipeClient(mode=PipeMode.WRITE)
+
+        # Opening the input fifo for writing completes once Siril opened it for reading
+        self.pipe_opened = self._loop.create_future()
+        self._pipe = PipeClient(mode=PipeMode.WRITE, directory=pipe_dir)
 
     @property
     def pipe_path(self):
@@ -182,6 +338,7 @@ class AsyncSirilCommandProducer:
 
     def start(self):
         """Starts the background writer task."""
+        self._pipe.create()
         self._running = True
         self._task = asyncio.create_task(self._run(), name=type(self).__name__)
         return self._task
@@ -189,29 +346,31 @@ class AsyncSirilCommandProducer:
     async def stop(self):
         """Gracefully stop the background writer."""
         if self._running:
-            logger.info("Stopping producer fifo pipe")
+            self._logger.info("Stopping producer fifo pipe")
             self._running = False
             if not self.fifo_closed.done():
                 self.fifo_closed.set_result(None)
 
         if self._task:
-            logger.info("Cancelling producer task")
+            self._logger.info("Cancelling producer task")
             self._task.cancel()
             try:
                 await asyncio.wait_for(self._task, timeout=1.0)
             except asyncio.TimeoutError:
-                logger.warning("Producer task did not cancel in time")
+                self._logger.warning("Producer task did not cancel in time")
             except asyncio.CancelledError:
                 pass
             except Exception as e:
-                logger.warning(f"Error stopping producer task: {e}")
+                self._logger.warning("Error stopping producer task", error=str(e))
 
         if self._pipe:
             self._pipe.close()
-        logger.info("Producer stopped")
+        self._logger.info("Producer stopped")
 
     async def send(self, command: str):
-        """Send a message to be written to the FIFO."""
+        """Send a message to be written to the FIFO (raises `BrokenPipeError` once writing to it failed)."""
+        if self.error is not None:
+            raise BrokenPipeError(f"Could not write to Siril: {self.error}") from self.error
         await self._queue.put(command)
 
     async def _run(self):
@@ -220,26 +379,49 @@ class AsyncSirilCommandProducer:
             return
 
         try:
-            logger.debug(f"producer path: {self._pipe.path}")
-            logger.debug(f"producer readable: {False}")
-            logger.debug(f"producer writable: {True}")
+            self._logger.debug("producer pipe", path=self._pipe.path, readable=False, writable=True)
 
             # Wait for the client to connect and create a stream (blocking)
             await self._pipe.connect()
 
-            logger.info("Producer fifo pipe opened")
+            self._logger.info("Producer fifo pipe opened")
+            if not self.pipe_opened.done():
+                self.pipe_opened.set_result(None)
 
             while self._running:
                 try:
-                    message = await self._queue.get()
-                    await self._pipe.write_line(message)
+                    # Drain everything already queued and write it as a single batch
+                    batch = [await self._queue.get()]
+                    while not self._queue.empty():
+                        batch.append(self._queue.get_nowait())
+                    try:
+                        await self._pipe.write_lines(batch)
+                    finally:
+                        for _ in batch:
+                            self._queue.task_done()
                 except asyncio.CancelledError:
                     break
+        except OSError as e:
+            self._logger.error("Error writing to the producer fifo pipe", error=str(e))
+            self._fail(e)
+            return
         finally:
             if self._pipe:
                 self._pipe.close()
 
-        logger.info("The producer was nicely stopped.")
+        self._logger.info("The producer was nicely stopped.")
+
+    def _fail(self, error: OSError):
+        """Stop after a failed write, the commands written with it (or still queued) will never be answered"""
+        self.error = error
+        self._running = False
+        if not self.fifo_closed.done():
+            self.fifo_closed.set_result(None)
+        while not self._queue.empty():
+            self._queue.get_nowait()
+            self._queue.task_done()
+        if self._events is not None:
+            self._events.put_nowait(SirilEvent.pipe_closed(f"Could not write to Siril: {error}"))
 
 
 class PipeMode(Enum):
@@ -262,19 +444,73 @@ class PipeMode(Enum):
         elif self == PipeMode.WRITE:
             return custom_write_pipe_name
 
+    def session_path(self, directory: str) -> str:
+        """Returns the path to the pipe inside a private session directory (unix/linux only)"""
+        return os.path.join(directory, os.path.basename(self.default_path))
+
+
+def session_pipe_directory() -> t.Optional[str]:
+    """
+    Returns a unique private directory path to hold the named pipes of one Siril session.
+    The directory is created with the pipes when the session starts.
+    Returns `None` on windows where only the standard pipe names are supported.
+    """
+    if sys.platform == "win32":
+        return None
+    return os.path.join(tempfile.gettempdir(), f"async_siril_{uuid.uuid4().hex}")
+
+
+def remove_pipe_directory(directory: t.Optional[str]):
+    """Remove a session pipe directory from `session_pipe_directory`"""
+    if directory is not None:
+        shutil.rmtree(directory, ignore_errors=True)
+
 
 class PipeClient:
     """
     Represents a pipe client for reading or writing to a text based fifo pipe
+
+    When a `directory` is provided (unix/linux only) the fifo is created inside of it so that
+    multiple Siril processes can run on the same host without sharing pipes.
+
+    When `nonblocking` is enabled (the default on linux) the read side opens the fifo with `O_NONBLOCK`
+    and registers it with the event loop instead of using an executor thread for every line. The write
+    side switches the fifo to non-blocking once opened and writes each batch of lines with `os.write`.
     """
 
-    def __init__(self, mode: PipeMode, encoding: str = "utf-8"):
-        self.path = mode.default_path
+    # How much to read from a non-blocking fifo in one system call
+    READ_CHUNK_SIZE = 65536
+
+    def __init__(
+        self,
+        mode: PipeMode,
+        encoding: str = "utf-8",
+        directory: t.Optional[str] = None,
+        nonblocking: t.Optional[bool] = None,
+    ):
+        self.path = mode.default_path if directory is None else mode.session_path(directory)
         self.mode = mode
         self.encoding = encoding
+        self.directory = directory
+        self.nonblocking = sys.platform.startswith("linux") if nonblocking is None else nonblocking
         self._file = None
+        self._fd: t.Optional[int] = None
+        self._buffer = bytearray()
+        self._scan_from = 0
+        self._eof = False
+        self._waiter: t.Optional[asyncio.Future] = None
         self._loop = asyncio.get_event_loop()
 
+    def create(self):
+        """Create the named pipe inside the private session directory (unix/linux only)"""
+        if self.directory is None or self._is_windows:
+            return
+
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        if not os.path.exists(self.path):
+            os.mkfifo(self.path, 0o600)
+            logger.debug("Created pipe file", path=self.path)
+
     async def connect(self):
         """Connect to the pipe and wait for open (cross platform)"""
         if self._is_windows:
@@ -285,7 +521,23 @@ class PipeClient:
     async def _connect_unix(self):
         while not os.path.exists(self.path):
             await asyncio.sleep(0.1)
-        self._file = await asyncio.to_thread(open, self.path, self._open_mode, encoding=self.encoding)
+        if self.nonblocking and self.mode == PipeMode.READ:
+            self._connect_nonblocking_reader()
+        elif self.nonblocking and self.mode == PipeMode.WRITE:
+            # Opening the write side blocks until Siril opens the fifo for reading
+            self._fd = await asyncio.to_thread(os.open, self.path, os.O_WRONLY)
+            os.set_blocking(self._fd, False)
+        else:
+            self._file = await asyncio.to_thread(open, self.path, self._open_mode, encoding=self.encoding)
+
+    def _connect_nonblocking_reader(self):
+        # Opening the read side with O_NONBLOCK returns right away, linux only reports the fifo
+        # as readable (or hung up) once a writer has connected to it.
+        self._fd = os.open(self.path, os.O_RDONLY | os.O_NONBLOCK)
+        self._buffer.clear()
+        self._scan_from = 0
+        self._eof = False
+        self._loop.add_reader(self._fd, self._on_readable)
 
     async def _connect_windows(self):
         while True:
@@ -302,29 +554,73 @@ class PipeClient:
             self._file.close()
             self._file = None
 
+        if self._fd is not None:
+            if self.mode == PipeMode.READ:
+                self._loop.remove_reader(self._fd)
+            else:
+                self._loop.remove_writer(self._fd)
+            os.close(self._fd)
+            self._fd = None
+            self._set_eof()
+
         # Remove the named pipe file if it exists (Unix only)
         if not self._is_windows and os.path.exists(self.path):
             try:
                 os.unlink(self.path)
-                logger.debug(f"Removed pipe file: {self.path}")
+                logger.debug("Removed pipe file", path=self.path)
             except OSError as e:
-                logger.warning(f"Could not remove pipe file {self.path}: {e}")
+                logger.warning("Could not remove pipe file", path=self.path, error=str(e))
 
     async def write_line(self, message: str):
         """Write a line to the pipe"""
+        await self.write_lines([message])
+
+    async def write_lines(self, messages: t.List[str]):
+        """Write a batch of lines to the pipe with a single write and flush"""
         if self.mode != PipeMode.WRITE:
             raise RuntimeError("Pipe not in write mode")
+        if self._fd is not None:
+            await self._write_nonblocking("".join(message + "\n" for message in messages).encode(self.encoding))
+            return
         if not self._file:
             raise RuntimeError("Pipe not connected")
 
-        encoded = (message + "\n").encode(self.encoding) if self._is_binary else message + "\n"
+        payload = "".join(message + "\n" for message in messages)
+        encoded = payload.encode(self.encoding) if self._is_binary else payload
         await self._loop.run_in_executor(None, self._file.write, encoded)
         await self._loop.run_in_executor(None, self._file.flush)
 
+    async def _write_nonblocking(self, payload: bytes):
+        """Write all of the payload, waiting on the event loop whenever the fifo is full"""
+        view = memoryview(payload)
+        while view:
+            # The pipe can be closed while waiting for it to drain
+            if self._fd is None:
+                raise BrokenPipeError("Pipe closed")
+            try:
+                written = os.write(self._fd, view)
+                view = view[written:]
+            except (BlockingIOError, InterruptedError):
+                await self._wait_writable()
+
+    async def _wait_writable(self):
+        fd = self._fd
+        if fd is None:
+            raise RuntimeError("Pipe not connected")
+
+        waiter = self._loop.create_future()
+        self._loop.add_writer(fd, lambda: waiter.done() or waiter.set_result(None))
+        try:
+            await waiter
+        finally:
+            self._loop.remove_writer(fd)
+
     async def read_line(self) -> str:
         """Read a line from the pipe"""
         if self.mode != PipeMode.READ:
             raise RuntimeError("Pipe not in read mode")
+        if self._fd is not None or (self._eof and not self._file):
+            return await self._read_line_nonblocking()
         if not self._file:
             raise RuntimeError("Pipe not connected")
 
@@ -333,6 +629,63 @@ class PipeClient:
             return line.decode(self.encoding).rstrip()
         return line.rstrip()
 
+    async def _read_line_nonblocking(self) -> str:
+        """Split the next line out of the read buffer, waiting on the event loop for more data when needed"""
+        while True:
+            index = self._buffer.find(b"\n", self._scan_from)
+            if index >= 0:
+                line = self._buffer[:index].decode(self.encoding).rstrip()
+                del self._buffer[: index + 1]
+                self._scan_from = 0
+                # Blank lines are skipped so they can't be mistaken for the end of the stream
+                if line:
+                    return line
+                continue
+
+            self._scan_from = len(self._buffer)
+            if self._eof:
+                # Return any trailing partial line, then "" to signal the end of the stream
+                line = self._buffer.decode(self.encoding).rstrip()
+                self._buffer.clear()
+                self._scan_from = 0
+                return line
+
+            self._waiter = self._loop.create_future()
+            try:
+                await self._waiter
+            finally:
+                self._waiter = None
+
+    def _on_readable(self):
+        """Event loop callback draining everything currently available on the fifo into the buffer"""
+        while self._fd is not None:
+            try:
+                chunk = os.read(self._fd, self.READ_CHUNK_SIZE)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError as e:
+                logger.warning("Error reading pipe", path=self.path, error=str(e))
+                chunk = b""
+
+            if not chunk:
+                self._loop.remove_reader(self._fd)
+                self._set_eof()
+                break
+
+            self._buffer += chunk
+            if len(chunk) < self.READ_CHUNK_SIZE:
+                break
+
+        self._wake_reader()
+
+    def _set_eof(self):
+        self._eof = True
+        self._wake_reader()
+
+    def _wake_reader(self):
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
     @property
     def _is_windows(self):
         return sys.platform == "win32"
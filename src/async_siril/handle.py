@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+import asyncio
+import typing as t
+
+from dataclasses import dataclass
+from .event import SirilEvent
+from .progress import DurationHistory, ProgressEstimate, ProgressTracker
+
+if t.TYPE_CHECKING:
+    from .siril import CommandResult
+
+
+# Called with the command and each of its events (log, progress and the final status)
+EventHandler = t.Callable[[str, SirilEvent], None]
+
+
+@dataclass
+class CommandEvent:
+    """An event sent by Siril while running a command"""
+
+    # The command the event belongs to
+    command: str
+
+    # The event itself
+    event: SirilEvent
+
+
+class CommandHandle(object):
+    """
+    A `SirilCli.command` running in the background (see `SirilCli.submit`). Iterate it with `async for` to
+    receive the events of its commands as they arrive, the iteration ends when the call finishes. Await it
+    (or `result()`) for the `CommandResult`, errors of the call are raised there.
+
+    Progress events are coalesced to at most one every `progress_interval` seconds per command (the latest
+    one is always delivered) and `estimate` tracks the throughput and ETA of the running command, using the
+    durations of previous runs from the `history` (for as many `frames`) when there are some.
+
+    Commands are timed from when they were written to Siril, as returned by `sent` (monotonic) for the
+    command the events belong to, instead of from their first event.
+
+    At most `max_events` events wait for the iteration (nothing may consume them), past that new log events
+    are dropped and other events replace the oldest waiting one. Dropped events are counted in `dropped`.
+
+    async for item in siril.submit("stack lights rej 3 3"):
+        if item.event.value == SirilEvent.PROGRESS:
+            print(item.event.progress)
+    """
+
+    def __init__(
+        self,
+        history: t.Optional[DurationHistory] = None,
+        frames: t.Optional[int] = None,
+        progress_interval: float = 0.25,
+        max_events: int = 1000,
+        sent: t.Optional[t.Callable[[], t.Optional[float]]] = None,
+    ):
+        self._events: asyncio.Queue[t.Optional[CommandEvent]] = asyncio.Queue(maxsize=max(max_events, 1))
+        self._task: t.Optional[asyncio.Task] = None
+        self._history = history
+        self._frames = frames
+        self._progress_interval = progress_interval
+        self._sent = sent
+        self._tracker: t.Optional[ProgressTracker] = None
+        self._pending: t.Optional[CommandEvent] = None
+
+        # The command the latest event belongs to
+        self.command: t.Optional[str] = None
+
+        # The latest `progress:` value (in %)
+        self.progress: t.Optional[int] = None
+
+        # Events dropped while the queue was full
+        self.dropped = 0
+
+    def _start(self, coroutine: t.Coroutine[t.Any, t.Any, CommandResult]):
+        self._task = asyncio.create_task(coroutine)
+        self._task.add_done_callback(self._finished)
+
+    def _finished(self, _task: asyncio.Task):
+        self._flush()
+        self._put(None)
+
+    def _on_event(self, command: str, event: SirilEvent):
+        self.command = command
+        tracker = self._tracker
+        if tracker is None or tracker.command != command:
+            self._flush()
+            expected = self._history.expected(command, self._frames) if self._history is not None else None
+            started = self._sent() if self._sent is not None else None
+            tracker = self._tracker = ProgressTracker(command, expected, self._progress_interval, started)
+
+        item = CommandEvent(command, event)
+        if event.value == SirilEvent.PROGRESS:
+            self.progress = event.progress
+            if event.progress is not None and not tracker.update(event.progress):
+                # Only the latest progress is kept until the next one can be published
+                self._pending = item
+                return
+            self._pending = None
+            self._put(item)
+            return
+
+        if event.completed:
+            if not event.errored and self._history is not None:
+                self._history.record(command, tracker.elapsed(), self._frames)
+            self._tracker = None
+        self._flush()
+        self._put(item)
+
+    def _flush(self):
+        if self._pending is not None:
+            self._put(self._pending)
+            self._pending = None
+
+    def _put(self, item: t.Optional[CommandEvent]):
+        if self._events.full():
+            if item is not None and item.event.value == SirilEvent.LOG:
+                self.dropped += 1
+                return
+            # Progress, status and the end of the call make room by dropping the oldest event
+            self._events.get_nowait()
+            self.dropped += 1
+        self._events.put_nowait(item)
+
+    @property
+    def estimate(self) -> t.Optional[ProgressEstimate]:
+        """Returns the progress, throughput and ETA of the running command (None between commands)"""
+        return self._tracker.estimate() if self._tracker is not None else None
+
+    @property
+    def task(self) -> asyncio.Task:
+        assert self._task is not None, "handle not started"
+        return self._task
+
+    def done(self) -> bool:
+        return self.task.done()
+
+    def cancel(self):
+        self.task.cancel()
+
+    async def result(self) -> CommandResult:
+        return await self.task
+
+    def __await__(self) -> t.Generator[t.Any, None, CommandResult]:
+        return self.task.__await__()
+
+    def __aiter__(self) -> t.AsyncIterator[CommandEvent]:
+        return self._iterate()
+
+    async def _iterate(self) -> t.AsyncIterator[CommandEvent]:
+        while True:
+            item = await self._events.get()
+            if item is None:
+                return
+            yield item
@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+import collections
+import time
+import typing as t
+
+from dataclasses import dataclass, field
+
+
+@dataclass
+class InFlightCommand:
+    """A command written to Siril whose final status wasn't read yet"""
+
+    # Identifies the command in the logs of the session
+    id: int
+
+    # The command as written to Siril
+    command: str
+
+    # When the command was written (monotonic)
+    sent: float = field(default_factory=time.monotonic)
+
+
+class InFlightCommands(object):
+    """
+    The commands written to Siril and not completed yet, in the order Siril runs them. The events carry no
+    identifier: they belong to the oldest command in flight. Commands still in flight when a new one is about
+    to be written were left behind by a cancelled caller, their events are drained first so they are never
+    attributed to the new command.
+    """
+
+    def __init__(self):
+        self._commands: collections.deque[InFlightCommand] = collections.deque()
+        self._next_id = 1
+
+    def __len__(self) -> int:
+        return len(self._commands)
+
+    def __iter__(self) -> t.Iterator[InFlightCommand]:
+        return iter(list(self._commands))
+
+    @property
+    def oldest(self) -> t.Optional[InFlightCommand]:
+        """The command the next events belong to"""
+        return self._commands[0] if self._commands else None
+
+    def open(self, command: str) -> InFlightCommand:
+        """Record a command that was just written to Siril"""
+        record = InFlightCommand(id=self._next_id, command=command)
+        self._next_id += 1
+        self._commands.append(record)
+        return record
+
+    def complete(self) -> InFlightCommand:
+        """Forget the oldest command once its final status was read"""
+        return self._commands.popleft()
+
+    def clear(self):
+        """Forget every command (Siril dropped or will never report them)"""
+        self._commands.clear()
@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import asyncio
+import collections
+import logging
+import structlog.stdlib
+import typing as t
+
+from dataclasses import dataclass
+from enum import Enum
+
+
+logger = structlog.stdlib.get_logger("async_siril.output")
+
+
+class StreamMode(Enum):
+    """How the stdout and stderr of the Siril process are handled"""
+
+    # Not read at all, the streams are sent to /dev/null
+    OFF = "off"
+
+    # Only the latest lines are kept, for the errors raised by commands
+    RING = "ring"
+
+    # Kept like `RING` and one line in every `sample` is logged
+    SAMPLED = "sampled"
+
+    # Kept like `RING` and every line is logged
+    FULL = "full"
+
+
+@dataclass
+class OutputPolicy:
+    """Handling of the Siril process output (its stdout and stderr, the events come from the output fifo)"""
+
+    # What is done with the output lines
+    mode: StreamMode = StreamMode.FULL
+
+    # Number of lines kept for error reports
+    ring_size: int = 200
+
+    # With `SAMPLED`, one line in every `sample` lines is logged
+    sample: int = 100
+
+    # Bytes read (and decoded) at once from a stream
+    chunk_size: int = 65536
+
+
+class OutputRing(object):
+    """
+    The latest lines written by Siril on its stdout and stderr (interleaved as they were read, stderr lines
+    are prefixed with `stderr: `). Its `tail` is attached to the `SirilError`s raised by the session.
+    """
+
+    def __init__(self, size: int = 200):
+        self._lines: collections.deque[str] = collections.deque(maxlen=size)
+
+    def __len__(self) -> int:
+        return len(self._lines)
+
+    def extend(self, lines: t.Iterable[str]):
+        self._lines.extend(lines)
+
+    def clear(self):
+        self._lines.clear()
+
+    def tail(self, count: t.Optional[int] = None) -> t.List[str]:
+        """Returns the latest `count` lines (all the lines kept by default), oldest first"""
+        lines = list(self._lines)
+        return lines if count is None else lines[-count:] if count > 0 else []
+
+
+async def read_stream(stream: asyncio.StreamReader, name: str, policy: OutputPolicy, ring: OutputRing):
+    """
+    Read a stream of the Siril process until it closes. Whatever is available is read in chunks of up to
+    `chunk_size` bytes and the complete lines of a chunk are decoded at once, a partial line waits for the
+    rest of it (unless it grows past `chunk_size`).
+    """
+    log_every = 1 if policy.mode == StreamMode.FULL else max(policy.sample, 1)
+    log_lines = policy.mode in (StreamMode.FULL, StreamMode.SAMPLED)
+    prefix = "" if name == "stdout" else f"{name}: "
+    count = 0
+    pending = b""
+
+    while True:
+        data = await stream.read(policy.chunk_size)
+        if not data:
+            complete, pending = pending, b""
+        else:
+            head, newline, pending = (pending + data).rpartition(b"\n")
+            complete = head + newline
+            if not complete and len(pending) >= policy.chunk_size:
+                complete, pending = pending, b""
+
+        if complete:
+            lines = complete.decode(errors="replace").splitlines()
+            ring.extend([prefix + line for line in lines] if prefix else lines)
+            # The level is checked once per chunk, lines aren't counted while they can't be logged
+            if log_lines and logger.is_enabled_for(logging.INFO):
+                for line in lines:
+                    if count % log_every == 0:
+                        logger.info("siril_output", stream=name, message=line.rstrip())
+                    count += 1
+
+        if not data:
+            break
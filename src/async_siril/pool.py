@@ -0,0 +1,298 @@
+import asyncio
+import contextlib
+import structlog.stdlib
+import typing as t
+
+from .admission import MemoryAdmission
+from .command import BaseCommand
+from .event import EventQueuePolicy
+from .handle import EventHandler
+from .output import OutputPolicy
+from .pressure import PressureMonitor
+from .resources import SirilResource, WorkerPlan
+from .siril import CommandResult, SirilCli
+from .supervisor import RestartPolicy
+from .threads import ThreadPolicy
+from pathlib import Path
+
+
+logger = structlog.stdlib.get_logger("async_siril.pool")
+
+
+class SirilPool(object):
+    """
+    Manages a pool of warm `SirilCli` processes so commands can run in parallel
+
+    async with SirilPool(size=4) as pool:
+        async with pool.session() as siril:
+            await siril.command("stack")
+
+    With `reset_on_release=True` each worker is `reset` before it is handed out again, so unrelated jobs
+    can share a process without seeing each other's working directory, settings or loaded images.
+
+    `command_timeout` is applied to every command of every worker and `session_timeout` limits how long a
+    `session()` may run. A worker killed by a timeout is replaced with a fresh process when it is released.
+
+    With a `PressureMonitor` no more workers are handed out while the container is under memory pressure
+    (unless none is busy).
+
+    A worker that cannot be replaced is started again with the backoff of the `restart_policy` (or the
+    default `RestartPolicy`), once its attempts are exhausted it leaves the pool. When no worker is left
+    `acquire` fails instead of waiting forever.
+    """
+
+    def __init__(
+        self,
+        size: int = 2,
+        siril_exe: str = "siril-cli",
+        directory: t.Optional[Path] = None,
+        resources: t.Union[SirilResource, t.List[SirilResource]] = SirilResource.default_limits(),
+        reset_on_release: bool = False,
+        command_timeout: t.Optional[float] = None,
+        session_timeout: t.Optional[float] = None,
+        restart_policy: t.Optional[RestartPolicy] = None,
+        admission: t.Optional[MemoryAdmission] = None,
+        thread_policy: t.Optional[ThreadPolicy] = None,
+        sample_interval: t.Optional[float] = None,
+        pressure: t.Optional[PressureMonitor] = None,
+        event_policy: t.Optional[EventQueuePolicy] = None,
+        output_policy: t.Optional[OutputPolicy] = None,
+    ):
+        if size < 1:
+            raise ValueError("A pool requires at least 1 worker")
+
+        if isinstance(resources, list):
+            if len(resources) != size:
+                raise ValueError("When a list of resources is provided it must have one entry per worker")
+            self._resources = resources
+        else:
+            self._resources = [resources] * size
+
+        self.size = size
+        self._siril_exe = siril_exe
+        self._cwd = directory
+        self._reset_on_release = reset_on_release
+        self._command_timeout = command_timeout
+        self._session_timeout = session_timeout
+        self._restart_policy = restart_policy
+        self._admission = admission
+        self._thread_policy = thread_policy
+        self._sample_interval = sample_interval
+        self._pressure = pressure
+        self._event_policy = event_policy
+        self._output_policy = output_policy
+        self._workers: t.List[SirilCli] = []
+        # The resources of each worker, in the order of `_workers`
+        self._worker_resources: t.List[SirilResource] = []
+        # `None` is queued once the last worker was lost, it wakes every waiting `acquire` with an error
+        self._idle: asyncio.Queue[t.Optional[SirilCli]] = asyncio.Queue()
+        self._pending: t.Set[asyncio.Task] = set()
+        self._started = False
+        self._lost_error: t.Optional[BaseException] = None
+
+    @staticmethod
+    def from_plan(plan: WorkerPlan, **kwargs) -> "SirilPool":
+        """Create a pool with one worker per planned `SirilResource` (see `WorkerPlan.container_aware`)"""
+        return SirilPool(size=plan.workers, resources=list(plan.resources), **kwargs)
+
+    @property
+    def workers(self) -> t.List[SirilCli]:
+        """Returns all the workers managed by the pool"""
+        return list(self._workers)
+
+    @property
+    def available(self) -> int:
+        """Returns the number of idle workers"""
+        return self._idle.qsize() if self._workers else 0
+
+    async def start(self):
+        """Start all the Siril workers in parallel"""
+        if self._started:
+            return
+
+        self._worker_resources = list(self._resources)
+        self._workers = [self._create_worker(resource) for resource in self._worker_resources]
+        logger.info("Starting Siril pool with %d workers", self.size)
+        results = await asyncio.gather(
+            *(self._start_worker(worker) for worker in self._workers), return_exceptions=True
+        )
+
+        errors = [result for result in results if isinstance(result, BaseException)]
+        if errors:
+            logger.error("Siril pool failed to start: %s", errors[0])
+            await asyncio.gather(*(worker.stop() for worker in self._workers), return_exceptions=True)
+            self._workers = []
+            raise errors[0]
+
+        for worker in self._workers:
+            self._idle.put_nowait(worker)
+        self._lost_error = None
+        self._started = True
+        logger.info("Siril pool started")
+
+    def _create_worker(self, resources: SirilResource) -> SirilCli:
+        return SirilCli(
+            siril_exe=self._siril_exe,
+            directory=self._cwd,
+            resources=resources,
+            command_timeout=self._command_timeout,
+            restart_policy=self._restart_policy,
+            admission=self._admission,
+            thread_policy=self._thread_policy,
+            sample_interval=self._sample_interval,
+            event_policy=self._event_policy,
+            output_policy=self._output_policy,
+        )
+
+    async def _start_worker(self, worker: SirilCli):
+        await worker.start()
+        if self._reset_on_release:
+            await worker.snapshot_settings()
+
+    async def stop(self):
+        """Stop all the Siril workers"""
+        logger.info("Stopping Siril pool")
+        for task in list(self._pending):
+            task.cancel()
+        await asyncio.gather(*self._pending, return_exceptions=True)
+        await asyncio.gather(*(worker.stop() for worker in self._workers), return_exceptions=True)
+        self._workers = []
+        self._idle = asyncio.Queue()
+        self._started = False
+        logger.info("Siril pool stopped")
+
+    async def acquire(self) -> SirilCli:
+        """Wait for an idle worker and take it out of the pool"""
+        if not self._started:
+            raise RuntimeError("Pool not started")
+        if self._pressure is not None:
+            while self.busy > 0 and self._pressure.memory_pressure:
+                await asyncio.sleep(self._pressure.interval)
+
+        worker = await self._idle.get()
+        if worker is None:
+            # Pass the marker on to the next waiter
+            self._idle.put_nowait(None)
+            raise RuntimeError("No Siril worker left in the pool") from self._lost_error
+        return worker
+
+    @property
+    def busy(self) -> int:
+        """Returns the number of workers handed out (or being reset)"""
+        return len(self._workers) - self.available
+
+    def metrics(self) -> t.Dict[str, float]:
+        """
+        Returns the worker counts, the events the workers dropped or coalesced and the container pressure
+        readings (with a `PressureMonitor`)
+        """
+        result = {"workers": float(len(self._workers)), "busy_workers": float(self.busy)}
+        for name in ("dropped", "coalesced", "sampled"):
+            result[f"events_{name}"] = float(sum(getattr(worker.event_stats, name) for worker in self._workers))
+        if self._pressure is not None:
+            result.update({f"pressure_{name}": value for name, value in self._pressure.metrics().items()})
+        return result
+
+    def release(self, worker: SirilCli):
+        """Give a worker back to the pool"""
+        if worker not in self._workers:
+            raise ValueError("Worker does not belong to this pool")
+
+        if worker.running and not self._reset_on_release and not worker.in_flight:
+            self._idle.put_nowait(worker)
+            return
+
+        # The worker only becomes available again once it is clean (or replaced)
+        task = asyncio.create_task(self._recycle_worker(worker))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _recycle_worker(self, worker: SirilCli):
+        replacement: t.Optional[SirilCli] = worker
+        if not worker.running:
+            logger.warning("Siril worker is no longer running, starting a new one")
+            replacement = await self._respawn(worker)
+        else:
+            try:
+                # The commands of a cancelled session complete before the worker runs anything else
+                await worker.drain()
+                if self._reset_on_release:
+                    await worker.reset()
+            except Exception as e:
+                logger.warning(f"Siril worker drain or reset failed, restarting it: {e}")
+                replacement = await self._respawn(worker)
+        if replacement is not None:
+            self._idle.put_nowait(replacement)
+
+    async def _respawn(self, worker: SirilCli) -> t.Optional[SirilCli]:
+        """
+        Replace a worker with a freshly started Siril process using the same resources. A replacement that
+        fails to start is stopped and started again after the backoff of the restart policy, once the
+        attempts are exhausted the worker is removed from the pool and `None` is returned.
+        """
+        index = self._workers.index(worker)
+        await worker.stop()
+
+        policy = self._restart_policy or RestartPolicy()
+        attempt = 0
+        while True:
+            attempt += 1
+            replacement = self._create_worker(self._worker_resources[index])
+            try:
+                await self._start_worker(replacement)
+            except Exception as e:
+                await replacement.stop()
+                if attempt > policy.max_restarts:
+                    self._lose_worker(index, e)
+                    return None
+                logger.warning(f"Siril worker failed to start (attempt {attempt}), retrying: {e}")
+                await asyncio.sleep(policy.delay(attempt))
+                continue
+            except BaseException:
+                # Cancelled by `stop`, the pool doesn't know about the replacement yet
+                await asyncio.shield(replacement.stop())
+                raise
+
+            self._workers[index] = replacement
+            return replacement
+
+    def _lose_worker(self, index: int, error: BaseException):
+        """Remove a worker that could not be replaced, waiting `acquire` calls fail once none is left"""
+        logger.error(f"Siril worker could not be replaced, removing it from the pool: {error}")
+        del self._workers[index]
+        del self._worker_resources[index]
+        self._lost_error = error
+        if not self._workers:
+            self._idle.put_nowait(None)
+
+    @contextlib.asynccontextmanager
+    async def session(self, timeout: t.Optional[float] = None) -> t.AsyncIterator[SirilCli]:
+        """
+        Acquire a worker for the duration of the `async with` block, its commands fail with `SirilTimeoutError`
+        once `timeout` seconds (defaults to the pool `session_timeout`) have passed.
+        """
+        worker = await self.acquire()
+        worker.set_session_timeout(timeout if timeout is not None else self._session_timeout)
+        try:
+            yield worker
+        finally:
+            worker.set_session_timeout(None)
+            self.release(worker)
+
+    async def command(
+        self,
+        cmd: t.Union[str, t.List[str], BaseCommand, t.List[BaseCommand]],
+        timeout: t.Optional[float] = None,
+        memory: t.Optional[int] = None,
+        on_event: t.Optional[EventHandler] = None,
+    ) -> CommandResult:
+        """Run a command (or list of commands) on the next idle worker"""
+        async with self.session() as siril:
+            return await siril.command(cmd, timeout=timeout, memory=memory, on_event=on_event)
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.stop()
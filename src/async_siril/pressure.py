@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import structlog.stdlib
+import time
+import typing as t
+
+from dataclasses import dataclass
+from .system import container_aware_memory_limit_bytes, container_memory_current, read_pressure
+
+
+logger = structlog.stdlib.get_logger("async_siril.pressure")
+
+MEMORY_PRESSURE_FILE = "/sys/fs/cgroup/memory.pressure"
+CPU_PRESSURE_FILE = "/sys/fs/cgroup/cpu.pressure"
+
+
+@dataclass
+class PressureThresholds:
+    """When the container is considered under memory or CPU pressure"""
+
+    # Share of the last 10s (in %) some tasks were stalled waiting for memory (reclaim, swap-in)
+    memory_some_avg10: float = 10.0
+
+    # Share of the last 10s (in %) all tasks were stalled waiting for memory
+    memory_full_avg10: float = 2.0
+
+    # Fraction of the cgroup memory limit in use (page cache included)
+    memory_usage: float = 0.9
+
+    # Share of the last 10s (in %) some tasks were waiting for a CPU (quota throttling included)
+    cpu_some_avg10: float = 50.0
+
+
+@dataclass
+class PressureReading:
+    """The cgroup v2 memory usage and pressure stall information at one point in time"""
+
+    # `time.monotonic()` of the reading
+    timestamp: float = 0.0
+
+    # Memory charged to the cgroup (in bytes), None outside a cgroup
+    memory_current: t.Optional[int] = None
+
+    # Memory limit of the cgroup (in bytes), None when not limited
+    memory_limit: t.Optional[int] = None
+
+    # Pressure stall averages over the last 10s (in %), None without PSI (cgroup v1 or older kernels)
+    memory_some_avg10: t.Optional[float] = None
+    memory_full_avg10: t.Optional[float] = None
+    cpu_some_avg10: t.Optional[float] = None
+
+    @property
+    def memory_usage(self) -> t.Optional[float]:
+        """Returns the fraction of the memory limit in use, None when unknown"""
+        if self.memory_current is None or not self.memory_limit:
+            return None
+        return self.memory_current / self.memory_limit
+
+    def memory_pressure(self, thresholds: PressureThresholds) -> bool:
+        return (
+            _above(self.memory_some_avg10, thresholds.memory_some_avg10)
+            or _above(self.memory_full_avg10, thresholds.memory_full_avg10)
+            or _above(self.memory_usage, thresholds.memory_usage)
+        )
+
+    def cpu_pressure(self, thresholds: PressureThresholds) -> bool:
+        return _above(self.cpu_some_avg10, thresholds.cpu_some_avg10)
+
+
+def _above(value: t.Optional[float], threshold: float) -> bool:
+    return value is not None and value >= threshold
+
+
+class PressureMonitor(object):
+    """
+    Watches the cgroup v2 `memory.current`, `memory.pressure` and `cpu.pressure` so bursts of concurrent jobs
+    can be throttled before the container gets OOM-killed or heavily CPU throttled. Share one monitor between
+    a `MemoryAdmission` (pauses admitting jobs under memory pressure), a `ThreadPolicy` (lowers `setcpu` under
+    CPU pressure) and a `SirilPool` (pauses handing out workers under memory pressure).
+
+    The files are read at most once every `interval` seconds, on demand. Without cgroup v2 nothing is ever
+    under pressure.
+    """
+
+    def __init__(self, thresholds: t.Optional[PressureThresholds] = None, interval: float = 1.0):
+        self.thresholds = thresholds or PressureThresholds()
+        self.interval = interval
+        self._reading: t.Optional[PressureReading] = None
+        self._memory_pressure = False
+        self._cpu_pressure = False
+
+    @property
+    def reading(self) -> PressureReading:
+        """Returns the latest reading, refreshed when older than `interval`"""
+        if self._reading is None or time.monotonic() - self._reading.timestamp >= self.interval:
+            self.refresh()
+        return self._reading  # type: ignore
+
+    @property
+    def memory_pressure(self) -> bool:
+        """Whether the container is under memory pressure"""
+        return self.reading.memory_pressure(self.thresholds)
+
+    @property
+    def cpu_pressure(self) -> bool:
+        """Whether the container is under CPU pressure"""
+        return self.reading.cpu_pressure(self.thresholds)
+
+    def refresh(self) -> PressureReading:
+        """Read the cgroup files now"""
+        memory = read_pressure(MEMORY_PRESSURE_FILE) or {}
+        cpu = read_pressure(CPU_PRESSURE_FILE) or {}
+        reading = PressureReading(
+            timestamp=time.monotonic(),
+            memory_current=container_memory_current(),
+            memory_limit=container_aware_memory_limit_bytes(),
+            memory_some_avg10=memory.get("some", {}).get("avg10"),
+            memory_full_avg10=memory.get("full", {}).get("avg10"),
+            cpu_some_avg10=cpu.get("some", {}).get("avg10"),
+        )
+        self._reading = reading
+        self._log_transitions(reading)
+        return reading
+
+    def metrics(self) -> t.Dict[str, float]:
+        """Returns the latest reading as flat metrics (unknown values are left out)"""
+        reading = self.reading
+        values = {
+            "memory_current_bytes": reading.memory_current,
+            "memory_limit_bytes": reading.memory_limit,
+            "memory_usage_ratio": reading.memory_usage,
+            "memory_some_avg10": reading.memory_some_avg10,
+            "memory_full_avg10": reading.memory_full_avg10,
+            "cpu_some_avg10": reading.cpu_some_avg10,
+            "memory_pressure": float(reading.memory_pressure(self.thresholds)),
+            "cpu_pressure": float(reading.cpu_pressure(self.thresholds)),
+        }
+        return {name: float(value) for name, value in values.items() if value is not None}
+
+    def _log_transitions(self, reading: PressureReading):
+        memory_pressure = reading.memory_pressure(self.thresholds)
+        if memory_pressure != self._memory_pressure:
+            logger.warning("Memory pressure %s: %s", "started" if memory_pressure else "ended", reading)
+            self._memory_pressure = memory_pressure
+
+        cpu_pressure = reading.cpu_pressure(self.thresholds)
+        if cpu_pressure != self._cpu_pressure:
+            logger.warning("CPU pressure %s: %s", "started" if cpu_pressure else "ended", reading)
+            self._cpu_pressure = cpu_pressure
@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import statistics
+import structlog.stdlib
+import time
+import typing as t
+
+from dataclasses import dataclass
+from pathlib import Path
+
+from .cache import default_cache_directory, read_json, write_json
+from .threads import command_name
+
+
+logger = structlog.stdlib.get_logger("async_siril.progress")
+
+
+@dataclass
+class ProgressEstimate:
+    """How far a command got and when it should be done"""
+
+    # The command being estimated
+    command: str
+
+    # Latest progress reported by Siril (in %)
+    progress: float
+
+    # Seconds since the command started
+    elapsed: float
+
+    # Average progress per second since the command started (in %/s)
+    rate: float
+
+    # Estimated seconds until the command completes, None until there is something to estimate from
+    eta: t.Optional[float]
+
+    # Typical duration (in seconds) of previous runs of the same command on as many frames
+    expected_duration: t.Optional[float] = None
+
+
+class DurationHistory(object):
+    """
+    The durations of previous runs of each command (by command name and frame count), used to estimate how
+    long the next run will take. Only the latest `keep` durations of each key are kept. Can be persisted
+    as json in the cache directory to carry the history across sessions.
+    """
+
+    FILE_NAME = "durations.json"
+
+    def __init__(self, entries: t.Optional[t.Dict[str, t.List[float]]] = None, keep: int = 10):
+        self.entries: t.Dict[str, t.List[float]] = entries or {}
+        self.keep = keep
+
+    @staticmethod
+    def key(command: str, frames: t.Optional[int] = None) -> str:
+        return f"{command_name(command)}:{frames or 0}"
+
+    def expected(self, command: str, frames: t.Optional[int] = None) -> t.Optional[float]:
+        """Returns the median duration of the previous runs, None when the command never ran"""
+        durations = self.entries.get(self.key(command, frames))
+        return statistics.median(durations) if durations else None
+
+    def record(self, command: str, duration: float, frames: t.Optional[int] = None):
+        durations = self.entries.setdefault(self.key(command, frames), [])
+        durations.append(duration)
+        del durations[: -self.keep]
+
+    @staticmethod
+    def default_path() -> Path:
+        return default_cache_directory() / DurationHistory.FILE_NAME
+
+    def save(self, path: t.Optional[Path] = None):
+        write_json(path or self.default_path(), self.entries)
+
+    @staticmethod
+    def load(path: t.Optional[Path] = None) -> DurationHistory:
+        """Load a saved history (an empty history when there is none)"""
+        return DurationHistory(read_json(path or DurationHistory.default_path(), "duration history"))
+
+
+class ProgressTracker(object):
+    """
+    Follows the progress of one running command. Progress updates are coalesced: `update` only asks for one
+    to be published every `interval` seconds. The ETA extrapolates the progress curve and is blended with the
+    remaining time of the `expected` duration, trusting the curve more as the command progresses.
+    The command is timed from `started` (monotonic, defaults to now), when it was written to Siril.
+    """
+
+    def __init__(
+        self,
+        command: str,
+        expected: t.Optional[float] = None,
+        interval: float = 0.25,
+        started: t.Optional[float] = None,
+    ):
+        self.command = command
+        self.expected = expected
+        self.interval = interval
+        self.started = started if started is not None else time.monotonic()
+        self.progress = 0.0
+        self._published: t.Optional[float] = None
+
+    def update(self, progress: float) -> bool:
+        """Record the latest progress, returns whether it should be published now"""
+        self.progress = progress
+        now = time.monotonic()
+        if self._published is not None and now - self._published < self.interval:
+            return False
+        self._published = now
+        return True
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def estimate(self) -> ProgressEstimate:
+        elapsed = self.elapsed()
+        rate = self.progress / elapsed if elapsed > 0 else 0.0
+
+        curve = (100.0 - self.progress) / rate if rate > 0 else None
+        history = max(0.0, self.expected - elapsed) if self.expected is not None else None
+        if curve is not None and history is not None:
+            weight = min(1.0, self.progress / 100.0)
+            eta: t.Optional[float] = weight * curve + (1.0 - weight) * history
+        else:
+            eta = curve if curve is not None else history
+
+        return ProgressEstimate(
+            command=self.command,
+            progress=self.progress,
+            elapsed=elapsed,
+            rate=rate,
+            eta=eta,
+            expected_duration=self.expected,
+        )
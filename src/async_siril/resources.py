@@ -1,8 +1,22 @@
 from __future__ import annotations
+import math
+import os
 import typing as t
 
-from dataclasses import dataclass
-from .system import container_aware_cpu_limit, container_aware_memory_limit_gb
+from dataclasses import dataclass, field
+from .system import (
+    container_aware_cpu_limit,
+    container_aware_cpu_quota,
+    container_aware_memory_limit_bytes,
+    container_aware_memory_limit_gb,
+    host_cpu_count,
+    host_cpus,
+    set_process_scheduling,
+    total_memory,
+)
+
+# Thread pools of the libraries Siril links against (OpenMP, OpenBLAS, MKL) that read their size from the environment
+THREAD_ENVIRONMENT_VARIABLES = ["OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"]
 
 
 @dataclass
@@ -18,6 +32,57 @@ class SirilResource:
     # How much of the available memory to use (0.9 = 90%, default is 90%)
     memory_percent: float = 0.9
 
+    # CPU ids to pin the Siril process to (default is no pinning)
+    cpu_affinity: t.Optional[t.List[int]] = None
+
+    # Nice level of the Siril process (-20 to 19, higher is lower priority, default is inherited)
+    nice: t.Optional[int] = None
+
+    # I/O scheduling class of the Siril process (one of `psutil.IOPRIO_CLASS_*`, default is inherited)
+    io_class: t.Optional[int] = None
+
+    # I/O priority within the best-effort and realtime classes (0-7, lower is higher priority)
+    io_priority: t.Optional[int] = None
+
+    # Extra environment variables of the Siril process
+    environment: t.Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def threads(self) -> t.Optional[int]:
+        """Returns the number of threads Siril may use (the `cpu_limit`, or the pinned CPUs)"""
+        if self.cpu_limit is not None:
+            return self.cpu_limit
+        if self.cpu_affinity:
+            return len(self.cpu_affinity)
+        return None
+
+    def process_environment(self) -> t.Optional[t.Dict[str, str]]:
+        """
+        Returns the environment of the Siril process, with the library thread pools sized to `threads` so they
+        don't each start a thread per host CPU, or None to inherit the current environment unchanged
+        """
+        threads = self.threads
+        if threads is None and not self.environment:
+            return None
+
+        result = dict(os.environ)
+        if threads is not None:
+            result.update({name: str(threads) for name in THREAD_ENVIRONMENT_VARIABLES})
+        result.update(self.environment)
+        return result
+
+    def apply_scheduling(self, pid: int):
+        """Apply the CPU affinity, nice level and I/O priority to a started Siril process"""
+        if self.cpu_affinity is None and self.nice is None and self.io_class is None:
+            return
+        set_process_scheduling(
+            pid,
+            cpu_affinity=self.cpu_affinity,
+            nice=self.nice,
+            io_class=self.io_class,
+            io_priority=self.io_priority,
+        )
+
     @staticmethod
     def container_aware_limits() -> SirilResource:
         """Get the limits for Siril in a container environment"""
@@ -30,3 +95,98 @@ class SirilResource:
     def default_limits() -> SirilResource:
         """Get the default limits for Siril"""
         return SirilResource()
+
+
+@dataclass
+class WorkerPlan:
+    """How many Siril workers fit in the available CPUs & memory and the resources of each one"""
+
+    # CPUs available to all the workers (fractional for quotas like 2.5)
+    cpus: float
+
+    # Memory available to all the workers (in GB)
+    memory_gb: float
+
+    # The resources of each worker (`setcpu` and `core.mem_amount`)
+    resources: t.List[SirilResource] = field(default_factory=list)
+
+    @property
+    def workers(self) -> int:
+        """Returns the number of workers to run"""
+        return len(self.resources)
+
+    @staticmethod
+    def plan(
+        cpus: float,
+        memory_gb: float,
+        max_workers: t.Optional[int] = None,
+        cpus_per_worker: float = 2.0,
+        memory_gb_per_worker: float = 2.0,
+        memory_percent: float = 0.9,
+        pin_cpus: bool = False,
+    ) -> WorkerPlan:
+        """
+        Split `cpus` and `memory_gb` between as many workers as possible while giving each at least
+        `cpus_per_worker` and `memory_gb_per_worker` (there is always at least 1 worker). Only whole threads
+        are handed out so the sum of the `setcpu` values never exceeds a fractional quota, and each worker gets
+        an equal share of `memory_percent` of the memory. With `pin_cpus` each worker is pinned to its own
+        set of CPUs (see `pin`).
+        """
+        if cpus <= 0 or memory_gb <= 0:
+            raise ValueError("cpus and memory_gb must be greater than 0")
+
+        usable_memory_gb = memory_gb * memory_percent
+        workers = min(
+            math.floor(cpus / cpus_per_worker),
+            math.floor(usable_memory_gb / memory_gb_per_worker),
+        )
+        if max_workers is not None:
+            workers = min(workers, max_workers)
+        workers = max(1, workers)
+
+        threads = max(workers, math.floor(cpus))
+        memory_limit = "{:.2f}".format(usable_memory_gb / workers)
+        resources = [
+            SirilResource(
+                cpu_limit=threads // workers + (1 if index < threads % workers else 0), memory_limit=memory_limit
+            )
+            for index in range(workers)
+        ]
+        plan = WorkerPlan(cpus=cpus, memory_gb=memory_gb, resources=resources)
+        if pin_cpus:
+            plan.pin()
+        return plan
+
+    def pin(self, cpus: t.Optional[t.List[int]] = None):
+        """
+        Pin each worker to a disjoint, contiguous set of `cpus` (defaults to the CPUs this process may run on)
+        sized to its `cpu_limit`, so workers don't share cores and caches. Workers wrap around to the first
+        CPUs again when there are more threads than CPUs.
+        """
+        cpus = cpus or host_cpus()
+        start = 0
+        for resource in self.resources:
+            count = resource.cpu_limit or max(1, len(cpus) // max(1, self.workers))
+            resource.cpu_affinity = sorted({cpus[(start + index) % len(cpus)] for index in range(count)})
+            start += count
+
+    @staticmethod
+    def container_aware(
+        max_workers: t.Optional[int] = None,
+        cpus_per_worker: float = 2.0,
+        memory_gb_per_worker: float = 2.0,
+        memory_percent: float = 0.9,
+        pin_cpus: bool = False,
+    ) -> WorkerPlan:
+        """Plan the workers from the container (cgroup) limits, falling back to the host CPUs & memory"""
+        cpus = container_aware_cpu_quota() or float(host_cpu_count())
+        memory_bytes = container_aware_memory_limit_bytes() or total_memory()
+        return WorkerPlan.plan(
+            cpus=min(cpus, float(host_cpu_count())),
+            memory_gb=memory_bytes / 1024 / 1024 / 1024,
+            max_workers=max_workers,
+            cpus_per_worker=cpus_per_worker,
+            memory_gb_per_worker=memory_gb_per_worker,
+            memory_percent=memory_percent,
+            pin_cpus=pin_cpus,
+        )
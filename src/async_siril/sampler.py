@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import psutil
+import structlog.stdlib
+import time
+import typing as t
+
+from dataclasses import dataclass, field
+
+
+logger = structlog.stdlib.get_logger("async_siril.sampler")
+
+
+@dataclass
+class ProcessSample:
+    """Resource usage of the Siril process (and its child processes) at one point of a command"""
+
+    # Seconds since the command started
+    elapsed: float
+
+    # CPU usage since the previous sample (100 = one core busy)
+    cpu_percent: float
+
+    # Resident memory (in bytes)
+    rss: int
+
+    # Number of threads
+    threads: int
+
+    # Bytes read from storage since the command started
+    read_bytes: int
+
+    # Bytes written to storage since the command started
+    write_bytes: int
+
+
+@dataclass
+class CommandUsage:
+    """Resources used by the Siril process while running a command (or a pipelined batch of commands)"""
+
+    # The commands that were running
+    commands: t.List[str]
+
+    # Highest resident memory seen (in bytes)
+    peak_rss: int = 0
+
+    # Highest number of threads seen
+    peak_threads: int = 0
+
+    # CPU time used, summed over all the threads (in seconds)
+    cpu_seconds: float = 0.0
+
+    # Bytes read from storage
+    read_bytes: int = 0
+
+    # Bytes written to storage
+    write_bytes: int = 0
+
+    # The samples taken while the commands ran
+    samples: t.List[ProcessSample] = field(default_factory=list)
+
+
+@dataclass
+class _Counters:
+    rss: int = 0
+    threads: int = 0
+    cpu_seconds: float = 0.0
+    read_bytes: int = 0
+    write_bytes: int = 0
+    timestamp: float = 0.0
+
+
+class ProcessSampler(object):
+    """
+    Samples the CPU, memory, threads and I/O of the Siril process every `interval` seconds while a command is
+    being measured (nothing is sampled between commands). Processes Siril starts (like StarNet) are included.
+    CPU seconds and I/O bytes are the difference of the cumulative counters at the start and end of the
+    command so they are exact, the peaks are only as precise as the interval.
+    """
+
+    def __init__(self, pid: int, interval: float = 1.0):
+        self.pid = pid
+        self.interval = interval
+        self._process: t.Optional[psutil.Process] = None
+        self._task: t.Optional[asyncio.Task] = None
+        self._usage: t.Optional[CommandUsage] = None
+        self._baseline = _Counters()
+        self._previous = _Counters()
+        self._started = 0.0
+
+    def start(self):
+        try:
+            self._process = psutil.Process(self.pid)
+        except psutil.Error as e:
+            logger.warning(f"Could not sample Siril process {self.pid}: {e}")
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    @contextlib.contextmanager
+    def measure(self, commands: t.List[str]) -> t.Iterator[CommandUsage]:
+        """Sample the process during the `with` block, the yielded `CommandUsage` is complete once it exits"""
+        usage = CommandUsage(commands=list(commands))
+        self._baseline = self._read() or _Counters(timestamp=time.monotonic())
+        self._previous = self._baseline
+        self._started = self._baseline.timestamp
+        self._usage = usage
+        try:
+            yield usage
+        finally:
+            self._sample()
+            self._usage = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            if self._usage is not None:
+                self._sample()
+
+    def _sample(self):
+        usage = self._usage
+        if usage is None:
+            return
+        counters = self._read()
+        if counters is None:
+            return
+
+        wall = counters.timestamp - self._previous.timestamp
+        cpu = counters.cpu_seconds - self._previous.cpu_seconds
+        self._previous = counters
+
+        sample = ProcessSample(
+            elapsed=counters.timestamp - self._started,
+            cpu_percent=100.0 * cpu / wall if wall > 0 else 0.0,
+            rss=counters.rss,
+            threads=counters.threads,
+            read_bytes=counters.read_bytes - self._baseline.read_bytes,
+            write_bytes=counters.write_bytes - self._baseline.write_bytes,
+        )
+        usage.samples.append(sample)
+        usage.peak_rss = max(usage.peak_rss, sample.rss)
+        usage.peak_threads = max(usage.peak_threads, sample.threads)
+        usage.cpu_seconds = counters.cpu_seconds - self._baseline.cpu_seconds
+        usage.read_bytes = sample.read_bytes
+        usage.write_bytes = sample.write_bytes
+
+    def _read(self) -> t.Optional[_Counters]:
+        """Read the counters of the process and its children, None once the process is gone"""
+        if self._process is None:
+            return None
+        counters = _Counters(timestamp=time.monotonic())
+        try:
+            processes = [self._process, *self._process.children(recursive=True)]
+        except psutil.Error:
+            return None
+
+        for index, process in enumerate(processes):
+            try:
+                with process.oneshot():
+                    cpu_times = process.cpu_times()
+                    counters.rss += process.memory_info().rss
+                    counters.threads += process.num_threads()
+                    # Includes the CPU time of child processes that already exited
+                    counters.cpu_seconds += (
+                        cpu_times.user + cpu_times.system + cpu_times.children_user + cpu_times.children_system
+                    )
+                    if hasattr(process, "io_counters"):
+                        io = process.io_counters()
+                        counters.read_bytes += io.read_bytes
+                        counters.write_bytes += io.write_bytes
+            except psutil.AccessDenied:
+                continue
+            except psutil.Error:
+                if index == 0:
+                    return None
+        return counters
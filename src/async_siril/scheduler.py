@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import enum
+import heapq
+import itertools
+import structlog.stdlib
+import time
+import typing as t
+
+
+logger = structlog.stdlib.get_logger("async_siril.scheduler")
+
+
+class Priority(enum.IntEnum):
+    """Scheduling priority of a command, lower values run first"""
+
+    INTERACTIVE = 0
+    NORMAL = 10
+    BACKGROUND = 20
+
+
+class CommandScheduler(object):
+    """
+    Serializes access to a single Siril session so concurrent callers never read each other's responses.
+
+    Callers waiting for the session are served by priority and in arrival (FIFO) order within the same
+    priority. The slot is re-entrant for the task holding it, so a command can run nested commands
+    (like a restart) without deadlocking.
+    """
+
+    def __init__(self):
+        self._waiters: t.List[t.Tuple[int, int, asyncio.Future]] = []
+        self._counter = itertools.count()
+        self._busy = False
+        self._owner: t.Optional[asyncio.Task] = None
+
+    @property
+    def busy(self) -> bool:
+        """Whether a caller currently holds the session"""
+        return self._busy
+
+    @property
+    def waiting(self) -> int:
+        """Returns the number of callers waiting for the session"""
+        return sum(1 for _, _, future in self._waiters if not future.done())
+
+    @contextlib.asynccontextmanager
+    async def slot(self, priority: int = Priority.NORMAL) -> t.AsyncIterator[float]:
+        """Hold the session for the `async with` block, yields the seconds spent waiting for it"""
+        task = asyncio.current_task()
+        if self._owner is not None and self._owner is task:
+            yield 0.0
+            return
+
+        started = time.perf_counter()
+        await self._acquire(priority)
+        queue_wait = time.perf_counter() - started
+        self._owner = task
+        try:
+            yield queue_wait
+        finally:
+            self._owner = None
+            self._release()
+
+    async def _acquire(self, priority: int):
+        if not self._busy and not self.waiting:
+            self._busy = True
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (int(priority), next(self._counter), future))
+        logger.debug("Waiting for the Siril session (priority %d, %d waiting)", priority, len(self._waiters))
+        try:
+            await future
+        except asyncio.CancelledError:
+            # The session was handed over just as the caller got cancelled, pass it on
+            if future.done() and not future.cancelled():
+                self._release()
+            raise
+
+    def _release(self):
+        # Hand the session directly to the next waiter so no new caller can jump the queue
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self._busy = False
@@ -0,0 +1,288 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import signal
+import socket
+import structlog.stdlib
+import tempfile
+import typing as t
+from pathlib import Path
+
+from .pool import SirilPool
+from .resources import SirilResource, WorkerPlan
+from .sampler import CommandUsage
+from .scheduler import Priority
+from .siril import CommandResult, SirilCli, SirilCrashError, SirilError, SirilTimeoutError
+
+
+logger = structlog.stdlib.get_logger("async_siril.server")
+
+
+def default_socket_path() -> str:
+    """Returns the per user unix socket path used by `async-siril serve`"""
+    user = os.getuid() if hasattr(os, "getuid") else os.getpid()
+    return os.path.join(tempfile.gettempdir(), f"async_siril_{user}.sock")
+
+
+def encode_message(message: t.Dict[str, t.Any]) -> bytes:
+    """Encode a protocol message as a single json line"""
+    return (json.dumps(message) + "\n").encode()
+
+
+def encode_result(result: CommandResult) -> t.Dict[str, t.Any]:
+    """The `CommandResult` of a request as sent to the client (the usage without its samples)"""
+    return {
+        "commands": result.commands,
+        "priority": int(result.priority),
+        "queue_wait": result.queue_wait,
+        "memory_wait": result.memory_wait,
+        "duration": result.duration,
+        "usage": [
+            {
+                "commands": usage.commands,
+                "peak_rss": usage.peak_rss,
+                "peak_threads": usage.peak_threads,
+                "cpu_seconds": usage.cpu_seconds,
+                "read_bytes": usage.read_bytes,
+                "write_bytes": usage.write_bytes,
+            }
+            for usage in result.usage
+        ],
+    }
+
+
+def decode_result(message: t.Dict[str, t.Any]) -> CommandResult:
+    """Rebuild a `CommandResult` sent by the server"""
+    return CommandResult(
+        commands=list(message.get("commands", [])),
+        priority=message.get("priority", Priority.NORMAL),
+        queue_wait=message.get("queue_wait", 0.0),
+        memory_wait=message.get("memory_wait", 0.0),
+        duration=message.get("duration", 0.0),
+        usage=[CommandUsage(**usage) for usage in message.get("usage", [])],
+    )
+
+
+def error_response(request_id: t.Any, command: str, message: str) -> t.Dict[str, t.Any]:
+    return {"id": request_id, "ok": False, "error": {"command": command, "message": message}}
+
+
+def server_running(socket_path: str) -> bool:
+    """Whether a server accepts connections on the unix socket (a leftover socket file refuses them)"""
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(socket_path)
+        return True
+    except (ConnectionRefusedError, FileNotFoundError):
+        return False
+    finally:
+        client.close()
+
+
+class SirilServer(object):
+    """
+    Keeps warm Siril workers alive behind a local unix socket so short lived scripts can reuse them.
+
+    Each client connection is given one worker from the pool for as long as it stays connected. The
+    protocol is one json object per line, requests look like `{"id": 1, "command": "stack ..."}` (or a
+    list of commands, with optional `pipelined`, `timeout`, `priority` and `memory`) and every request gets
+    a response `{"id": 1, "ok": true, "result": {...}}` or an `error` object. A client takes a worker with its
+    first request, a worker lost to a timeout or a crash goes back to the pool (to be replaced) and the
+    client's next request runs on another one.
+    """
+
+    def __init__(self, pool: SirilPool, socket_path: t.Optional[str] = None):
+        self._pool = pool
+        self.socket_path = socket_path or default_socket_path()
+        self._server: t.Optional[asyncio.AbstractServer] = None
+
+        # The inode of the socket this server created, so it never removes the socket of another server
+        self._socket_inode: t.Optional[int] = None
+
+    async def start(self):
+        """Start the workers and listen on the unix socket, fails when another server is listening on it"""
+        if os.path.exists(self.socket_path):
+            if server_running(self.socket_path):
+                raise RuntimeError(f"A Siril server is already running on {self.socket_path}")
+            # Remove a stale socket left by a server that did not shut down cleanly
+            os.unlink(self.socket_path)
+
+        await self._pool.start()
+        self._server = await asyncio.start_unix_server(self._handle_client, path=self.socket_path)
+        os.chmod(self.socket_path, 0o600)
+        self._socket_inode = os.stat(self.socket_path).st_ino
+        logger.info("Siril server listening on %s", self.socket_path)
+
+    async def stop(self):
+        """Stop listening and stop all the workers"""
+        logger.info("Stopping Siril server")
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+        await self._pool.stop()
+        if self._socket_inode is not None:
+            try:
+                if os.stat(self.socket_path).st_ino == self._socket_inode:
+                    os.unlink(self.socket_path)
+            except FileNotFoundError:
+                pass
+            self._socket_inode = None
+        logger.info("Siril server stopped")
+
+    async def serve_forever(self):
+        """Serve clients until cancelled"""
+        if self._server is None:
+            raise RuntimeError("Server not started")
+        await self._server.serve_forever()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.stop()
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        logger.info("Siril client connected")
+        session = ClientSession(self._pool)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+
+                response, close = await self._handle_request(session, line)
+                writer.write(encode_message(response))
+                await writer.drain()
+                if close:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError) as e:
+            logger.info(f"Siril client connection lost: {e}")
+        finally:
+            await session.release()
+            writer.close()
+            logger.info("Siril client disconnected")
+
+    async def _handle_request(self, session: ClientSession, line: bytes) -> t.Tuple[t.Dict[str, t.Any], bool]:
+        """Run one request on the client's worker, returns the response and if the session should close"""
+        request: t.Any = None
+        try:
+            request = json.loads(line)
+            request_id = request.get("id")
+            commands = request["command"]
+            # Only the options the client sent are forwarded
+            options = {
+                name: kind(request[name])
+                for name, kind in (("timeout", float), ("priority", int), ("memory", int))
+                if request.get(name) is not None
+            }
+        except (ValueError, KeyError, AttributeError, TypeError) as e:
+            request_id = request.get("id") if isinstance(request, dict) else None
+            return error_response(request_id, "", f"invalid request: {e}"), False
+
+        commands = commands if isinstance(commands, list) else [commands]
+        # The worker outlives the client, `exit` only ends this client's session
+        close = "exit" in commands
+        commands = commands[: commands.index("exit")] if close else commands
+
+        result = CommandResult(commands=commands)
+        try:
+            if commands:
+                siril = await session.acquire()
+                result = await siril.command(commands, pipelined=bool(request.get("pipelined", False)), **options)
+        except (SirilTimeoutError, SirilCrashError) as e:
+            # The worker is gone, the pool replaces it and the next request runs on another one
+            logger.warning(f"Siril worker lost while running a client request: {e}")
+            await session.release()
+            return error_response(request_id, e.command, e.message), close
+        except SirilError as e:
+            return error_response(request_id, e.command, e.message), close
+        except Exception as e:
+            logger.warning(f"Siril client request failed: {e}")
+            return error_response(request_id, "", str(e)), close
+        return {"id": request_id, "ok": True, "result": encode_result(result)}, close
+
+
+class ClientSession(object):
+    """The worker of a connected client, taken from the pool with the first request that needs one"""
+
+    def __init__(self, pool: SirilPool):
+        self._pool = pool
+        self._stack = contextlib.AsyncExitStack()
+        self.worker: t.Optional[SirilCli] = None
+
+    async def acquire(self) -> SirilCli:
+        if self.worker is None:
+            self.worker = await self._stack.enter_async_context(self._pool.session())
+        return self.worker
+
+    async def release(self):
+        """Give the worker back to the pool (which replaces it when it is no longer running)"""
+        self.worker = None
+        await self._stack.aclose()
+
+
+async def serve(
+    socket_path: t.Optional[str] = None,
+    workers: int = 1,
+    siril_exe: str = "siril-cli",
+    directory: t.Optional[Path] = None,
+    resources: t.Union[SirilResource, t.List[SirilResource]] = SirilResource.default_limits(),
+):
+    """Run a Siril server until interrupted (SIGINT / SIGTERM)"""
+    # Reset workers between clients so one script's state never leaks into the next
+    pool = SirilPool(size=workers, siril_exe=siril_exe, directory=directory, resources=resources, reset_on_release=True)
+    async with SirilServer(pool, socket_path) as server:
+        task = asyncio.create_task(server.serve_forever())
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, task.cancel)
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+
+def main(argv: t.Optional[t.List[str]] = None):  # pragma: no cover
+    parser = argparse.ArgumentParser(prog="async-siril", description="Async Siril tools")
+    actions = parser.add_subparsers(dest="action", required=True)
+
+    serve_parser = actions.add_parser("serve", help="keep warm Siril workers alive behind a local unix socket")
+    serve_parser.add_argument("--socket", default=default_socket_path(), help="path of the unix socket")
+    serve_parser.add_argument("--workers", type=int, default=1, help="number of Siril processes to keep warm")
+    serve_parser.add_argument("--siril-exe", default="siril-cli", help="path to the siril-cli executable")
+    serve_parser.add_argument("--directory", type=Path, default=None, help="starting working directory")
+    serve_parser.add_argument(
+        "--container-limits",
+        action="store_true",
+        help="split the container (cgroup) cpu & memory limits between the workers, --workers becomes the maximum",
+    )
+    serve_parser.add_argument(
+        "--pin-cpus",
+        action="store_true",
+        help="with --container-limits, pin each worker to its own set of cpus",
+    )
+
+    args = parser.parse_args(argv)
+    if args.action == "serve":
+        workers = args.workers
+        resources: t.Union[SirilResource, t.List[SirilResource]] = SirilResource.default_limits()
+        if args.container_limits:
+            plan = WorkerPlan.container_aware(max_workers=args.workers, pin_cpus=args.pin_cpus)
+            logger.info("Planned %d workers for %.2f CPUs and %.2f GB", plan.workers, plan.cpus, plan.memory_gb)
+            workers, resources = plan.workers, plan.resources
+        asyncio.run(
+            serve(
+                socket_path=args.socket,
+                workers=workers,
+                siril_exe=args.siril_exe,
+                directory=args.directory,
+                resources=resources,
+            )
+        )
@@ -1,15 +1,32 @@
 import asyncio
 import asyncio.subprocess
+import collections
+import contextlib
+import logging
 import structlog.stdlib
 import os
 import platform
-import subprocess
+import re
+import time
 import typing as t
+import uuid
 
-from .command import BaseCommand, setcpu, set as siril_set, capabilities
+from .admission import MemoryAdmission
+from .cache import SirilCache, default_cache, probe_version
+from .command import BaseCommand, setcpu, set as siril_set, capabilities, requires, get, close, cd
 from .command_types import SirilSetting
-from .event import AsyncSirilEventConsumer, AsyncSirilCommandProducer
+from .event import AsyncSirilEventConsumer, AsyncSirilCommandProducer, EventQueuePolicy, EventQueueStats, SirilEvent
+from .event import session_pipe_directory, remove_pipe_directory
+from .handle import CommandHandle, EventHandler
+from .inflight import InFlightCommand, InFlightCommands
+from .output import OutputPolicy, OutputRing, StreamMode, read_stream
+from .progress import DurationHistory
 from .resources import SirilResource
+from .sampler import CommandUsage, ProcessSampler
+from .scheduler import CommandScheduler, Priority
+from .supervisor import RestartPolicy, SessionState
+from .threads import ThreadPolicy, command_name
+from dataclasses import dataclass, field
 from pathlib import Path
 
 
@@ -19,21 +36,136 @@ logger = structlog.stdlib.get_logger("async_siril")
 class SirilError(Exception):
     """Base class for Siril errors and exceptions"""
 
-    def __init__(self, cmd: str, message: str):
+    def __init__(self, cmd: str, message: str, output: t.Optional[t.List[str]] = None):
         self.command = cmd
         self.message = message
+
+        # The latest lines Siril wrote on its stdout and stderr before the error (see `OutputPolicy`)
+        self.output = output or []
         super().__init__(self.message)
 
     def __str__(self):
         return f"SirilError from command: `{self.command}` error: `{self.message}`"
 
 
+class SirilTimeoutError(SirilError):
+    """Raised when a command runs past its deadline, the Siril process is killed and the session is over"""
+
+    def __init__(self, cmd: str, elapsed: float, output: t.Optional[t.List[str]] = None):
+        self.elapsed = elapsed
+        super().__init__(cmd, f"timed out after {elapsed:.1f}s", output)
+
+
+class SirilCrashError(SirilError):
+    """Raised when the Siril process exits (closing its output pipe) while a command is running"""
+
+
+@dataclass
+class StartupTimings:
+    """Time spent (in seconds) in each phase of starting a Siril session"""
+
+    # Running (or reading the cache for) `siril-cli --version`
+    version_probe: float = 0.0
+
+    # From spawning the process until Siril opened both fifos (the open of its input fifo is the signal on
+    # linux, where the output fifo is opened without blocking)
+    fifo_open: float = 0.0
+
+    # From the fifos opening until Siril reports it is ready
+    ready: float = 0.0
+
+    # Sending `requires`, `setcpu` and the `set` commands
+    settings: float = 0.0
+
+    # Running `capabilities` (close to 0 when served from the cache)
+    capabilities: float = 0.0
+
+    # Whether the capabilities came from the cache
+    capabilities_cached: bool = False
+
+    @property
+    def total(self) -> float:
+        return self.version_probe + self.fifo_open + self.ready + self.settings + self.capabilities
+
+
+@dataclass
+class ResetReport:
+    """How long resetting a session took compared with (re)starting the Siril process"""
+
+    # Time spent resetting the session (in seconds)
+    duration: float
+
+    # Time the last start of this session took (in seconds)
+    restart_duration: float
+
+    @property
+    def saved(self) -> float:
+        """Seconds saved by resetting instead of restarting"""
+        return self.restart_duration - self.duration
+
+
+@dataclass
+class CommandResult:
+    """Timing of a `SirilCli.command` call"""
+
+    # The commands that were run
+    commands: t.List[str]
+
+    # Priority the call was scheduled with
+    priority: int = Priority.NORMAL
+
+    # Time spent waiting for other callers sharing the session (in seconds)
+    queue_wait: float = 0.0
+
+    # Time spent waiting for memory to be admitted (in seconds)
+    memory_wait: float = 0.0
+
+    # Time spent running the commands (in seconds)
+    duration: float = 0.0
+
+    # Resources used by each command (or pipelined batch), when the session samples its process
+    usage: t.List[CommandUsage] = field(default_factory=list)
+
+    @property
+    def peak_rss(self) -> int:
+        """Returns the highest resident memory (in bytes) of Siril while running the commands"""
+        return max((usage.peak_rss for usage in self.usage), default=0)
+
+    @property
+    def cpu_seconds(self) -> float:
+        """Returns the CPU time (in seconds) Siril used for the commands"""
+        return sum(usage.cpu_seconds for usage in self.usage)
+
+    @property
+    def read_bytes(self) -> int:
+        """Returns the bytes Siril read from storage for the commands"""
+        return sum(usage.read_bytes for usage in self.usage)
+
+    @property
+    def write_bytes(self) -> int:
+        """Returns the bytes Siril wrote to storage for the commands"""
+        return sum(usage.write_bytes for usage in self.usage)
+
+
+def parse_settings(lines: t.Iterable[str]) -> t.Dict[str, str]:
+    """Parse the `name = value` lines listed by `get -a`"""
+    settings = {}
+    for line in lines:
+        matches = re.match(r"^\s*([\w.]+)\s*=\s*(.*?)\s*$", line)
+        if matches:
+            settings[matches.group(1)] = matches.group(2)
+    return settings
+
+
 class SirilCli(object):
     """
     Main class for interacting with Siril using the async context manager pattern
 
     async with SirilCli() as siril:
         await siril.command("stack")
+
+    With `fast_start=True` the startup commands are pipelined in a single write and the `capabilities`
+    command is skipped when a cached result exists for the same executable and Siril version.
     """
 
     def __init__(
@@ -41,82 +173,255 @@ class SirilCli(object):
         siril_exe: str = "siril-cli",
         directory: t.Optional[Path] = None,
         resources: SirilResource = SirilResource.default_limits(),
+        cache: SirilCache = default_cache,
+        fast_start: bool = False,
+        command_timeout: t.Optional[float] = None,
+        session_timeout: t.Optional[float] = None,
+        restart_policy: t.Optional[RestartPolicy] = None,
+        admission: t.Optional[MemoryAdmission] = None,
+        thread_policy: t.Optional[ThreadPolicy] = None,
+        sample_interval: t.Optional[float] = None,
+        duration_history: t.Optional[DurationHistory] = None,
+        event_policy: t.Optional[EventQueuePolicy] = None,
+        output_policy: t.Optional[OutputPolicy] = None,
     ):
+        # Identifies the session in the logs, bound once so commands don't pay for it
+        self.session_id = uuid.uuid4().hex[:8]
+        self._logger = logger.bind(session=self.session_id)
+
         self._siril_exe = self._find_siril_cli(siril_exe)
-        logger.info("Found Siril CLI executable: %s", self._siril_exe)
+        self._logger.info("Found Siril CLI executable: %s", self._siril_exe)
 
         self._cwd = directory
         self._resources = resources
+        self._cache = cache
+        self._fast_start = fast_start
+
+        # Deadlines enforced while waiting on Siril, expiring one kills the process
+        self._command_timeout = command_timeout
+        self._session_timeout = session_timeout
+        self._session_deadline: t.Optional[float] = None
+
+        # Opt-in crash recovery, the state changing commands are tracked so they can be replayed after a restart
+        self._restart_policy = restart_policy
+        self.session_state = SessionState()
+        self.restarts = 0
+        # False while the process starts, its commands are neither restarted after a crash nor tracked
+        self._supervised = True
 
         self._process: t.Optional[asyncio.subprocess.Process] = None
-        self._consumer = AsyncSirilEventConsumer()
-        self._producer = AsyncSirilCommandProducer()
+        # Why the session was stopped (None while it may run commands), reported to the commands sent after it
+        self._stop_reason: t.Optional[str] = None
+        # Set once a command read that Siril closed its output pipe, until the process is started again
+        self._exited = False
+
+        # The commands written to Siril and not completed yet, their events are matched in FIFO order
+        self._in_flight = InFlightCommands()
+
+        # Bounds the queue of events read from Siril, counted across restarts
+        self._event_policy = event_policy or EventQueuePolicy()
+        self.event_stats = EventQueueStats()
+
+        # The latest stdout and stderr lines of the process, kept across restarts for the error reports
+        self._output_policy = output_policy or OutputPolicy()
+        self.output = OutputRing(self._output_policy.ring_size)
+        self._scheduler = CommandScheduler()
+        self._admission = admission
+
+        # The `setcpu` value currently set in Siril (None when unknown), adjusted per command by the policy
+        self._thread_policy = thread_policy
+        self._threads: t.Optional[int] = None
+
+        # Samples the resources of the Siril process while commands run (disabled without an interval)
+        self._sample_interval = sample_interval
+        self._sampler: t.Optional[ProcessSampler] = None
+
+        # Receives the events of the command currently running (only while a caller subscribed)
+        self._event_handler: t.Optional[EventHandler] = None
+
+        # Durations of the commands run through `submit`, used to estimate when the next runs complete
+        self.duration_history = duration_history or DurationHistory()
+        self._create_pipes()
         self._log_tasks = []
 
-        # Get the version of the executable
-        output = subprocess.Popen([self._siril_exe, "--version"], stdout=subprocess.PIPE)
-        response, _ = output.communicate()
-        self.version = response.decode().rstrip()
-        logger.info("Found %s version: %s", self._siril_exe, self.version)
+        # The version is probed (or read from the cache) when the process starts
+        self.version: t.Optional[str] = None
+        self.capabilities: t.List[str] = []
+        self.startup_timings = StartupTimings()
+
+        # Used by `reset` to return a process to a clean state between jobs
+        self._start_directory: t.Optional[Path] = None
+        self.settings_snapshot: t.Dict[str, str] = {}
+
+    def _create_pipes(self):
+        # Each session gets its own private pipe directory so multiple processes can run side by side
+        self._pipe_dir = session_pipe_directory()
+        self._consumer = AsyncSirilEventConsumer(
+            pipe_dir=self._pipe_dir, policy=self._event_policy, stats=self.event_stats, log=self._logger
+        )
+        self._producer = AsyncSirilCommandProducer(
+            pipe_dir=self._pipe_dir, log=self._logger, events=self._consumer.queue
+        )
+
+    @property
+    def running(self) -> bool:
+        """Whether the Siril process is alive (False once stopped or killed by a timeout)"""
+        return self._process is not None and self._process.returncode is None
+
+    def set_session_timeout(self, timeout: t.Optional[float]):
+        """Fail every command with `SirilTimeoutError` once `timeout` seconds have passed from now (None to disable)"""
+        self._session_timeout = timeout
+        self._session_deadline = None if timeout is None else time.monotonic() + timeout
 
     async def _start(self):
-        logger.debug("Initializing Siril CLI with Async Consumer & Producer")
+        self._stop_reason = None
+        self._exited = False
+        self.set_session_timeout(self._session_timeout)
+        timings = StartupTimings()
+        self.startup_timings = timings
+        phase_start = time.perf_counter()
+
+        # Get the version of the executable
+        self.version = await probe_version(self._siril_exe, self._cache)
+        self._logger.info("Found %s version: %s", self._siril_exe, self.version)
+        timings.version_probe = time.perf_counter() - phase_start
+
+        self._logger.debug("Initializing Siril CLI with Async Consumer & Producer")
+        phase_start = time.perf_counter()
         self._consumer.start()
-        logger.debug("Siril CLI outpipe: %s", self._consumer.pipe_path)
+        self._logger.debug("Siril CLI outpipe: %s", self._consumer.pipe_path)
         self._producer.start()
-        logger.debug("Siril CLI inpipe: %s", self._producer.pipe_path)
+        self._logger.debug("Siril CLI inpipe: %s", self._producer.pipe_path)
 
         params = ["--pipe", "--inpipe", self._producer.pipe_path, "--outpipe", self._consumer.pipe_path]
         if self._cwd is not None:
             params.insert(0, "-d")
             params.insert(1, str(self._cwd))
 
-        logger.info("Starting Siril CLI with params: %s", params)
+        self._logger.info("Starting Siril CLI with params: %s", params)
+        self._start_directory = Path(self._cwd) if self._cwd is not None else Path.cwd()
+        if self.session_state.directory is None:
+            self.session_state.directory = self._start_directory
+        environment = self._resources.process_environment()
+        reading = self._output_policy.mode != StreamMode.OFF
+        stream = asyncio.subprocess.PIPE if reading else asyncio.subprocess.DEVNULL
         self._process = await asyncio.create_subprocess_exec(
             self._siril_exe,
             *params,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE,
+            stdout=stream,
+            stderr=stream,
+            **({"env": environment} if environment is not None else {}),
         )
-        logger.info("Siril CLI process started")
+        self._resources.apply_scheduling(self._process.pid)
+        if self._sample_interval is not None:
+            self._sampler = ProcessSampler(self._process.pid, self._sample_interval)
+            self._sampler.start()
+        self._logger.info("Siril CLI process started")
 
         # Start logging tasks in background
-        self._log_tasks = [
-            asyncio.create_task(self._log_stream(self._process.stdout, "stdout")),
-            asyncio.create_task(self._log_stream(self._process.stderr, "stderr")),
-        ]
+        self._log_tasks = (
+            [
+                asyncio.create_task(self._log_stream(self._process.stdout, "stdout")),
+                asyncio.create_task(self._log_stream(self._process.stderr, "stderr")),
+            ]
+            if reading
+            else []
+        )
+
+        # Both fifos are connected before Siril reports it is ready
+        opening = {self._consumer.pipe_opened, self._producer.pipe_opened}
+        while opening and not self._consumer.siril_ready.done():
+            opened, _ = await asyncio.wait(opening | {self._consumer.siril_ready}, return_when=asyncio.FIRST_COMPLETED)
+            opening -= opened
+        self._threads = self._resources.cpu_limit
+        timings.fifo_open = time.perf_counter() - phase_start
+        phase_start = time.perf_counter()
 
         # Start reading and become ready when the CLI says so
         await self._consumer.siril_ready
-        logger.info("Siril CLI is now ready for startup commands")
+        self._logger.info("Siril CLI is now ready for startup commands")
+        timings.ready = time.perf_counter() - phase_start
 
-        # Call this command as the first thing we do for all sessions
-        from .command import requires
+        with self._unsupervised():
+            phase_start = time.perf_counter()
+            if self._fast_start:
+                await self.command(self._startup_commands(), pipelined=True)
+            else:
+                # Still needed as the first command to be called
+                await self.command(requires("0.99.10"))
+                if self._resources.cpu_limit is not None:
+                    await self.command(setcpu(self._resources.cpu_limit))
+                if self._resources.memory_limit is not None:
+                    await self.set(SirilSetting.MEM_MODE, "1")
+                    await self.set(SirilSetting.MEM_AMOUNT, self._resources.memory_limit)
 
-        # Still needed as the first command to be called
-        await self.command(requires("0.99.10"))
+                await self.set(SirilSetting.MEM_RATIO, str(self._resources.memory_percent))
+            timings.settings = time.perf_counter() - phase_start
+
+            phase_start = time.perf_counter()
+            if self._fast_start:
+                await self._load_capabilities()
+            else:
+                await self.command(capabilities())
+            timings.capabilities = time.perf_counter() - phase_start
+
+        self._logger.info("Siril startup timings: %s", timings)
+        self._logger.info("AsyncSiril is ready for additional commands")
+
+    def _startup_commands(self) -> t.List[BaseCommand]:
+        """The commands sent to every session before any other work"""
+        commands: t.List[BaseCommand] = [requires("0.99.10")]
         if self._resources.cpu_limit is not None:
-            await self.command(setcpu(self._resources.cpu_limit))
+            commands.append(setcpu(self._resources.cpu_limit))
         if self._resources.memory_limit is not None:
-            await self.set(SirilSetting.MEM_MODE, "1")
-            await self.set(SirilSetting.MEM_AMOUNT, self._resources.memory_limit)
+            commands.append(siril_set(key=SirilSetting.MEM_MODE, value="1"))
+            commands.append(siril_set(key=SirilSetting.MEM_AMOUNT, value=str(self._resources.memory_limit).lower()))
+        commands.append(siril_set(key=SirilSetting.MEM_RATIO, value=str(self._resources.memory_percent)))
+        return commands
+
+    async def _load_capabilities(self):
+        """Run `capabilities` unless a result is cached for this executable and version"""
+        cache_name = f"capabilities:{self.version}"
+        cached = self._cache.get(self._siril_exe, cache_name)
+        if cached is not None:
+            self._logger.info("Using cached Siril capabilities")
+            self.capabilities = list(cached)
+            self.startup_timings.capabilities_cached = True
+            return
 
-        await self.set(SirilSetting.MEM_RATIO, str(self._resources.memory_percent))
-        await self.command(capabilities())
-        logger.info("AsyncSiril is ready for additional commands")
+        lines: t.List[str] = []
+
+        def collect(event: SirilEvent):
+            if event.value == SirilEvent.LOG and event.message:
+                lines.append(event.message)
+
+        await self._run_command(str(capabilities()), on_event=collect)
+        self.capabilities = lines
+        self._cache.set(self._siril_exe, cache_name, lines)
 
     async def _stop(self):
-        logger.info("Stopping AsyncSiril process")
+        self._logger.info("Stopping AsyncSiril process")
         try:
+            if self._sampler is not None:
+                await self._sampler.stop()
+                self._sampler = None
+
             # Kill process first to break pipe connections and unblock I/O
             if self._process and self._process.returncode is None:
-                self._process.kill()
+                try:
+                    self._process.kill()
+                except ProcessLookupError:
+                    self._logger.info("Siril CLI Process already exited")
                 await self._process.wait()
-                logger.info("Siril CLI Process killed")
+                self._logger.info("Siril CLI Process killed")
+
+            # Nothing written to the old process will report anymore
+            self._in_flight.clear()
 
             # Now stop consumer and producer - they should exit naturally since pipes are broken
             await self._consumer.stop()
             await self._producer.stop()
+            remove_pipe_directory(self._pipe_dir)
 
             # Cancel and wait for log tasks
             for task in self._log_tasks:
@@ -126,26 +431,48 @@ class SirilCli(object):
             try:
                 await asyncio.wait_for(asyncio.gather(*self._log_tasks, return_exceptions=True), timeout=1.0)
             except asyncio.TimeoutError:
-                logger.warning("Log tasks did not cancel in time")
-            logger.info("AsyncSiril Cleanup completed")
+                self._logger.warning("Log tasks did not cancel in time")
+            self._logger.info("AsyncSiril Cleanup completed")
         except Exception as e:
-            logger.error("error during close: %s" % e)
+            self._logger.error("error during close", error=str(e))
 
     async def _log_stream(self, stream, stream_name):
-        """Read lines from a subprocess stream and log them via structlog."""
+        """Read lines from a subprocess stream, keep and log them according to the `OutputPolicy`."""
         try:
-            while True:
-                line = await stream.readline()
-                if not line:
-                    break
-                decoded = line.decode().rstrip()
-                logger.info("siril_output", stream=stream_name, message=decoded)
+            await read_stream(stream, stream_name, self._output_policy, self.output)
         except asyncio.CancelledError:
-            logger.debug(f"Log stream {stream_name} cancelled")
+            self._logger.debug("Log stream cancelled", stream=stream_name)
             raise
 
-    async def command(self, cmd: t.Union[str, t.List[str], BaseCommand, t.List[BaseCommand]]):
-        """Will run a command on the Siril pipe and throw `SirilError`'s as it sees them."""
+    async def command(
+        self,
+        cmd: t.Union[str, t.List[str], BaseCommand, t.List[BaseCommand]],
+        pipelined: bool = False,
+        timeout: t.Optional[float] = None,
+        priority: int = Priority.NORMAL,
+        memory: t.Optional[int] = None,
+        on_event: t.Optional[EventHandler] = None,
+    ) -> CommandResult:
+        """
+        Will run a command on the Siril pipe and throw `SirilError`'s as it sees them.
+        With `pipelined=True` a list of commands is written ahead using `pipeline`.
+
+        `timeout` (defaults to the `command_timeout` of the session) applies to each command, when it expires
+        the Siril process is killed and `SirilTimeoutError` is raised.
+
+        Concurrent callers sharing the session are served one call at a time, by `priority` (lower first) and
+        then in arrival order. The returned `CommandResult` records how long the call waited for its turn.
+
+        With a `MemoryAdmission` the call first waits until `memory` bytes (see `estimate_stack_memory` and
+        `estimate_register_memory`) can be reserved.
+
+        With a `sample_interval` the result also records the peak memory, CPU time and I/O of each command.
+
+        `on_event` is called with the command and each of its events, up to its final status (see also `submit`).
+
+        Cancelling the call doesn't stop Siril: the commands it left running (see `in_flight`) complete before the
+        next command is written and their events are discarded (or see `drain`), the session remains usable.
+        """
 
         def is_list_of_types(lst, _type):
             if lst and isinstance(lst, list):
@@ -154,50 +481,559 @@ class SirilCli(object):
                 return False
 
         if isinstance(cmd, str) or isinstance(cmd, BaseCommand):
-            await self._run_command(str(cmd))
+            commands = [str(cmd)]
         elif is_list_of_types(cmd, str) or is_list_of_types(cmd, BaseCommand):
-            for c in cmd:
-                await self._run_command(str(c))
+            commands = [str(c) for c in cmd]
         else:
-            logger.error("incorrect command type")
+            self._logger.error("incorrect command type")
+            return CommandResult(commands=[], priority=priority)
+
+        result = CommandResult(commands=commands, priority=priority)
+        async with contextlib.AsyncExitStack() as stack:
+            if memory is not None and self._admission is not None:
+                result.memory_wait = await stack.enter_async_context(self._admission.reserve(memory))
+            await self._run_scheduled(result, pipelined and isinstance(cmd, list), timeout, on_event)
+        return result
+
+    def submit(
+        self,
+        cmd: t.Union[str, t.List[str], BaseCommand, t.List[BaseCommand]],
+        pipelined: bool = False,
+        timeout: t.Optional[float] = None,
+        priority: int = Priority.NORMAL,
+        memory: t.Optional[int] = None,
+        frames: t.Optional[int] = None,
+        progress_interval: float = 0.25,
+        max_events: int = 1000,
+    ) -> CommandHandle:
+        """
+        Start a `command` in the background and return its `CommandHandle`, iterate the handle for the
+        events of the commands and await it for the `CommandResult`. The handle coalesces the progress events
+        to one every `progress_interval` seconds and estimates the ETA of each command, from its progress
+        and the `duration_history` of the same command on as many `frames`. Up to `max_events` events wait
+        for the iteration, past that the handle drops log events first.
+        """
+        handle = CommandHandle(self.duration_history, frames, progress_interval, max_events, self._command_sent)
+        handle._start(self.command(cmd, pipelined, timeout, priority, memory, on_event=handle._on_event))
+        return handle
+
+    async def _run_scheduled(
+        self,
+        result: CommandResult,
+        pipelined: bool,
+        timeout: t.Optional[float],
+        on_event: t.Optional[EventHandler] = None,
+    ):
+        commands = result.commands
+        async with self._scheduler.slot(result.priority) as queue_wait:
+            result.queue_wait = queue_wait
+            started = time.perf_counter()
+            if pipelined:
+                with self._lease_threads(commands) as threads:
+                    await self._apply_threads(threads, timeout)
+                    with self._measure(commands, result), self._subscribe(on_event):
+                        await self._run_supervised_pipeline(commands, timeout)
+            else:
+                for c in commands:
+                    with self._lease_threads([c]) as threads:
+                        await self._apply_threads(threads, timeout)
+                        with self._measure([c], result), self._subscribe(on_event):
+                            await self._run_supervised(c, timeout)
+            result.duration = time.perf_counter() - started
+
+    def _lease_threads(self, commands: t.List[str]) -> t.ContextManager[t.Optional[int]]:
+        if self._thread_policy is None:
+            return contextlib.nullcontext()
+        return self._thread_policy.lease(commands)
+
+    @contextlib.contextmanager
+    def _measure(self, commands: t.List[str], result: CommandResult) -> t.Iterator[None]:
+        """Record the resources used by the commands in the result (when sampling is enabled)"""
+        if self._sampler is None:
+            yield
+            return
+        with self._sampler.measure(commands) as usage:
+            result.usage.append(usage)
+            yield
+
+    @contextlib.contextmanager
+    def _subscribe(self, on_event: t.Optional[EventHandler]) -> t.Iterator[None]:
+        """Route the events of the commands run in the `with` block to `on_event`"""
+        if on_event is None:
+            yield
+            return
+        self._event_handler = on_event
+        try:
+            yield
+        finally:
+            self._event_handler = None
+
+    async def _apply_threads(self, threads: t.Optional[int], timeout: t.Optional[float]):
+        """Send `setcpu` when the thread policy picked a different thread count than the one set"""
+        if threads is None or threads == self._threads:
+            return
+        self._logger.debug("Setting Siril threads to %d", threads)
+        await self._run_supervised(str(setcpu(threads)), timeout)
+        self._threads = threads
+
+    async def _run_supervised(self, _command: str, timeout: t.Optional[float]):
+        """Run a command, restarting Siril and retrying it when the process dies (with a `restart_policy`)"""
+        attempt = 0
+        while True:
+            try:
+                await self._run_command(_command, timeout=timeout)
+                break
+            except SirilCrashError as e:
+                recovered = await self._recover(e, attempt + 1)
+                if recovered is None or not self._restart_policy.retry_command:  # type: ignore
+                    raise
+                attempt = recovered
+        self._track(_command)
+
+    async def _run_supervised_pipeline(self, commands: t.List[str], timeout: t.Optional[float]):
+        """Pipeline commands, after a crash Siril is restarted and the pipeline resumes from the interrupted command"""
+        attempt = 0
+        while True:
+            futures = await self.pipeline(commands, timeout=timeout)
+            for index, future in enumerate(futures):
+                if future.cancelled():
+                    continue
+                error = future.exception()
+                if error is None:
+                    self._track(commands[index])
+                    continue
+
+                recovered = await self._recover(error, attempt + 1) if isinstance(error, SirilCrashError) else None
+                if recovered is not None and self._restart_policy.retry_command:  # type: ignore
+                    attempt = recovered
+                    commands = commands[index:]
+                    break
+                raise error
+            else:
+                return
+
+    def _track(self, _command: str):
+        if command_name(_command) == "setcpu":
+            # Also set by callers (`autotune`), so the thread policy knows what is applied
+            try:
+                self._threads = int(_command.split()[1])
+            except (IndexError, ValueError):
+                self._threads = None
+        if self._restart_policy is not None and self._supervised:
+            self.session_state.track(_command)
+
+    @contextlib.contextmanager
+    def without_thread_policy(self) -> t.Iterator[None]:
+        """
+        The commands run in the `with` block keep the thread count set with `setcpu` instead of the one picked
+        by the `thread_policy` (used by `autotune` to measure each thread count)
+        """
+        policy, self._thread_policy = self._thread_policy, None
+        try:
+            yield
+        finally:
+            self._thread_policy = policy
+
+    @contextlib.contextmanager
+    def _unsupervised(self) -> t.Iterator[None]:
+        """The commands run in the `with` block are neither restarted after a crash nor tracked"""
+        supervised, self._supervised = self._supervised, False
+        try:
+            yield
+        finally:
+            self._supervised = supervised
+
+    async def _recover(self, error: SirilCrashError, attempt: int) -> t.Optional[int]:
+        """
+        Restart Siril according to the `restart_policy`, a restart that crashes as well counts as the next
+        attempt. Returns the attempt that restarted Siril, or None when the error should be raised.
+        """
+        policy = self._restart_policy
+        if policy is None or not self._supervised:
+            return None
+
+        while attempt <= policy.max_restarts:
+            delay = policy.delay(attempt)
+            self._logger.warning(
+                "Siril exited, restarting",
+                command=error.command,
+                delay=delay,
+                attempt=attempt,
+                max_restarts=policy.max_restarts,
+            )
+            await asyncio.sleep(delay)
+            try:
+                await self.restart()
+                return attempt
+            except SirilCrashError as e:
+                error = e
+                attempt += 1
+        return None
+
+    async def restart(self):
+        """Restart the Siril process with fresh pipes and replay the tracked `session_state`"""
+        async with self._scheduler.slot(Priority.INTERACTIVE):
+            await self._restart()
+
+    async def _restart(self):
+        deadline = self._session_deadline
+        # The replayed commands belong to no caller
+        handler, self._event_handler = self._event_handler, None
+        try:
+            await self._stop()
+            self._create_pipes()
+            try:
+                await self._start()
+            finally:
+                # A restart doesn't extend the session deadline
+                self._session_deadline = deadline
+
+            replay = self.session_state.replay_commands()
+            self._logger.info("Replaying Siril session state: %s", replay)
+            for future in await self.pipeline(replay):
+                if not future.cancelled() and future.exception() is not None:
+                    raise future.exception()  # type: ignore
+        finally:
+            self._event_handler = handler
+        self.restarts += 1
+        self._logger.info("Siril restarted (%d restarts)", self.restarts)
+
+    async def pipeline(
+        self,
+        cmds: t.Sequence[t.Union[str, BaseCommand]],
+        depth: int = 16,
+        abandon_timeout: float = 1.0,
+        timeout: t.Optional[float] = None,
+        priority: int = Priority.NORMAL,
+    ) -> t.List[asyncio.Future]:
+        """
+        Write up to `depth` commands ahead of Siril instead of waiting for each one to complete.
+        The `status` events are matched to the commands in FIFO order and one future is returned per
+        command once the pipeline has settled: a result of `None` on success or a `SirilError`.
+
+        When a command fails the remaining work is abandoned: commands not yet written are never sent
+        and their futures (and those of commands already written after the failure) are cancelled.
+        Siril empties its own queue after an error so the already written commands are drained until
+        they report back or Siril stays quiet for `abandon_timeout` seconds.
+
+        `timeout` is measured for each command from the moment the previous one completed, when it expires
+        the process is killed and `SirilTimeoutError` is raised.
+
+        Like `command`, the pipeline waits for its turn on the session by `priority`.
+        """
+        if depth < 1:
+            raise ValueError("pipeline depth must be at least 1")
+
+        async with self._scheduler.slot(priority):
+            return await self._pipeline(cmds, depth, abandon_timeout, timeout)
+
+    async def _pipeline(
+        self,
+        cmds: t.Sequence[t.Union[str, BaseCommand]],
+        depth: int,
+        abandon_timeout: float,
+        timeout: t.Optional[float],
+    ) -> t.List[asyncio.Future]:
+
+        commands = [str(c) for c in cmds]
+        loop = asyncio.get_running_loop()
+        futures = [loop.create_future() for _ in commands]
+        in_flight: collections.deque[int] = collections.deque()
+        next_index = 0
+        failed = False
+        error = self._unavailable(commands[0]) if commands else None
+        if error is not None:
+            futures[0].set_exception(error)
+            for future in futures[1:]:
+                future.cancel()
+            return futures
+
+        if self._in_flight:
+            await self._drain_in_flight(quiet_timeout=abandon_timeout)
+        started, deadline = time.monotonic(), self._deadline(timeout)
+
+        self._logger.info("pipelining %d commands with depth %d", len(commands), depth)
+        while next_index < len(commands) or in_flight:
+            # Keep the window full, the producer coalesces these into a single write
+            while next_index < len(commands) and len(in_flight) < depth and commands[next_index] != "exit":
+                await self._producer.send(commands[next_index])
+                self._in_flight.open(commands[next_index])
+                in_flight.append(next_index)
+                next_index += 1
+
+            if not in_flight:
+                break
+
+            result = await self._next_event(commands[in_flight[0]], started, deadline)
+            self._consumer.queue.task_done()
+            if self._event_handler is not None:
+                self._event_handler(commands[in_flight[0]], result)
+            if result.closed:
+                self._logger.info("Siril exited with %d commands in flight", len(in_flight))
+                self._in_flight.clear()
+                self._exited = True
+                error = SirilCrashError(commands[in_flight[0]], result.message, self.output.tail())
+                futures[in_flight[0]].set_exception(error)
+                failed = True
+                break
+
+            if not result.completed:
+                continue
+
+            index = in_flight.popleft()
+            self._in_flight.complete()
+            started, deadline = time.monotonic(), self._deadline(timeout)
+            if result.errored:
+                self._logger.info("pipelined command errored, abandoning %d in flight", len(in_flight))
+                futures[index].set_exception(SirilError(commands[index], result.message, self.output.tail()))
+                await self._drain_abandoned(len(in_flight), abandon_timeout)
+                in_flight.clear()
+                self._in_flight.clear()
+                failed = True
+                break
+
+            futures[index].set_result(None)
+
+        # Use the special command to close the wrapper once everything before it completed
+        if not failed and next_index < len(commands) and commands[next_index] == "exit":
+            await self._run_command("exit")
+            futures[next_index].set_result(None)
+
+        for future in futures:
+            if not future.done():
+                future.cancel()
+        self._logger.info("Pipeline completed")
+        return futures
+
+    async def _drain_in_flight(self, timeout: t.Optional[float] = None, quiet_timeout: float = 1.0):
+        """
+        Read the events of the commands left in flight by cancelled calls until they complete, so they are
+        not attributed to the next command. Each of them gets its own `timeout` (defaults to the
+        `command_timeout` of the session) from the moment the previous one completed, expiring it kills the
+        process like any command would.
+        """
+        drained = 0
+        started, deadline = time.monotonic(), self._deadline(timeout)
+        while self._in_flight:
+            record = self._in_flight.oldest
+            assert record is not None
+            result = await self._next_event(record.command, started, deadline)
+            self._consumer.queue.task_done()
+            drained += 1
+
+            if result.closed:
+                # Siril is gone, the command about to be written finds out about it
+                self._in_flight.clear()
+                self._consumer.queue.put_nowait(result)
+                return
+
+            if not (result.completed or result.siril_ready):
+                continue
+
+            self._in_flight.complete()
+            self._logger.info(
+                "drained cancelled command",
+                command=record.command,
+                correlation_id=record.id,
+                status=result.status,
+                events=drained,
+            )
+            drained = 0
+            started, deadline = time.monotonic(), self._deadline(timeout)
+            if result.errored and self._in_flight:
+                # Siril empties its queue after an error, the commands written after it may never report
+                await self._drain_abandoned(len(self._in_flight), quiet_timeout)
+                self._in_flight.clear()
+
+    async def drain(self, timeout: t.Optional[float] = None):
+        """
+        Wait for the commands left running by cancelled calls to complete, discarding their events. The next
+        command does it anyway, this lets a pool clean a session before handing it out again. When `timeout`
+        (defaults to the `command_timeout` of the session) expires the process is killed.
+        """
+        if not self._in_flight:
+            return
+        async with self._scheduler.slot(Priority.INTERACTIVE):
+            await self._drain_in_flight(timeout)
+
+    def _command_sent(self) -> t.Optional[float]:
+        """When the command the next events belong to was written to Siril (monotonic)"""
+        record = self._in_flight.oldest
+        return record.sent if record is not None else None
+
+    @property
+    def in_flight(self) -> t.List[InFlightCommand]:
+        """The commands written to Siril whose final status wasn't read yet (left behind by cancelled calls)"""
+        return list(self._in_flight)
+
+    async def _drain_abandoned(self, count: int, quiet_timeout: float):
+        """Consume the completion events of abandoned commands so they aren't matched to later commands"""
+        while count > 0:
+            try:
+                result = await asyncio.wait_for(self._consumer.queue.get(), timeout=quiet_timeout)
+            except asyncio.TimeoutError:
+                self._logger.debug("Siril went quiet with %d abandoned commands unreported", count)
+                break
+            self._consumer.queue.task_done()
+            if result.completed:
+                count -= 1
 
     async def failable_command(self, cmd: t.Union[str, BaseCommand]) -> bool:
         """Will run a command on the Siril pipe and return a bool result if successful (catching any errors)"""
         try:
             await self.command(cmd)
             return True
+        except SirilTimeoutError:
+            # The process was killed, there is nothing left to retry on
+            raise
         except SirilError as siril_error:
-            logger.warn(f"Error caught by failable_command: {str(siril_error)}")
+            self._logger.warning("Error caught by failable_command", error=str(siril_error))
             return False
 
-    async def _run_command(self, _command: str):
+    def _unavailable(self, _command: str) -> t.Optional[SirilError]:
+        """The error of a command sent once the session can't run commands anymore (None while it can)"""
+        if self._stop_reason is not None:
+            return SirilError(_command, f"the Siril session was {self._stop_reason}", self.output.tail())
+        # A crash or broken input pipe that wasn't recovered, restarting is left to the `restart_policy` of the caller
+        if (
+            self._exited
+            or self._consumer.fifo_closed.done()
+            or self._producer.error is not None
+            or (self._process is not None and not self.running)
+        ):
+            return SirilCrashError(_command, "Siril is no longer running", self.output.tail())
+        return None
+
+    def _deadline(self, timeout: t.Optional[float] = None) -> t.Optional[float]:
+        """The monotonic time a command started now must complete by (the earliest of command & session)"""
+        timeout = timeout if timeout is not None else self._command_timeout
+        deadlines = [] if timeout is None else [time.monotonic() + timeout]
+        if self._session_deadline is not None:
+            deadlines.append(self._session_deadline)
+        return min(deadlines, default=None)
+
+    async def _next_event(self, _command: str, started: float, deadline: t.Optional[float]) -> SirilEvent:
+        """Wait for the next event from Siril, killing the process if the deadline passes first"""
+        if deadline is None:
+            return await self._consumer.queue.get()
+
+        try:
+            return await asyncio.wait_for(self._consumer.queue.get(), timeout=max(deadline - time.monotonic(), 0))
+        except asyncio.TimeoutError:
+            pass
+
+        self._logger.error("command exceeded its deadline, killing the Siril process", command=_command)
+        self._stop_reason = "stopped by its deadline"
+        await self.stop()
+        raise SirilTimeoutError(_command, time.monotonic() - started, self.output.tail())
+
+    async def _run_command(
+        self,
+        _command: str,
+        on_event: t.Optional[t.Callable[[SirilEvent], None]] = None,
+        timeout: t.Optional[float] = None,
+    ):
         # Use the special command to close the wrapper
         if _command == "exit":
             await self.stop()
             return
 
-        logger.info(f"running command: '{_command}'")
+        # Nothing would ever answer a command written to a stopped session
+        error = self._unavailable(_command)
+        if error is not None:
+            raise error
 
-        # Write the command first
+        # The level is checked once per command instead of on every call
+        log = self._logger
+        verbose = log.is_enabled_for(logging.INFO)
+
+        # Write the command first, once the commands of cancelled calls are out of the way (the command's
+        # own timeout starts after them)
+        if self._in_flight:
+            await self._drain_in_flight()
+        started = time.monotonic()
+        deadline = self._deadline(timeout)
         await self._producer.send(_command)
+        record = self._in_flight.open(_command)
+        if verbose:
+            log.info("running command", command=_command, correlation_id=record.id)
 
         # Read it the events off the listening queue
-        while True:
-            result = await self._consumer.queue.get()
-            self._consumer.queue.task_done()
+        try:
+            while True:
+                result = await self._next_event(_command, started, deadline)
+                self._consumer.queue.task_done()
+                if self._event_handler is not None:
+                    self._event_handler(_command, result)
 
-            if result.errored:
-                logger.info("result errored")
-                raise SirilError(_command, result.message)
+                if result.errored:
+                    self._in_flight.complete()
+                    if verbose:
+                        log.info("command errored", command=_command, correlation_id=record.id, message=result.message)
+                    raise SirilError(_command, result.message, self.output.tail())
 
-            if result.completed:
-                logger.info("result completed")
-                break
+                if result.completed or result.siril_ready:
+                    self._in_flight.complete()
+                    if result.siril_ready and verbose:
+                        log.info("siril ready", command=_command, correlation_id=record.id)
+                    break
 
-            if result.siril_ready:
-                logger.info("siril ready")
-                break
-        logger.info("Command completed")
+                if result.closed:
+                    self._in_flight.clear()
+                    self._exited = True
+                    if verbose:
+                        log.info("siril exited", command=_command, correlation_id=record.id)
+                    raise SirilCrashError(_command, result.message, self.output.tail())
+
+                if on_event is not None:
+                    on_event(result)
+        except asyncio.CancelledError:
+            # Siril keeps running the command, its remaining events are drained before the next one is written
+            log.info("command cancelled", command=_command, correlation_id=record.id, in_flight=len(self._in_flight))
+            raise
+        if verbose:
+            log.info("command completed", command=_command, correlation_id=record.id)
+
+    async def snapshot_settings(
+        self, keys: t.Optional[t.Iterable[t.Union[str, SirilSetting]]] = None
+    ) -> t.Dict[str, str]:
+        """
+        Save the current values of the settings restored by `reset` (captured with `get -a`).
+        By default all the `SirilSetting` keys are saved.
+        """
+        names = [k.value if isinstance(k, SirilSetting) else k for k in (keys or list(SirilSetting))]
+        lines: t.List[str] = []
+
+        def collect(event: SirilEvent):
+            if event.message:
+                lines.append(event.message)
+
+        async with self._scheduler.slot():
+            await self._run_command(str(get(list_all=True)), on_event=collect)
+        settings = parse_settings(lines)
+        self.settings_snapshot = {name: settings[name] for name in names if name in settings}
+        self._logger.info("Saved Siril settings snapshot: %s", self.settings_snapshot)
+        return self.settings_snapshot
+
+    async def reset(self) -> ResetReport:
+        """
+        Return the process to a clean state so it can serve another unrelated job: closes any loaded image
+        or sequence, goes back to the starting working directory and reapplies the `snapshot_settings`.
+        """
+        started = time.perf_counter()
+        commands: t.List[BaseCommand] = [close()]
+        if self._start_directory is not None:
+            commands.append(cd(self._start_directory))
+        for key, value in self.settings_snapshot.items():
+            value = value.lower() if value.lower() in ("true", "false") else value
+            commands.append(siril_set(key=key, value=value))
+
+        await self.command(commands, pipelined=True)
+        report = ResetReport(duration=time.perf_counter() - started, restart_duration=self.startup_timings.total)
+        self._logger.info(
+            "Siril session reset in %.3fs (last start took %.3fs)", report.duration, report.restart_duration
+        )
+        return report
 
     async def set(self, key: SirilSetting, value: str | bool):
         """Set a Siril setting using the `set` command"""
@@ -215,12 +1051,14 @@ class SirilCli(object):
     async def start(self):
         """Manually start the Siril process and pipes"""
         await self._start()
-        logger.info("SirilCli started")
+        self._logger.info("SirilCli started")
 
     async def stop(self):
         """Manually stop the Siril process and pipes"""
+        if self._stop_reason is None:
+            self._stop_reason = "stopped"
         await self._stop()
-        logger.info("SirilCli stopped")
+        self._logger.info("SirilCli stopped")
 
     def _find_siril_cli(self, siril_exe: str = "siril-cli") -> str:
         """Find the path to the Siril CLI executable"""
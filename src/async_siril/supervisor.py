@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import os
+import shlex
+import structlog.stdlib
+import typing as t
+
+from dataclasses import dataclass
+from pathlib import Path
+
+
+logger = structlog.stdlib.get_logger("async_siril.supervisor")
+
+
+@dataclass
+class RestartPolicy:
+    """How a supervised `SirilCli` recovers when the Siril process dies in the middle of a session"""
+
+    # How many times the process may be restarted for a single command before giving up
+    max_restarts: int = 3
+
+    # Run the command that was interrupted again once the session is restored
+    retry_command: bool = True
+
+    # Seconds to wait before the first restart, doubled for each following attempt
+    backoff: float = 1.0
+
+    # Upper bound of the wait between restarts (in seconds)
+    max_backoff: float = 30.0
+
+    def delay(self, attempt: int) -> float:
+        """Returns the seconds to wait before restart number `attempt` (starting at 1)"""
+        return min(self.backoff * (2 ** (attempt - 1)), self.max_backoff)
+
+
+class SessionState(object):
+    """
+    Tracks the state changing commands run in a session (`cd`, `setext`, `set32bits` / `set16bits`,
+    `setcompress` and `set`) so the same state can be replayed on a freshly started Siril process.
+    Only the latest value of each setting is kept and the working directory is tracked as an absolute path.
+    """
+
+    def __init__(self, directory: t.Optional[Path] = None):
+        self.directory = directory
+        self.extension: t.Optional[str] = None
+        self.bit_depth: t.Optional[str] = None
+        self.compression: t.Optional[str] = None
+        self.settings: t.Dict[str, str] = {}
+
+    def track(self, command: str):
+        """Record a successful command if it changes the session state"""
+        name, _, arguments = command.partition(" ")
+        if name not in self._TRACKED:
+            return
+
+        try:
+            self._TRACKED[name](self, name, shlex.split(arguments))
+        except (ValueError, IndexError) as e:
+            logger.warning(f"Could not track session state of '{command}': {e}")
+
+    def replay_commands(self) -> t.List[str]:
+        """Returns the commands that restore the tracked state"""
+        from .command import cd
+
+        commands: t.List[str] = []
+        if self.directory is not None:
+            commands.append(str(cd(self.directory)))
+        if self.extension is not None:
+            commands.append(f"setext {self.extension}")
+        if self.bit_depth is not None:
+            commands.append(self.bit_depth)
+        if self.compression is not None:
+            commands.append(self.compression)
+        commands.extend(self.settings.values())
+        return commands
+
+    def _track_cd(self, _name: str, arguments: t.List[str]):
+        path = Path(os.path.expanduser(arguments[0]))
+        if not path.is_absolute():
+            path = (self.directory or Path.cwd()) / path
+        self.directory = Path(os.path.normpath(path))
+
+    def _track_setext(self, _name: str, arguments: t.List[str]):
+        self.extension = arguments[0]
+
+    def _track_bit_depth(self, name: str, _arguments: t.List[str]):
+        self.bit_depth = name
+
+    def _track_setcompress(self, name: str, arguments: t.List[str]):
+        self.compression = shlex.join([name, *arguments])
+
+    def _track_set(self, name: str, arguments: t.List[str]):
+        # `set -import=file.ini` is replayed as is, `set key=value` replaces the previous value of the key
+        argument = arguments[0]
+        key = argument if argument.startswith("-") else argument.partition("=")[0]
+        self.settings.pop(key, None)
+        self.settings[key] = shlex.join([name, argument])
+
+    _TRACKED: t.Dict[str, t.Callable[[SessionState, str, t.List[str]], None]] = {
+        "cd": _track_cd,
+        "setext": _track_setext,
+        "set32bits": _track_bit_depth,
+        "set16bits": _track_bit_depth,
+        "setcompress": _track_setcompress,
+        "set": _track_set,
+    }
@@ -1,3 +1,4 @@
+import math
 import structlog.stdlib
 import os
 import os.path
@@ -42,7 +43,11 @@ def process_info():
     return info
 
 
-def container_aware_memory_limit_gb() -> t.Optional[str]:
+# cgroup v1 reports "no limit" as a huge page aligned value close to the max int64
+UNLIMITED_MEMORY_BYTES = 2**62
+
+
+def container_aware_memory_limit_bytes() -> t.Optional[int]:
     memory_limit_paths = [
         "/sys/fs/cgroup/memory/memory.limit_in_bytes",
         "/sys/fs/cgroup/memory/memory.low",
@@ -53,16 +58,56 @@ def container_aware_memory_limit_gb() -> t.Optional[str]:
         "/sys/fs/cgroup/memory.max",
     ]
 
+    # cgroup v2 `max` is not an int and is skipped by `read_int`
     for _file in memory_limit_paths:
         raw_result = read_int(_file)
-        if raw_result is not None and raw_result > 0:
+        if raw_result is not None and 0 < raw_result < UNLIMITED_MEMORY_BYTES:
             logger.debug(f"found non-zero value in: {_file} - {raw_result}")
-            gb_value = raw_result / 1024 / 1024 / 1024
-            return "{:.2f}".format(gb_value)
+            return raw_result
     return None
 
 
-def container_aware_cpu_limit() -> t.Optional[int]:
+def container_memory_current() -> t.Optional[int]:
+    """Returns the memory (in bytes) currently charged to the container cgroup, or None outside a cgroup"""
+    for _file in ["/sys/fs/cgroup/memory.current", "/sys/fs/cgroup/memory/memory.usage_in_bytes"]:
+        raw_result = read_int(_file)
+        if raw_result is not None:
+            return raw_result
+    return None
+
+
+def read_pressure(_file) -> t.Optional[t.Dict[str, t.Dict[str, float]]]:
+    """
+    Parse a pressure stall information file (like `/sys/fs/cgroup/memory.pressure`) into
+    `{"some": {"avg10": ..., "avg60": ..., "avg300": ..., "total": ...}, "full": {...}}`,
+    or None when the file doesn't exist (cgroup v1, or a kernel without PSI)
+    """
+    try:
+        with open(_file) as f:
+            lines = f.readlines()
+    except OSError:
+        return None
+
+    result: t.Dict[str, t.Dict[str, float]] = {}
+    for line in lines:
+        kind, _, fields = line.strip().partition(" ")
+        try:
+            result[kind] = {key: float(value) for key, _, value in (item.partition("=") for item in fields.split())}
+        except ValueError:
+            logger.debug(f"invalid pressure line in {_file}: {line}")
+    return result
+
+
+def container_aware_memory_limit_gb() -> t.Optional[str]:
+    raw_result = container_aware_memory_limit_bytes()
+    if raw_result is None:
+        return None
+    gb_value = raw_result / 1024 / 1024 / 1024
+    return "{:.2f}".format(gb_value)
+
+
+def container_aware_cpu_quota() -> t.Optional[float]:
+    """Returns the cgroup CPU quota in (possibly fractional) CPUs, or None when the container is not limited"""
     # cgroup v1
     cgroup1_period_file = "/sys/fs/cgroup/cpu/cpu.cfs_period_us"
     cgroup1_quota_file = "/sys/fs/cgroup/cpu/cpu.cfs_quota_us"  # k8s cpu limit
@@ -72,28 +117,99 @@ def container_aware_cpu_limit() -> t.Optional[int]:
         cpu_period_us = read_int(cgroup1_period_file)
         if cpu_quota_us is not None and cpu_period_us is not None:
             logger.debug(f"found cgroup1 CPU limit - quota: {cpu_quota_us}, period: {cpu_period_us}")
-            return int(cpu_quota_us / cpu_period_us)
+            # A quota of -1 means unlimited
+            if cpu_quota_us > 0 and cpu_period_us > 0:
+                return cpu_quota_us / cpu_period_us
         else:
             logger.debug("no valid cgroup1 quota or period found")
 
     # cgroup v2
     cgroup2_file = "/sys/fs/cgroup/cpu.max"
     if os.path.exists(cgroup2_file):
-        logger.debug("found cgroup1 memory limit")
+        logger.debug("found cgroup2 CPU limit")
         with open(cgroup2_file) as f:
             try:
                 combined = f.readline()
                 values = combined.split(" ")
                 if len(values) >= 2:
+                    if values[0] == "max":
+                        logger.debug("cgroup2 CPU quota is unlimited")
+                        return None
                     cpu_quota_us = int(values[0])
                     cpu_period_us = int(values[1])
-                    return int(cpu_quota_us / cpu_period_us)
+                    if cpu_quota_us > 0 and cpu_period_us > 0:
+                        return cpu_quota_us / cpu_period_us
             except ValueError as e:  # noqa: F841
                 logger.debug("no valid cgroup2 quota or period found")
                 pass
     return None
 
 
+def container_aware_cpu_limit() -> t.Optional[int]:
+    """Returns the cgroup CPU quota as a whole number of threads (at least 1), or None when not limited"""
+    quota = container_aware_cpu_quota()
+    if quota is None:
+        return None
+    return max(1, math.floor(quota))
+
+
+def host_cpus() -> t.List[int]:
+    """Returns the ids of the CPUs this process may run on"""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def host_cpu_count() -> int:
+    """Returns the number of CPUs this process may run on"""
+    return len(host_cpus())
+
+
+def set_process_scheduling(
+    pid: int,
+    cpu_affinity: t.Optional[t.List[int]] = None,
+    nice: t.Optional[int] = None,
+    io_class: t.Optional[int] = None,
+    io_priority: t.Optional[int] = None,
+):
+    """
+    Pin a process to `cpu_affinity`, and set its `nice` level and I/O priority (`io_class` is one of the
+    `psutil.IOPRIO_CLASS_*` values, `io_priority` 0-7 for the best-effort and realtime classes). Linux applies
+    these per thread, so every thread the process already started is updated (new ones inherit them).
+    Settings the platform doesn't support or the user isn't allowed to change are logged and skipped.
+    """
+    try:
+        threads = [thread.id for thread in psutil.Process(pid).threads()] or [pid]
+    except psutil.Error as e:
+        logger.warning(f"Could not list the threads of process {pid}: {e}")
+        threads = [pid]
+
+    settings: t.List[t.Tuple[str, t.Callable[[psutil.Process], t.Any]]] = []
+    if cpu_affinity is not None:
+        settings.append(("cpu affinity", lambda thread: thread.cpu_affinity(cpu_affinity)))
+    if nice is not None:
+        settings.append(("nice level", lambda thread: thread.nice(nice)))
+    if io_class is not None:
+        settings.append(("I/O priority", lambda thread: thread.ionice(io_class, io_priority)))
+
+    # A setting that fails doesn't prevent the others, nor the other threads, from being updated
+    for tid in threads:
+        try:
+            thread = psutil.Process(tid)
+        except psutil.Error as e:
+            logger.warning(f"Could not find thread {tid} of process {pid}: {e}")
+            continue
+        for name, apply in settings:
+            try:
+                apply(thread)
+            except (psutil.Error, OSError, ValueError, AttributeError) as e:
+                logger.warning(f"Could not set the {name} of process {pid} (thread {tid}): {e}")
+
+
+def total_memory() -> int:
+    return psutil.virtual_memory().total
+
+
 def read_int(_file) -> t.Optional[int]:
     if os.path.exists(_file):
         with open(_file) as f:
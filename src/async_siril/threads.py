@@ -0,0 +1,235 @@
+from __future__ import annotations
+
+import contextlib
+import enum
+import structlog.stdlib
+import typing as t
+from pathlib import Path
+
+from .cache import default_cache_directory, read_json, write_json
+from .command import setcpu
+from .pressure import PressureMonitor
+from .system import container_aware_cpu_limit, host_cpu_count
+
+if t.TYPE_CHECKING:
+    from .siril import SirilCli
+
+
+logger = structlog.stdlib.get_logger("async_siril.threads")
+
+
+class CommandClass(enum.IntEnum):
+    """How a command uses the CPU, a batch of commands is treated as its heaviest class"""
+
+    # Changes settings or state, the thread count doesn't matter
+    LIGHT = 0
+
+    # Mostly reads and writes files, more than a couple of threads rarely helps
+    IO = 1
+
+    # Scales with the number of threads
+    COMPUTE = 2
+
+
+IO_COMMANDS = {
+    "convert",
+    "convertraw",
+    "link",
+    "load",
+    "save",
+    "savebmp",
+    "savejpg",
+    "savejxl",
+    "savepng",
+    "savepnm",
+    "savetif",
+    "savetif32",
+    "savetif8",
+    "seqheader",
+    "sequpdate_key",
+    "seqsplit_cfa",
+    "split",
+}
+
+COMPUTE_COMMANDS = {
+    "calibrate",
+    "cosme",
+    "denoise",
+    "findstar",
+    "makepsf",
+    "pcc",
+    "platesolve",
+    "register",
+    "rl",
+    "sb",
+    "seqapplyreg",
+    "seqcosme",
+    "seqfindstar",
+    "seqplatesolve",
+    "seqrl",
+    "seqsb",
+    "seqstarnet",
+    "seqsubsky",
+    "seqwiener",
+    "spcc",
+    "stack",
+    "stackall",
+    "starnet",
+    "subsky",
+    "wiener",
+}
+
+
+def command_name(command: str) -> str:
+    return command.partition(" ")[0]
+
+
+def classify(command: str) -> CommandClass:
+    """Returns the `CommandClass` of a command string"""
+    name = command_name(command)
+    if name in COMPUTE_COMMANDS:
+        return CommandClass.COMPUTE
+    if name in IO_COMMANDS:
+        return CommandClass.IO
+    return CommandClass.LIGHT
+
+
+class ThreadTable(object):
+    """
+    The thread count each command scales up to on this machine, measured by `autotune` and persisted as json
+    in the cache directory. The measured durations are kept alongside so the table can be inspected.
+    """
+
+    FILE_NAME = "thread_table.json"
+
+    def __init__(self, entries: t.Optional[t.Dict[str, t.Dict[str, t.Any]]] = None):
+        self.entries: t.Dict[str, t.Dict[str, t.Any]] = entries or {}
+
+    @staticmethod
+    def default_path() -> Path:
+        return default_cache_directory() / ThreadTable.FILE_NAME
+
+    def best_threads(self, name: str) -> t.Optional[int]:
+        """Returns the tuned thread count of a command name, or None when it wasn't measured"""
+        entry = self.entries.get(name)
+        return int(entry["threads"]) if entry else None
+
+    def record(self, name: str, durations: t.Dict[int, float], efficiency: float = 0.9) -> int:
+        """
+        Store the durations measured for each thread count and pick the smallest thread count whose speed is
+        within `efficiency` of the fastest one (adding threads past it barely helps)
+        """
+        fastest = min(durations.values())
+        threads = min(n for n, duration in durations.items() if fastest / duration >= efficiency)
+        self.entries[name] = {"threads": threads, "durations": {str(n): d for n, d in sorted(durations.items())}}
+        return threads
+
+    def save(self, path: t.Optional[Path] = None):
+        write_json(path or self.default_path(), self.entries)
+
+    @staticmethod
+    def load(path: t.Optional[Path] = None) -> ThreadTable:
+        """Load a saved table (an empty table when there is none)"""
+        return ThreadTable(read_json(path or ThreadTable.default_path(), "thread table"))
+
+
+class ThreadPolicy(object):
+    """
+    Decides the `setcpu` value of each command and shares `total_threads` (defaults to the container CPU limit)
+    between the commands running at the same time, for example on the workers of a `SirilPool`.
+
+    IO commands are capped at `io_threads`, compute commands at their tuned value from the `table` (or all the
+    threads) and light commands keep whatever is set. A command gets an equal share of the threads between
+    the running commands, limited to the threads not already handed out, so shares rebalance as commands
+    start and finish. Every command gets at least 1 thread. With a `PressureMonitor` commands starting while
+    the container is under CPU pressure get half of their cap.
+    """
+
+    def __init__(
+        self,
+        total_threads: t.Optional[int] = None,
+        io_threads: int = 2,
+        table: t.Optional[ThreadTable] = None,
+        pressure: t.Optional[PressureMonitor] = None,
+    ):
+        self.total_threads = total_threads or container_aware_cpu_limit() or host_cpu_count()
+        self.io_threads = io_threads
+        self.table = table or ThreadTable()
+        self.pressure = pressure
+        self._allocated = 0
+        self._running = 0
+
+    @property
+    def allocated(self) -> int:
+        """Returns the threads handed out to running commands"""
+        return self._allocated
+
+    @property
+    def running(self) -> int:
+        """Returns the number of running commands holding threads"""
+        return self._running
+
+    def threads_for(self, commands: t.Sequence[str]) -> t.Optional[int]:
+        """Returns the thread count to use for a batch of commands, or None to leave it unchanged"""
+        heaviest = max(commands, key=classify, default="")
+        command_class = classify(heaviest)
+        if command_class == CommandClass.LIGHT:
+            return None
+
+        cap = self.table.best_threads(command_name(heaviest))
+        if cap is None:
+            cap = self.io_threads if command_class == CommandClass.IO else self.total_threads
+        if self.pressure is not None and self.pressure.cpu_pressure:
+            cap = cap // 2
+
+        fair_share = self.total_threads // (self._running + 1)
+        free = self.total_threads - self._allocated
+        return max(1, min(cap, fair_share, free))
+
+    @contextlib.contextmanager
+    def lease(self, commands: t.Sequence[str]) -> t.Iterator[t.Optional[int]]:
+        """Hold threads for the commands during the `with` block, yields the thread count (or None)"""
+        threads = self.threads_for(commands)
+        if threads is None:
+            yield None
+            return
+
+        self._allocated += threads
+        self._running += 1
+        try:
+            yield threads
+        finally:
+            self._allocated -= threads
+            self._running -= 1
+
+
+async def autotune(
+    siril: SirilCli,
+    benchmarks: t.Dict[str, t.Union[str, t.List[str]]],
+    thread_counts: t.Optional[t.List[int]] = None,
+    efficiency: float = 0.9,
+    table: t.Optional[ThreadTable] = None,
+) -> ThreadTable:
+    """
+    Measure how commands scale on this machine. Each benchmark (a command or list of commands that can run
+    repeatedly, keyed by the command name to tune) runs once per thread count and the results are recorded
+    in the table (see `ThreadTable.record`). Save the table and give it to a `ThreadPolicy` to use it.
+    The `thread_policy` of the session is bypassed while measuring.
+    """
+    table = table or ThreadTable()
+    if thread_counts is None:
+        total = container_aware_cpu_limit() or host_cpu_count()
+        thread_counts = sorted({n for n in (1, 2, 4, 8, 16, 32, 64) if n < total} | {total})
+
+    with siril.without_thread_policy():
+        for name, commands in benchmarks.items():
+            durations: t.Dict[int, float] = {}
+            for threads in thread_counts:
+                await siril.command(setcpu(threads))
+                result = await siril.command(commands)
+                durations[threads] = result.duration
+                logger.info(f"autotune {name} with {threads} threads: {result.duration:.3f}s")
+
+            best = table.record(name, durations, efficiency)
+            logger.info(f"autotune {name} scales up to {best} threads")
+    return table
@@ -1,6 +1,10 @@
+import asyncio
+import os
+import stat
+import sys
 import pytest
 from unittest.mock import patch, AsyncMock, MagicMock
-from async_siril.event import PipeMode, PipeClient
+from async_siril.event import PipeMode, PipeClient, session_pipe_directory, remove_pipe_directory
 
 
 class TestPipeMode:
@@ -38,6 +42,42 @@ class TestPipeMode:
         mode = PipeMode.WRITE
         assert mode.default_path == r"\\.\pipe\siril_command.in"
 
+    def test_session_path_read(self):
+        assert PipeMode.READ.session_path("/tmp/session") == "/tmp/session/siril_command.out"
+
+    def test_session_path_write(self):
+        assert PipeMode.WRITE.session_path("/tmp/session") == "/tmp/session/siril_command.in"
+
+
+class TestSessionPipeDirectory:
+    @patch("sys.platform", "linux")
+    def test_session_pipe_directory_is_unique(self):
+        first = session_pipe_directory()
+        second = session_pipe_directory()
+
+        assert first is not None and second is not None
+        assert first != second
+        assert os.path.basename(first).startswith("async_siril_")
+        # Nothing is created until the pipes are
+        assert not os.path.exists(first)
+
+    @patch("sys.platform", "win32")
+    def test_session_pipe_directory_windows(self):
+        assert session_pipe_directory() is None
+
+    def test_remove_pipe_directory(self, tmp_path):
+        directory = tmp_path / "session"
+        directory.mkdir()
+        (directory / "leftover").touch()
+
+        remove_pipe_directory(str(directory))
+
+        assert not directory.exists()
+
+    def test_remove_pipe_directory_none(self):
+        # Should not raise an error
+        remove_pipe_directory(None)
+
 
 class TestPipeClient:
     def test_pipe_client_init_read_mode(self):
@@ -122,6 +162,45 @@ class TestPipeClient:
             client = PipeClient(PipeMode.WRITE)
             assert client._open_mode == "wb"
 
+    @patch("sys.platform", "linux")
+    def test_pipe_client_init_with_directory(self, tmp_path):
+        directory = str(tmp_path / "session")
+        with patch("asyncio.get_event_loop"):
+            client = PipeClient(PipeMode.READ, directory=directory)
+
+            assert client.path == os.path.join(directory, "siril_command.out")
+            assert client.directory == directory
+            assert not os.path.exists(directory)
+
+    @pytest.mark.skipif(not hasattr(os, "mkfifo"), reason="named pipes are unix only")
+    def test_create_with_directory(self, tmp_path):
+        directory = str(tmp_path / "session")
+        with patch("asyncio.get_event_loop"):
+            reader = PipeClient(PipeMode.READ, directory=directory)
+            writer = PipeClient(PipeMode.WRITE, directory=directory)
+            reader.create()
+            writer.create()
+
+            assert stat.S_IMODE(os.stat(directory).st_mode) == 0o700
+            assert stat.S_ISFIFO(os.stat(reader.path).st_mode)
+            assert stat.S_ISFIFO(os.stat(writer.path).st_mode)
+
+            # Creating again is a no-op
+            reader.create()
+
+            reader.close()
+            writer.close()
+            assert not os.path.exists(reader.path)
+            assert not os.path.exists(writer.path)
+
+    @patch("os.mkfifo")
+    def test_create_without_directory(self, mock_mkfifo):
+        with patch("asyncio.get_event_loop"):
+            client = PipeClient(PipeMode.READ)
+            client.create()
+
+            mock_mkfifo.assert_not_called()
+
     def test_close_with_no_file(self):
         with patch("asyncio.get_event_loop"):
             client = PipeClient(PipeMode.READ)
@@ -259,6 +338,29 @@ class TestPipeClient:
                 mock_executor.assert_any_call(None, mock_file.write, b"test message\n")
                 mock_executor.assert_any_call(None, mock_file.flush)
 
+    @pytest.mark.asyncio
+    @patch("sys.platform", "darwin")
+    async def test_write_lines_single_write_and_flush(self):
+        with patch("asyncio.get_event_loop"):
+            client = PipeClient(PipeMode.WRITE)
+            mock_file = MagicMock()
+            client._file = mock_file
+
+            with patch.object(client._loop, "run_in_executor", new_callable=AsyncMock) as mock_executor:
+                await client.write_lines(["cmd1", "cmd2", "cmd3"])
+
+                assert mock_executor.call_count == 2
+                mock_executor.assert_any_call(None, mock_file.write, "cmd1\ncmd2\ncmd3\n")
+                mock_executor.assert_any_call(None, mock_file.flush)
+
+    @pytest.mark.asyncio
+    async def test_write_lines_wrong_mode(self):
+        with patch("asyncio.get_event_loop"):
+            client = PipeClient(PipeMode.READ)
+
+            with pytest.raises(RuntimeError, match="Pipe not in write mode"):
+                await client.write_lines(["test message"])
+
     @pytest.mark.asyncio
     async def test_read_line_wrong_mode(self):
         with patch("asyncio.get_event_loop"):
@@ -369,3 +471,177 @@ class TestPipeClient:
 
                 expected_bytes = "test message\n".encode("latin-1")
                 mock_executor.assert_any_call(None, mock_file.write, expected_bytes)
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="non-blocking reader is linux only")
+class TestNonBlockingPipeReader:
+    @pytest.fixture
+    def fifo_path(self, tmp_path):
+        path = tmp_path / "siril_command.out"
+        os.mkfifo(path)
+        return str(path)
+
+    async def connected_reader(self, fifo_path):
+        client = PipeClient(PipeMode.READ, nonblocking=True)
+        client.path = fifo_path
+        await client.connect()
+        writer_fd = os.open(fifo_path, os.O_WRONLY)
+        return client, writer_fd
+
+    def test_nonblocking_default_on_linux(self):
+        with patch("sys.platform", "linux"), patch("asyncio.get_event_loop"):
+            assert PipeClient(PipeMode.READ).nonblocking is True
+
+    def test_nonblocking_default_off_elsewhere(self):
+        with patch("sys.platform", "darwin"), patch("asyncio.get_event_loop"):
+            assert PipeClient(PipeMode.READ).nonblocking is False
+
+    @pytest.mark.asyncio
+    async def test_connect_does_not_use_threads(self, fifo_path):
+        client = PipeClient(PipeMode.READ, nonblocking=True)
+        client.path = fifo_path
+
+        with patch("asyncio.to_thread") as mock_to_thread:
+            await client.connect()
+
+        mock_to_thread.assert_not_called()
+        assert client._fd is not None
+        client.close()
+
+    @pytest.mark.asyncio
+    async def test_read_lines_without_executor(self, fifo_path):
+        client, writer_fd = await self.connected_reader(fifo_path)
+
+        with patch.object(client._loop, "run_in_executor") as mock_executor:
+            os.write(writer_fd, b"ready\nlog: first\nprogress: 50\nstatus: success stack\n")
+            lines = [await client.read_line() for _ in range(4)]
+
+        mock_executor.assert_not_called()
+        assert lines == ["ready", "log: first", "progress: 50", "status: success stack"]
+        os.close(writer_fd)
+        client.close()
+
+    @pytest.mark.asyncio
+    async def test_read_line_waits_for_partial_line(self, fifo_path):
+        client, writer_fd = await self.connected_reader(fifo_path)
+
+        reader = asyncio.create_task(client.read_line())
+        os.write(writer_fd, b"log: par")
+        await asyncio.sleep(0.01)
+        assert not reader.done()
+
+        os.write(writer_fd, b"tial\n")
+        assert await asyncio.wait_for(reader, timeout=1.0) == "log: partial"
+        os.close(writer_fd)
+        client.close()
+
+    @pytest.mark.asyncio
+    async def test_read_line_skips_blank_lines(self, fifo_path):
+        client, writer_fd = await self.connected_reader(fifo_path)
+
+        os.write(writer_fd, b"\n\r\nlog: after blank\n")
+        assert await asyncio.wait_for(client.read_line(), timeout=1.0) == "log: after blank"
+        os.close(writer_fd)
+        client.close()
+
+    @pytest.mark.asyncio
+    async def test_read_line_eof(self, fifo_path):
+        client, writer_fd = await self.connected_reader(fifo_path)
+
+        os.write(writer_fd, b"log: last\nstatus: exit")
+        os.close(writer_fd)
+
+        assert await asyncio.wait_for(client.read_line(), timeout=1.0) == "log: last"
+        assert await asyncio.wait_for(client.read_line(), timeout=1.0) == "status: exit"
+        assert await asyncio.wait_for(client.read_line(), timeout=1.0) == ""
+        client.close()
+
+    @pytest.mark.asyncio
+    async def test_read_line_large_burst(self, fifo_path):
+        client, writer_fd = await self.connected_reader(fifo_path)
+        expected = [f"progress: {i % 100}" for i in range(5000)]
+
+        async def write_all():
+            payload = ("\n".join(expected) + "\n").encode()
+            # The fifo buffer is smaller than the payload so write from a thread
+            await asyncio.to_thread(os.write, writer_fd, payload)
+            os.close(writer_fd)
+
+        writer = asyncio.create_task(write_all())
+        lines = []
+        while (line := await asyncio.wait_for(client.read_line(), timeout=2.0)) != "":
+            lines.append(line)
+        await writer
+
+        assert lines == expected
+        client.close()
+
+    @pytest.mark.asyncio
+    async def test_close_wakes_pending_reader(self, fifo_path):
+        client, writer_fd = await self.connected_reader(fifo_path)
+
+        reader = asyncio.create_task(client.read_line())
+        await asyncio.sleep(0.01)
+        client.close()
+
+        assert await asyncio.wait_for(reader, timeout=1.0) == ""
+        os.close(writer_fd)
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="non-blocking writer is linux only")
+class TestNonBlockingPipeWriter:
+    @pytest.fixture
+    def fifo_path(self, tmp_path):
+        path = tmp_path / "siril_command.in"
+        os.mkfifo(path)
+        return str(path)
+
+    @pytest.mark.asyncio
+    async def test_connect_sets_nonblocking(self, fifo_path):
+        reader_fd = os.open(fifo_path, os.O_RDONLY | os.O_NONBLOCK)
+        client = PipeClient(PipeMode.WRITE, nonblocking=True)
+        client.path = fifo_path
+        await client.connect()
+
+        assert client._fd is not None
+        assert os.get_blocking(client._fd) is False
+        client.close()
+        os.close(reader_fd)
+
+    @pytest.mark.asyncio
+    async def test_write_lines_single_syscall(self, fifo_path):
+        reader_fd = os.open(fifo_path, os.O_RDONLY | os.O_NONBLOCK)
+        client = PipeClient(PipeMode.WRITE, nonblocking=True)
+        client.path = fifo_path
+        await client.connect()
+
+        with patch("os.write", wraps=os.write) as mock_write:
+            await client.write_lines(["setext fits", "set32bits", "convert bias"])
+
+        assert mock_write.call_count == 1
+        assert os.read(reader_fd, 1024) == b"setext fits\nset32bits\nconvert bias\n"
+        client.close()
+        os.close(reader_fd)
+
+    @pytest.mark.asyncio
+    async def test_write_lines_waits_when_fifo_full(self, fifo_path):
+        reader_fd = os.open(fifo_path, os.O_RDONLY | os.O_NONBLOCK)
+        client = PipeClient(PipeMode.WRITE, nonblocking=True)
+        client.path = fifo_path
+        await client.connect()
+
+        messages = [f"load image_{i:05d}" for i in range(20000)]
+        expected = ("\n".join(messages) + "\n").encode()
+        writer = asyncio.create_task(client.write_lines(messages))
+
+        received = bytearray()
+        while len(received) < len(expected):
+            try:
+                received += os.read(reader_fd, 65536)
+            except BlockingIOError:
+                await asyncio.sleep(0.001)
+
+        await asyncio.wait_for(writer, timeout=2.0)
+        assert bytes(received) == expected
+        client.close()
+        os.close(reader_fd)
@@ -1,12 +1,19 @@
 import pytest
 import asyncio
-import subprocess
+import contextlib
+import typing as t
 from pathlib import Path
 from unittest.mock import Mock, AsyncMock, patch, PropertyMock
 
-from async_siril import SirilError, SirilCli, SirilResource
+from async_siril import SirilError, SirilCli, SirilResource, SirilCache
 from async_siril.command import BaseCommand
 from async_siril.command_types import SirilSetting
+from async_siril.event import SirilEvent
+from async_siril import EventQueuePolicy, MemoryAdmission, OutputPolicy, Priority, StreamMode, ThreadPolicy
+from async_siril.sampler import CommandUsage, ProcessSampler
+from async_siril.siril import CommandResult, SirilCrashError, SirilTimeoutError, StartupTimings, parse_settings
+from async_siril.supervisor import RestartPolicy
+from async_siril.threads import autotune
 
 
 class TestSirilError:
@@ -57,12 +64,10 @@ class TestSirilError:
 
 class TestSirilCli:
     @pytest.fixture
-    def mock_subprocess_popen(self):
-        with patch("subprocess.Popen") as mock_popen:
-            mock_process = Mock()
-            mock_process.communicate.return_value = (b"siril-cli 1.2.3\n", b"")
-            mock_popen.return_value = mock_process
-            yield mock_popen
+    def mock_version_probe(self):
+        with patch("async_siril.siril.probe_version", new_callable=AsyncMock) as mock_probe:
+            mock_probe.return_value = "siril-cli 1.2.3"
+            yield mock_probe
 
     @pytest.fixture
     def mock_siril_exe_exists(self):
@@ -70,11 +75,11 @@ class TestSirilCli:
             yield
 
     @pytest.fixture
-    def siril_cli(self, mock_subprocess_popen, mock_siril_exe_exists):
+    def siril_cli(self, mock_version_probe, mock_siril_exe_exists):
         with patch.object(SirilCli, "_find_siril_cli", return_value="siril-cli"):
             return SirilCli()
 
-    def test_siril_cli_initialization_default(self, mock_subprocess_popen, mock_siril_exe_exists):
+    def test_siril_cli_initialization_default(self, mock_version_probe, mock_siril_exe_exists):
         with patch.object(SirilCli, "_find_siril_cli", return_value="siril-cli"):
             cli = SirilCli()
 
@@ -82,9 +87,11 @@ class TestSirilCli:
             assert cli._cwd is None
             assert isinstance(cli._resources, SirilResource)
             assert cli._process is None
-            assert cli.version == "siril-cli 1.2.3"
+            # The version is only probed when starting
+            assert cli.version is None
+            mock_version_probe.assert_not_called()
 
-    def test_siril_cli_initialization_with_params(self, mock_subprocess_popen):
+    def test_siril_cli_initialization_with_params(self, mock_version_probe):
         custom_path = Path("/custom/path")
         custom_resources = SirilResource(cpu_limit=4, memory_limit="8192", memory_percent=0.8)  # type: ignore
 
@@ -95,6 +102,17 @@ class TestSirilCli:
             assert cli._cwd == custom_path
             assert cli._resources == custom_resources
 
+    def test_siril_cli_instances_use_unique_pipes(self, mock_version_probe, mock_siril_exe_exists):
+        with patch.object(SirilCli, "_find_siril_cli", return_value="siril-cli"):
+            first = SirilCli()
+            second = SirilCli()
+
+        assert first._consumer.pipe_path != second._consumer.pipe_path
+        assert first._producer.pipe_path != second._producer.pipe_path
+        assert first._pipe_dir is not None
+        assert first._consumer.pipe_path.startswith(first._pipe_dir)
+        assert first._producer.pipe_path.startswith(first._pipe_dir)
+
     def test_find_siril_cli_existing_path(self):
         with patch("os.path.exists", return_value=True):
             cli = SirilCli.__new__(SirilCli)  # Create without __init__
@@ -185,7 +203,29 @@ class TestSirilCli:
             assert siril_cli._process == mock_process
 
     @pytest.mark.asyncio
-    async def test_start_process_with_directory(self, mock_subprocess_popen, mock_siril_exe_exists):
+    async def test_start_without_output(self, mock_version_probe, mock_siril_exe_exists):
+        with patch.object(SirilCli, "_find_siril_cli", return_value="siril-cli"):
+            cli = SirilCli(output_policy=OutputPolicy(mode=StreamMode.OFF))
+
+        with (
+            patch("asyncio.create_subprocess_exec", return_value=Mock()) as mock_create,
+            patch.object(cli._consumer, "start"),
+            patch.object(cli._producer, "start"),
+            patch.object(cli, "command"),
+            patch.object(cli, "set"),
+        ):
+            ready_future = asyncio.Future()
+            ready_future.set_result(None)
+            cli._consumer.siril_ready = ready_future
+
+            await cli._start()
+
+        assert mock_create.call_args.kwargs["stdout"] == asyncio.subprocess.DEVNULL
+        assert mock_create.call_args.kwargs["stderr"] == asyncio.subprocess.DEVNULL
+        assert cli._log_tasks == []
+
+    @pytest.mark.asyncio
+    async def test_start_process_with_directory(self, mock_version_probe, mock_siril_exe_exists):
         custom_dir = Path("/custom/working/dir")
 
         with patch.object(SirilCli, "_find_siril_cli", return_value="siril-cli"):
@@ -228,6 +268,34 @@ class TestSirilCli:
                 stderr=asyncio.subprocess.PIPE,  # type: ignore
             )
 
+    @pytest.mark.asyncio
+    async def test_start_process_with_scheduling(self, mock_version_probe, mock_siril_exe_exists):
+        resources = SirilResource(cpu_limit=2, cpu_affinity=[2, 3], nice=10)
+        with patch.object(SirilCli, "_find_siril_cli", return_value="siril-cli"):
+            cli = SirilCli(resources=resources)
+
+        mock_process = Mock()
+        mock_process.pid = 4321
+
+        with (
+            patch("asyncio.create_subprocess_exec", return_value=mock_process) as mock_create,
+            patch("async_siril.resources.set_process_scheduling") as mock_set_scheduling,
+            patch.object(cli._consumer, "start"),
+            patch.object(cli._producer, "start"),
+            patch.object(cli, "command"),
+            patch.object(cli, "set"),
+            patch("asyncio.create_task"),
+            patch.object(cli, "_log_stream", new_callable=AsyncMock),
+        ):
+            ready_future = asyncio.Future()
+            ready_future.set_result(None)
+            cli._consumer.siril_ready = ready_future
+
+            await cli._start()
+
+        assert mock_create.call_args.kwargs["env"]["OMP_NUM_THREADS"] == "2"
+        mock_set_scheduling.assert_called_once_with(4321, cpu_affinity=[2, 3], nice=10, io_class=None, io_priority=None)
+
     @pytest.mark.asyncio
     async def test_stop_process(self, siril_cli):
         # Setup mock process and tasks
@@ -249,11 +317,13 @@ class TestSirilCli:
             patch.object(siril_cli._producer, "stop", new_callable=AsyncMock) as mock_producer_stop,
             patch("asyncio.gather", return_value=None) as mock_gather,
             patch("asyncio.wait_for", return_value=None) as mock_wait_for,
+            patch("async_siril.siril.remove_pipe_directory") as mock_remove,
         ):
             await siril_cli._stop()
 
             mock_consumer_stop.assert_called_once()
             mock_producer_stop.assert_called_once()
+            mock_remove.assert_called_once_with(siril_cli._pipe_dir)
             mock_process.kill.assert_called_once()
             mock_process.wait.assert_called_once()
             mock_task1.cancel.assert_called_once()
@@ -276,26 +346,23 @@ class TestSirilCli:
 
     @pytest.mark.asyncio
     async def test_log_stream(self, siril_cli):
-        mock_stream = AsyncMock()
-        mock_stream.readline.side_effect = [
-            b"Line 1\n",
-            b"Line 2\n",
-            b"",  # EOF
-        ]
+        stream = asyncio.StreamReader()
+        stream.feed_data(b"Line 1\nLine 2\n")
+        stream.feed_eof()
 
         # Patch the module-level logger instead of the factory
-        with patch("async_siril.siril.logger") as mock_logger:
-            await siril_cli._log_stream(mock_stream, "test_stream")
+        with patch("async_siril.output.logger") as mock_logger:
+            await siril_cli._log_stream(stream, "stdout")
 
-            assert mock_stream.readline.call_count == 3
             assert mock_logger.info.call_count == 2
+            assert siril_cli.output.tail() == ["Line 1", "Line 2"]
 
     @pytest.mark.asyncio
     async def test_command_with_string(self, siril_cli):
         with patch.object(siril_cli, "_run_command") as mock_run:
             await siril_cli.command("test_command")
 
-            mock_run.assert_called_once_with("test_command")
+            mock_run.assert_called_once_with("test_command", timeout=None)
 
     @pytest.mark.asyncio
     async def test_command_with_base_command(self, siril_cli):
@@ -305,7 +372,7 @@ class TestSirilCli:
         with patch.object(siril_cli, "_run_command") as mock_run:
             await siril_cli.command(mock_cmd)
 
-            mock_run.assert_called_once_with("base_command_str")
+            mock_run.assert_called_once_with("base_command_str", timeout=None)
 
     @pytest.mark.asyncio
     async def test_command_with_list_of_strings(self, siril_cli):
@@ -315,9 +382,9 @@ class TestSirilCli:
             await siril_cli.command(commands)
 
             assert mock_run.call_count == 3
-            mock_run.assert_any_call("cmd1")
-            mock_run.assert_any_call("cmd2")
-            mock_run.assert_any_call("cmd3")
+            mock_run.assert_any_call("cmd1", timeout=None)
+            mock_run.assert_any_call("cmd2", timeout=None)
+            mock_run.assert_any_call("cmd3", timeout=None)
 
     @pytest.mark.asyncio
     async def test_command_with_list_of_base_commands(self, siril_cli):
@@ -331,9 +398,9 @@ class TestSirilCli:
             await siril_cli.command(mock_cmds)
 
             assert mock_run.call_count == 3
-            mock_run.assert_any_call("cmd0")
-            mock_run.assert_any_call("cmd1")
-            mock_run.assert_any_call("cmd2")
+            mock_run.assert_any_call("cmd0", timeout=None)
+            mock_run.assert_any_call("cmd1", timeout=None)
+            mock_run.assert_any_call("cmd2", timeout=None)
 
     @pytest.mark.asyncio
     async def test_failable_command_success(self, siril_cli):
@@ -401,6 +468,18 @@ class TestSirilCli:
         assert exc_info.value.command == "failing_command"  # type: ignore
         assert exc_info.value.message == "Command failed"  # type: ignore
 
+    @pytest.mark.asyncio
+    async def test_errors_carry_the_output_tail(self, siril_cli):
+        siril_cli.output.extend(["Reading sequence lights", "stderr: Not enough memory"])
+        siril_cli._consumer.queue = asyncio.Queue()
+        siril_cli._consumer.queue.put_nowait(self.status_event("error"))
+        siril_cli._producer.send = AsyncMock()
+
+        with pytest.raises(SirilError) as exc_info:
+            await siril_cli.command("stack lights")
+
+        assert exc_info.value.output == ["Reading sequence lights", "stderr: Not enough memory"]  # type: ignore
+
     @pytest.mark.asyncio
     async def test_run_command_ready(self, siril_cli):
         # Mock ready event
@@ -421,6 +500,383 @@ class TestSirilCli:
         siril_cli._producer.send.assert_called_once_with("ready_command")
         siril_cli._consumer.queue.task_done.assert_called_once()
 
+    def status_event(self, status: str):
+        return SirilEvent(f"status: {status} command")
+
+    @pytest.mark.asyncio
+    async def test_pipeline_all_success(self, siril_cli):
+        siril_cli._consumer.queue = asyncio.Queue()
+        for event in ["log: loading", "success", "progress: 50", "success", "success"]:
+            siril_cli._consumer.queue.put_nowait(SirilEvent(event) if ":" in event else self.status_event(event))
+        siril_cli._producer.send = AsyncMock()
+
+        futures = await siril_cli.pipeline(["load a", "save b", "close"])
+
+        assert [f.result() for f in futures] == [None, None, None]
+        assert [c.args[0] for c in siril_cli._producer.send.call_args_list] == ["load a", "save b", "close"]
+        assert siril_cli._consumer.queue.empty()
+
+    def siril_output(self, siril_cli, events: t.Dict[str, t.List[str]]):
+        """Queue the given events, followed by a success status, when each command is sent"""
+        siril_cli._consumer.queue = asyncio.Queue()
+
+        async def send(cmd):
+            for event in events.get(cmd, []):
+                siril_cli._consumer.queue.put_nowait(SirilEvent(event))
+            siril_cli._consumer.queue.put_nowait(self.status_event("success"))
+
+        siril_cli._producer.send = AsyncMock(side_effect=send)
+
+    @pytest.mark.asyncio
+    async def test_run_command_skips_disabled_logs(self, siril_cli):
+        self.siril_output(siril_cli, {"register lights": ["log: registering"]})
+        siril_cli._logger = Mock()
+        siril_cli._logger.is_enabled_for.return_value = False
+
+        await siril_cli.command("register lights")
+
+        siril_cli._logger.is_enabled_for.assert_called_once()
+        siril_cli._logger.info.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_run_command_logs_structured_fields(self, siril_cli):
+        self.siril_output(siril_cli, {})
+        siril_cli._logger = Mock()
+        siril_cli._logger.is_enabled_for.return_value = True
+
+        await siril_cli.command("register lights")
+
+        assert [c.kwargs for c in siril_cli._logger.info.call_args_list] == [
+            {"command": "register lights", "correlation_id": 1},
+            {"command": "register lights", "correlation_id": 1},
+        ]
+
+    async def cancel_command(self, siril_cli, cmd: str):
+        """Start a command and cancel it while it waits for Siril"""
+        task = asyncio.create_task(siril_cli.command(cmd))
+        while not siril_cli.in_flight:
+            await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    @pytest.mark.asyncio
+    async def test_cancelled_command_events_are_drained(self, siril_cli):
+        siril_cli._consumer.queue = asyncio.Queue()
+        siril_cli._producer.send = AsyncMock()
+
+        await self.cancel_command(siril_cli, "stack lights")
+        assert [record.command for record in siril_cli.in_flight] == ["stack lights"]
+
+        # Siril finishes the cancelled command (with an error) before running the next one
+        for event in ["log: Stacking", "status: error stack failed", "status: success savetif"]:
+            siril_cli._consumer.queue.put_nowait(SirilEvent(event))
+        result = await siril_cli.command("savetif result")
+
+        assert result.commands == ["savetif result"]
+        assert siril_cli.in_flight == []
+        assert siril_cli._consumer.queue.empty()
+
+    @pytest.mark.asyncio
+    async def test_drain(self, siril_cli):
+        siril_cli._consumer.queue = asyncio.Queue()
+        siril_cli._producer.send = AsyncMock()
+        await siril_cli.drain()
+
+        await self.cancel_command(siril_cli, "register lights")
+        siril_cli._consumer.queue.put_nowait(SirilEvent("progress: 50%"))
+        siril_cli._consumer.queue.put_nowait(self.status_event("success"))
+        await siril_cli.drain()
+
+        assert siril_cli.in_flight == []
+        assert siril_cli._consumer.queue.empty()
+
+    @pytest.mark.asyncio
+    async def test_commands_after_timeout_fail_fast(self, siril_cli):
+        siril_cli._consumer.queue = asyncio.Queue()
+        siril_cli._producer.send = AsyncMock()
+        siril_cli._process = Mock(returncode=None)
+
+        def kill():
+            siril_cli._process.returncode = -9
+
+        with patch.object(siril_cli, "_stop", new_callable=AsyncMock, side_effect=kill):
+            with pytest.raises(SirilTimeoutError):
+                await siril_cli.command("stack lights", timeout=0.05)
+
+            for cmd in ["savetif result", "savejpg preview"]:
+                with pytest.raises(SirilError, match="stopped by its deadline") as exc_info:
+                    await asyncio.wait_for(siril_cli.command(cmd), timeout=1.0)
+                assert not isinstance(exc_info.value, SirilCrashError)
+                assert exc_info.value.command == cmd  # type: ignore
+
+            futures = await asyncio.wait_for(siril_cli.pipeline(["load a", "save b"]), timeout=1.0)
+
+        assert "stopped by its deadline" in str(futures[0].exception())
+        assert futures[1].cancelled()
+        siril_cli._producer.send.assert_called_once_with("stack lights")
+
+    @pytest.mark.asyncio
+    async def test_drain_does_not_count_against_command_timeout(self, siril_cli):
+        siril_cli._consumer.queue = asyncio.Queue()
+        siril_cli._producer.send = AsyncMock()
+        await self.cancel_command(siril_cli, "stack lights")
+
+        loop = asyncio.get_running_loop()
+        # The cancelled stack takes longer than the timeout of the next command, which completes quickly
+        loop.call_later(0.1, siril_cli._consumer.queue.put_nowait, self.status_event("success"))
+        loop.call_later(0.12, siril_cli._consumer.queue.put_nowait, self.status_event("success"))
+
+        with patch.object(siril_cli, "stop", new_callable=AsyncMock) as mock_stop:
+            await siril_cli.command("savetif result", timeout=0.08)
+
+        mock_stop.assert_not_called()
+        assert siril_cli.in_flight == []
+
+    @pytest.mark.asyncio
+    async def test_drain_has_its_own_timeout(self, siril_cli):
+        siril_cli._consumer.queue = asyncio.Queue()
+        siril_cli._producer.send = AsyncMock()
+        await self.cancel_command(siril_cli, "stack lights")
+        siril_cli._command_timeout = 0.05
+
+        with patch.object(siril_cli, "stop", new_callable=AsyncMock) as mock_stop:
+            with pytest.raises(SirilTimeoutError) as exc_info:
+                await siril_cli.command("savetif result", timeout=60)
+
+        # The cancelled command never completes, the session's command timeout applies to it
+        assert exc_info.value.command == "stack lights"  # type: ignore
+        mock_stop.assert_called_once()
+        siril_cli._producer.send.assert_called_once_with("stack lights")
+
+    @pytest.mark.asyncio
+    async def test_siril_exits_while_draining(self, siril_cli):
+        siril_cli._consumer.queue = asyncio.Queue()
+        siril_cli._producer.send = AsyncMock()
+
+        await self.cancel_command(siril_cli, "stack lights")
+        siril_cli._consumer.queue.put_nowait(SirilEvent.pipe_closed())
+
+        with pytest.raises(SirilCrashError) as exc_info:
+            await siril_cli.command("savetif result")
+
+        assert exc_info.value.command == "savetif result"  # type: ignore
+        assert siril_cli.in_flight == []
+
+    @pytest.mark.asyncio
+    async def test_pipeline_drains_cancelled_commands(self, siril_cli):
+        siril_cli._consumer.queue = asyncio.Queue()
+        siril_cli._producer.send = AsyncMock()
+
+        await self.cancel_command(siril_cli, "stack lights")
+        for status in ["success", "success", "success"]:
+            siril_cli._consumer.queue.put_nowait(self.status_event(status))
+        futures = await siril_cli.pipeline(["load a", "save b"])
+
+        assert [f.result() for f in futures] == [None, None]
+        assert siril_cli.in_flight == []
+
+    def test_session_logger_is_shared(self, siril_cli):
+        assert len(siril_cli.session_id) == 8
+        assert siril_cli._consumer._logger is siril_cli._logger
+        assert siril_cli._producer._logger is siril_cli._logger
+
+    def test_event_stats_survive_new_pipes(self, mock_version_probe, mock_siril_exe_exists):
+        with patch.object(SirilCli, "_find_siril_cli", return_value="siril-cli"):
+            cli = SirilCli(event_policy=EventQueuePolicy(high_water=10))
+        cli._consumer.queue.put_nowait(SirilEvent("progress: 1%"))
+        cli._consumer.queue.put_nowait(SirilEvent("progress: 2%"))
+
+        cli._create_pipes()
+
+        assert cli._consumer.queue.policy.high_water == 10
+        assert cli._consumer.queue.stats is cli.event_stats
+        assert cli.event_stats.coalesced == 1
+
+    @pytest.mark.asyncio
+    async def test_command_on_event(self, siril_cli):
+        self.siril_output(siril_cli, {"stack lights": ["log: Stacking", "progress: 50%", "progress: 100%"]})
+        received = []
+
+        await siril_cli.command(["cd lights", "stack lights"], on_event=lambda c, e: received.append((c, str(e))))
+
+        assert received == [
+            ("cd lights", "status: success command"),
+            ("stack lights", "log: Stacking"),
+            ("stack lights", "progress: 50%"),
+            ("stack lights", "progress: 100%"),
+            ("stack lights", "status: success command"),
+        ]
+        assert siril_cli._event_handler is None
+
+    @pytest.mark.asyncio
+    async def test_pipelined_command_on_event(self, siril_cli):
+        self.siril_output(siril_cli, {"load a": ["log: Reading a"], "save b": ["progress: 10%"]})
+        received = []
+
+        await siril_cli.command(["load a", "save b"], pipelined=True, on_event=lambda c, e: received.append(c))
+
+        assert received == ["load a", "load a", "save b", "save b"]
+
+    @pytest.mark.asyncio
+    async def test_events_are_not_routed_without_subscriber(self, siril_cli):
+        self.siril_output(siril_cli, {"stack lights": ["progress: 50%"]})
+        received = []
+        await siril_cli.command("register lights", on_event=lambda c, e: received.append(c))
+
+        await siril_cli.command("stack lights")
+
+        assert received == ["register lights"]
+
+    @pytest.mark.asyncio
+    async def test_submit_streams_events(self, siril_cli):
+        self.siril_output(siril_cli, {"stack lights": ["log: Stacking", "progress: 25%", "progress: 75%"]})
+
+        handle = siril_cli.submit("stack lights")
+        received = [str(item.event) async for item in handle]
+        result = await handle
+
+        # The 25% update is published at once, 75% arrives too soon after and waits for the next event
+        assert received == ["log: Stacking", "progress: 25%", "progress: 75%", "status: success command"]
+        assert handle.progress == 75
+        assert handle.command == "stack lights"
+        assert result.commands == ["stack lights"]
+
+    @pytest.mark.asyncio
+    async def test_submit_records_durations(self, siril_cli):
+        self.siril_output(siril_cli, {"stack lights": ["progress: 50%"]})
+
+        await siril_cli.submit("stack lights", frames=40)
+        await siril_cli.submit(["cd lights", "stack lights"], frames=40)
+
+        assert len(siril_cli.duration_history.entries["stack:40"]) == 2
+        assert siril_cli.duration_history.expected("stack r_lights", frames=40) is not None
+        assert siril_cli.duration_history.expected("stack lights", frames=10) is None
+
+    @pytest.mark.asyncio
+    async def test_submit_times_quiet_commands_from_send(self, siril_cli):
+        siril_cli._consumer.queue = asyncio.Queue()
+
+        async def send(cmd):
+            # Siril reports nothing until the command completes
+            asyncio.get_running_loop().call_later(
+                0.05, siril_cli._consumer.queue.put_nowait, self.status_event("success")
+            )
+
+        siril_cli._producer.send = AsyncMock(side_effect=send)
+
+        await siril_cli.submit("stack lights")
+
+        assert siril_cli.duration_history.entries["stack:0"][0] >= 0.04
+
+    @pytest.mark.asyncio
+    async def test_submit_raises_on_await(self, siril_cli):
+        siril_cli._consumer.queue = asyncio.Queue()
+        siril_cli._consumer.queue.put_nowait(SirilEvent("status: error stack failed"))
+        siril_cli._producer.send = AsyncMock()
+
+        handle = siril_cli.submit("stack lights")
+
+        assert [str(item.event) async for item in handle] == ["status: error stack failed"]
+        with pytest.raises(SirilError):
+            await handle.result()
+
+    @pytest.mark.asyncio
+    async def test_pipeline_writes_ahead_up_to_depth(self, siril_cli):
+        order = []
+        siril_cli._consumer.queue = asyncio.Queue()
+
+        async def send(cmd):
+            order.append(f"send {cmd}")
+            siril_cli._consumer.queue.put_nowait(self.status_event("success"))
+
+        siril_cli._producer.send = AsyncMock(side_effect=send)
+        original_get = siril_cli._consumer.queue.get
+
+        async def get():
+            order.append("get")
+            return await original_get()
+
+        siril_cli._consumer.queue.get = get
+
+        await siril_cli.pipeline(["c1", "c2", "c3", "c4"], depth=2)
+
+        assert order == ["send c1", "send c2", "get", "send c3", "get", "send c4", "get", "get"]
+
+    @pytest.mark.asyncio
+    async def test_pipeline_error_abandons_remaining(self, siril_cli):
+        siril_cli._consumer.queue = asyncio.Queue()
+        siril_cli._consumer.queue.put_nowait(self.status_event("success"))
+        siril_cli._consumer.queue.put_nowait(SirilEvent("status: error register failed"))
+        siril_cli._producer.send = AsyncMock()
+
+        futures = await siril_cli.pipeline(["c1", "c2", "c3", "c4", "c5"], depth=3, abandon_timeout=0.01)
+
+        assert futures[0].result() is None
+        with pytest.raises(SirilError) as exc_info:
+            futures[1].result()
+        assert exc_info.value.command == "c2"  # type: ignore
+        assert all(f.cancelled() for f in futures[2:])
+        # c4 was written after c1 completed, c5 never was
+        assert [c.args[0] for c in siril_cli._producer.send.call_args_list] == ["c1", "c2", "c3", "c4"]
+
+    @pytest.mark.asyncio
+    async def test_pipeline_error_drains_abandoned_statuses(self, siril_cli):
+        siril_cli._consumer.queue = asyncio.Queue()
+        for status in ["error", "success", "success", "success"]:
+            siril_cli._consumer.queue.put_nowait(self.status_event(status))
+        siril_cli._producer.send = AsyncMock()
+
+        futures = await siril_cli.pipeline(["c1", "c2", "c3"], depth=3, abandon_timeout=0.01)
+
+        assert isinstance(futures[0].exception(), SirilError)
+        assert futures[1].cancelled() and futures[2].cancelled()
+        # The two abandoned statuses were consumed, the unrelated one is left for the next command
+        assert siril_cli._consumer.queue.qsize() == 1
+
+    @pytest.mark.asyncio
+    async def test_pipeline_invalid_depth(self, siril_cli):
+        with pytest.raises(ValueError, match="depth"):
+            await siril_cli.pipeline(["c1"], depth=0)
+
+    @pytest.mark.asyncio
+    async def test_pipeline_exit_stops_after_previous_commands(self, siril_cli):
+        siril_cli._consumer.queue = asyncio.Queue()
+        siril_cli._consumer.queue.put_nowait(self.status_event("success"))
+        siril_cli._producer.send = AsyncMock()
+
+        with patch.object(siril_cli, "stop", new_callable=AsyncMock) as mock_stop:
+            futures = await siril_cli.pipeline(["c1", "exit", "c3"])
+
+        mock_stop.assert_called_once()
+        assert futures[0].result() is None
+        assert futures[1].result() is None
+        assert futures[2].cancelled()
+        siril_cli._producer.send.assert_called_once_with("c1")
+
+    @pytest.mark.asyncio
+    async def test_command_pipelined_raises_first_error(self, siril_cli):
+        siril_cli._consumer.queue = asyncio.Queue()
+        siril_cli._consumer.queue.put_nowait(self.status_event("success"))
+        siril_cli._consumer.queue.put_nowait(SirilEvent("status: error bad"))
+        siril_cli._producer.send = AsyncMock()
+
+        with pytest.raises(SirilError) as exc_info:
+            await siril_cli.command(["c1", "c2"], pipelined=True)
+
+        assert exc_info.value.command == "c2"  # type: ignore
+
+    @pytest.mark.asyncio
+    async def test_command_pipelined_success(self, siril_cli):
+        with patch.object(siril_cli, "pipeline", new_callable=AsyncMock) as mock_pipeline:
+            done = asyncio.get_running_loop().create_future()
+            done.set_result(None)
+            mock_pipeline.return_value = [done]
+
+            await siril_cli.command(["c1"], pipelined=True)
+
+            mock_pipeline.assert_called_once_with(["c1"], timeout=None)
+
     @pytest.mark.asyncio
     async def test_set_command(self, siril_cli):
         with patch.object(siril_cli, "command") as mock_command:
@@ -506,23 +962,814 @@ class TestSirilCli:
             assert mock_command.call_count >= 2  # requires + capabilities at minimum
             assert mock_set.call_count >= 3  # MEM_MODE, MEM_AMOUNT, MEM_RATIO
 
-    def test_version_extraction(self, mock_siril_exe_exists):
-        """Test version extraction from subprocess"""
+    @pytest.mark.asyncio
+    async def test_version_probed_on_start(self, siril_cli, mock_version_probe):
+        """Test the version is probed (through the cache) when starting"""
         with (
-            patch("subprocess.Popen") as mock_popen,
-            patch.object(SirilCli, "_find_siril_cli", return_value="siril-cli"),
+            patch("asyncio.create_subprocess_exec", return_value=Mock()),
+            patch.object(siril_cli._consumer, "start"),
+            patch.object(siril_cli._producer, "start"),
+            patch.object(siril_cli, "command"),
+            patch.object(siril_cli, "set"),
+            patch("asyncio.create_task"),
+            patch.object(siril_cli, "_log_stream", new_callable=AsyncMock),
         ):
-            mock_process = Mock()
-            mock_process.communicate.return_value = (b"siril-cli 1.4.0-beta\n", b"")
-            mock_popen.return_value = mock_process
+            ready_future = asyncio.Future()
+            ready_future.set_result(None)
+            siril_cli._consumer.siril_ready = ready_future
 
-            cli = SirilCli()
+            await siril_cli._start()
+
+            assert siril_cli.version == "siril-cli 1.2.3"
+            mock_version_probe.assert_called_once_with("siril-cli", siril_cli._cache)
+
+    async def start_with_mocks(self, cli):
+        with (
+            patch("asyncio.create_subprocess_exec", return_value=Mock()),
+            patch.object(cli._consumer, "start"),
+            patch.object(cli._producer, "start"),
+            patch.object(cli, "command") as mock_command,
+            patch.object(cli, "set") as mock_set,
+            patch.object(cli, "_run_command") as mock_run,
+            patch("asyncio.create_task"),
+            patch.object(cli, "_log_stream", new_callable=Mock),
+        ):
+            ready_future = asyncio.Future()
+            ready_future.set_result(None)
+            cli._consumer.siril_ready = ready_future
+
+            await cli._start()
+            return mock_command, mock_set, mock_run
+
+    @pytest.mark.asyncio
+    async def test_fast_start_pipelines_startup_commands(self, mock_version_probe, mock_siril_exe_exists):
+        with patch.object(SirilCli, "_find_siril_cli", return_value="siril-cli"):
+            cli = SirilCli(
+                resources=SirilResource(cpu_limit=4, memory_limit="8.00", memory_percent=0.8),
+                cache=SirilCache(),
+                fast_start=True,
+            )
+
+        mock_command, mock_set, _ = await self.start_with_mocks(cli)
+
+        mock_set.assert_not_called()
+        mock_command.assert_called_once()
+        commands, kwargs = mock_command.call_args
+        assert kwargs == {"pipelined": True}
+        assert [str(c) for c in commands[0]] == [
+            "requires 0.99.10",
+            "setcpu 4",
+            "set core.mem_mode=1",
+            "set core.mem_amount=8.00",
+            "set core.mem_ratio=0.8",
+        ]
+
+    def test_startup_commands_default_resources(self, siril_cli):
+        assert [str(c) for c in siril_cli._startup_commands()] == ["requires 0.99.10", "set core.mem_ratio=0.9"]
+
+    @pytest.mark.asyncio
+    async def test_fast_start_runs_and_caches_capabilities(self, mock_version_probe, mock_siril_exe_exists):
+        cache = SirilCache()
+        with patch.object(SirilCli, "_find_siril_cli", return_value="siril-cli"):
+            cli = SirilCli(cache=cache, fast_start=True)
+
+        async def run_capabilities(_command, on_event=None):
+            on_event(SirilEvent("log: OpenMP available"))
+            on_event(SirilEvent("progress: 10"))
+            on_event(SirilEvent("log: FFTW3 available"))
+
+        with patch.object(SirilCli, "_run_command", side_effect=run_capabilities) as mock_run:
+            await cli._load_capabilities()
+
+        mock_run.assert_called_once()
+        assert mock_run.call_args.args[0] == "capabilities"
+        assert cli.capabilities == ["OpenMP available", "FFTW3 available"]
+        assert cache.get("siril-cli", f"capabilities:{cli.version}") == cli.capabilities
+        assert cli.startup_timings.capabilities_cached is False
+
+    @pytest.mark.asyncio
+    async def test_fast_start_skips_cached_capabilities(self, mock_version_probe, mock_siril_exe_exists):
+        cache = SirilCache()
+        cache.set("siril-cli", "capabilities:siril-cli 1.2.3", ["OpenMP available"])
+        with patch.object(SirilCli, "_find_siril_cli", return_value="siril-cli"):
+            cli = SirilCli(cache=cache, fast_start=True)
+
+        _, _, mock_run = await self.start_with_mocks(cli)
+
+        mock_run.assert_not_called()
+        assert cli.capabilities == ["OpenMP available"]
+        assert cli.startup_timings.capabilities_cached is True
+
+    @pytest.mark.asyncio
+    async def test_capabilities_cache_is_per_version(self, mock_version_probe, mock_siril_exe_exists):
+        cache = SirilCache()
+        cache.set("siril-cli", "capabilities:siril-cli 1.0.0", ["old"])
+        with patch.object(SirilCli, "_find_siril_cli", return_value="siril-cli"):
+            cli = SirilCli(cache=cache, fast_start=True)
+
+        _, _, mock_run = await self.start_with_mocks(cli)
+
+        mock_run.assert_called_once()
+        assert cli.startup_timings.capabilities_cached is False
+
+    @pytest.mark.asyncio
+    async def test_fifo_open_waits_for_siril_to_connect(self, siril_cli):
+        loop = asyncio.get_running_loop()
+        # The non-blocking reader opens right away, Siril opening its input fifo takes longer
+        siril_cli._consumer.pipe_opened = loop.create_future()
+        siril_cli._consumer.pipe_opened.set_result(None)
+        siril_cli._producer.pipe_opened = loop.create_future()
+        loop.call_later(0.05, siril_cli._producer.pipe_opened.set_result, None)
+        ready_future = loop.create_future()
+        loop.call_later(0.06, ready_future.set_result, None)
+
+        with (
+            patch("asyncio.create_subprocess_exec", return_value=Mock()),
+            patch.object(siril_cli._consumer, "start"),
+            patch.object(siril_cli._producer, "start"),
+            patch.object(siril_cli, "command"),
+            patch.object(siril_cli, "set"),
+            patch("asyncio.create_task"),
+            patch.object(siril_cli, "_log_stream", new_callable=Mock),
+        ):
+            siril_cli._consumer.siril_ready = ready_future
+            await siril_cli._start()
+
+        assert siril_cli.startup_timings.fifo_open >= 0.04
+        assert siril_cli.startup_timings.ready < 0.04
+
+    @pytest.mark.asyncio
+    async def test_start_records_timings(self, siril_cli):
+        await self.start_with_mocks(siril_cli)
+
+        timings = siril_cli.startup_timings
+        assert isinstance(timings, StartupTimings)
+        for phase in ["version_probe", "fifo_open", "ready", "settings", "capabilities"]:
+            assert getattr(timings, phase) >= 0
+        assert timings.total == pytest.approx(
+            timings.version_probe + timings.fifo_open + timings.ready + timings.settings + timings.capabilities
+        )
+
+    @pytest.mark.asyncio
+    async def test_run_command_forwards_events(self, siril_cli):
+        siril_cli._consumer.queue = asyncio.Queue()
+        for line in ["log: one", "progress: 20", "status: success capabilities"]:
+            siril_cli._consumer.queue.put_nowait(SirilEvent(line))
+        siril_cli._producer.send = AsyncMock()
+        seen = []
+
+        await siril_cli._run_command("capabilities", on_event=seen.append)
+
+        assert [str(e) for e in seen] == ["log: one", "progress: 20"]
+
+    def test_siril_timeout_error(self):
+        error = SirilTimeoutError("register lights", 12.345)
+
+        assert isinstance(error, SirilError)
+        assert error.command == "register lights"
+        assert error.elapsed == 12.345
+        assert error.message == "timed out after 12.3s"
+
+    @pytest.mark.asyncio
+    async def test_run_command_timeout_kills_process(self, siril_cli):
+        siril_cli._consumer.queue = asyncio.Queue()
+        siril_cli._producer.send = AsyncMock()
+
+        with patch.object(siril_cli, "stop", new_callable=AsyncMock) as mock_stop:
+            with pytest.raises(SirilTimeoutError) as exc_info:
+                await siril_cli._run_command("register lights", timeout=0.01)
+
+        assert exc_info.value.command == "register lights"  # type: ignore
+        mock_stop.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_command_timeout_default(self, mock_version_probe, mock_siril_exe_exists):
+        with patch.object(SirilCli, "_find_siril_cli", return_value="siril-cli"):
+            cli = SirilCli(command_timeout=0.01)
+        cli._consumer.queue = asyncio.Queue()
+        cli._producer.send = AsyncMock()
+
+        with patch.object(cli, "stop", new_callable=AsyncMock):
+            with pytest.raises(SirilTimeoutError):
+                await cli.command("stack lights")
+
+    @pytest.mark.asyncio
+    async def test_run_command_completes_before_timeout(self, siril_cli):
+        siril_cli._consumer.queue = asyncio.Queue()
+        siril_cli._consumer.queue.put_nowait(self.status_event("success"))
+        siril_cli._producer.send = AsyncMock()
+
+        with patch.object(siril_cli, "stop", new_callable=AsyncMock) as mock_stop:
+            await siril_cli._run_command("load a", timeout=1.0)
+
+        mock_stop.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_session_timeout_applies_to_all_commands(self, siril_cli):
+        siril_cli._consumer.queue = asyncio.Queue()
+        siril_cli._producer.send = AsyncMock()
+        siril_cli.set_session_timeout(0.01)
+
+        with patch.object(siril_cli, "stop", new_callable=AsyncMock) as mock_stop:
+            with pytest.raises(SirilTimeoutError):
+                # The session deadline is earlier than the command timeout
+                await siril_cli._run_command("stack lights", timeout=60)
+
+        mock_stop.assert_called_once()
+
+    def test_set_session_timeout_none_disables_deadline(self, siril_cli):
+        siril_cli.set_session_timeout(5)
+        assert siril_cli._deadline() is not None
+
+        siril_cli.set_session_timeout(None)
+        assert siril_cli._deadline() is None
+
+    @pytest.mark.asyncio
+    async def test_pipeline_timeout(self, siril_cli):
+        siril_cli._consumer.queue = asyncio.Queue()
+        siril_cli._consumer.queue.put_nowait(self.status_event("success"))
+        siril_cli._producer.send = AsyncMock()
+
+        with patch.object(siril_cli, "stop", new_callable=AsyncMock) as mock_stop:
+            with pytest.raises(SirilTimeoutError) as exc_info:
+                await siril_cli.pipeline(["c1", "c2"], timeout=0.01)
+
+        assert exc_info.value.command == "c2"  # type: ignore
+        mock_stop.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_failable_command_raises_timeout(self, siril_cli):
+        with patch.object(siril_cli, "command", side_effect=SirilTimeoutError("stack", 1.0)):
+            with pytest.raises(SirilTimeoutError):
+                await siril_cli.failable_command("stack")
+
+    def test_running(self, siril_cli):
+        assert not siril_cli.running
+
+        siril_cli._process = Mock(returncode=None)
+        assert siril_cli.running
+
+        siril_cli._process.returncode = -9
+        assert not siril_cli.running
+
+    @pytest.mark.asyncio
+    async def test_run_command_raises_when_siril_exits(self, siril_cli):
+        siril_cli._consumer.queue = asyncio.Queue()
+        siril_cli._consumer.queue.put_nowait(SirilEvent("log: registering"))
+        siril_cli._consumer.queue.put_nowait(SirilEvent.pipe_closed())
+        siril_cli._producer.send = AsyncMock()
+
+        with pytest.raises(SirilCrashError) as exc_info:
+            await siril_cli.command("register lights")
+
+        assert exc_info.value.command == "register lights"  # type: ignore
+
+    @pytest.mark.asyncio
+    async def test_commands_after_unrecovered_crash_fail_fast(self, siril_cli):
+        siril_cli._consumer.queue = asyncio.Queue()
+        siril_cli._consumer.queue.put_nowait(SirilEvent.pipe_closed())
+        siril_cli._producer.send = AsyncMock()
+
+        with pytest.raises(SirilCrashError):
+            await siril_cli.command("register lights")
+
+        with pytest.raises(SirilCrashError, match="no longer running") as exc_info:
+            await asyncio.wait_for(siril_cli.command("stack lights"), timeout=1.0)
+        assert exc_info.value.command == "stack lights"  # type: ignore
+        futures = await asyncio.wait_for(siril_cli.pipeline(["load a", "save b"]), timeout=1.0)
+        assert isinstance(futures[0].exception(), SirilCrashError)
+        siril_cli._producer.send.assert_called_once_with("register lights")
+
+    @pytest.mark.asyncio
+    async def test_commands_after_failed_write_fail_fast(self, siril_cli):
+        siril_cli._consumer.queue = asyncio.Queue()
+        siril_cli._producer._events = siril_cli._consumer.queue
+        siril_cli._producer._pipe.connect = AsyncMock()
+        siril_cli._producer._pipe.write_lines = AsyncMock(side_effect=BrokenPipeError(32, "Broken pipe"))
+        siril_cli._producer._running = True
+        siril_cli._producer._task = asyncio.create_task(siril_cli._producer._run())
+
+        with pytest.raises(SirilCrashError, match="Could not write to Siril"):
+            await asyncio.wait_for(siril_cli.command("register lights"), timeout=1.0)
+
+        with pytest.raises(SirilCrashError, match="no longer running"):
+            await asyncio.wait_for(siril_cli.command("stack lights"), timeout=1.0)
+        siril_cli._producer._pipe.write_lines.assert_called_once_with(["register lights"])
+
+    @pytest.mark.asyncio
+    async def test_command_after_unrecovered_crash_restarts(self, mock_version_probe, mock_siril_exe_exists):
+        cli = self.supervised_cli(RestartPolicy(max_restarts=1, backoff=0))
+        cli._consumer.queue = asyncio.Queue()
+        cli._consumer.queue.put_nowait(SirilEvent.pipe_closed())
+        cli._producer.send = AsyncMock()
+        restarts = [SirilCrashError("requires 0.99.10", "gone"), None]
+
+        async def restart():
+            error = restarts.pop(0)
+            if error is not None:
+                raise error
+            cli._exited = False
+            cli._consumer.queue.put_nowait(self.status_event("success"))
+
+        with patch.object(cli, "restart", side_effect=restart) as mock_restart:
+            # The restart fails as well, the crash reaches the caller
+            with pytest.raises(SirilCrashError):
+                await cli.command("register lights")
+
+            # The next command restarts Siril instead of waiting for an answer
+            await asyncio.wait_for(cli.command("stack lights"), timeout=1.0)
+
+        assert mock_restart.call_count == 2
+        assert [c.args[0] for c in cli._producer.send.call_args_list] == ["register lights", "stack lights"]
+
+    @pytest.mark.asyncio
+    async def test_pipeline_siril_exits(self, siril_cli):
+        siril_cli._consumer.queue = asyncio.Queue()
+        siril_cli._consumer.queue.put_nowait(self.status_event("success"))
+        siril_cli._consumer.queue.put_nowait(SirilEvent.pipe_closed())
+        siril_cli._producer.send = AsyncMock()
+
+        futures = await siril_cli.pipeline(["c1", "c2", "c3"])
+
+        assert futures[0].result() is None
+        assert isinstance(futures[1].exception(), SirilCrashError)
+        assert futures[2].cancelled()
+
+    def supervised_cli(self, policy: RestartPolicy) -> SirilCli:
+        with patch.object(SirilCli, "_find_siril_cli", return_value="siril-cli"):
+            cli = SirilCli(restart_policy=policy)
+        cli._start_directory = Path("/data")
+        cli.session_state.directory = Path("/data")
+        return cli
+
+    @pytest.mark.asyncio
+    async def test_crash_restarts_and_retries_command(self, mock_version_probe, mock_siril_exe_exists):
+        cli = self.supervised_cli(RestartPolicy(backoff=0))
+        crash = SirilCrashError("stack lights", "Siril closed its output pipe")
+        cli._run_command = AsyncMock(side_effect=[None, crash, None])  # type: ignore
+
+        with patch.object(cli, "restart", new_callable=AsyncMock) as mock_restart:
+            await cli.command("setext fit")
+            await cli.command("stack lights")
+
+        mock_restart.assert_called_once()
+        assert [c.args[0] for c in cli._run_command.call_args_list] == ["setext fit", "stack lights", "stack lights"]
+        assert cli.session_state.extension == "fit"
+
+    @pytest.mark.asyncio
+    async def test_crash_without_retry_restarts_and_raises(self, mock_version_probe, mock_siril_exe_exists):
+        cli = self.supervised_cli(RestartPolicy(backoff=0, retry_command=False))
+        cli._run_command = AsyncMock(side_effect=SirilCrashError("stack lights", "gone"))  # type: ignore
+
+        with patch.object(cli, "restart", new_callable=AsyncMock) as mock_restart:
+            with pytest.raises(SirilCrashError):
+                await cli.command("stack lights")
+
+        mock_restart.assert_called_once()
+        cli._run_command.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_crash_gives_up_after_max_restarts(self, mock_version_probe, mock_siril_exe_exists):
+        cli = self.supervised_cli(RestartPolicy(max_restarts=2, backoff=0.5))
+        cli._run_command = AsyncMock(side_effect=SirilCrashError("stack lights", "gone"))  # type: ignore
+
+        with (
+            patch.object(cli, "restart", new_callable=AsyncMock) as mock_restart,
+            patch("async_siril.siril.asyncio.sleep", new_callable=AsyncMock) as mock_sleep,
+        ):
+            with pytest.raises(SirilCrashError):
+                await cli.command("stack lights")
+
+        assert mock_restart.call_count == 2
+        assert [c.args[0] for c in mock_sleep.call_args_list] == [0.5, 1.0]
+        assert cli._run_command.call_count == 3
+
+    @pytest.mark.asyncio
+    async def test_crash_without_policy_is_raised(self, siril_cli):
+        siril_cli._run_command = AsyncMock(side_effect=SirilCrashError("stack lights", "gone"))
+
+        with patch.object(siril_cli, "restart", new_callable=AsyncMock) as mock_restart:
+            with pytest.raises(SirilCrashError):
+                await siril_cli.command("stack lights")
+
+        mock_restart.assert_not_called()
+        assert siril_cli.session_state.replay_commands() == []
+
+    @pytest.mark.asyncio
+    async def test_crash_in_pipeline_resumes_from_failed_command(self, mock_version_probe, mock_siril_exe_exists):
+        cli = self.supervised_cli(RestartPolicy(backoff=0))
+        loop = asyncio.get_running_loop()
+
+        def futures(results):
+            created = []
+            for result in results:
+                future = loop.create_future()
+                if result == "cancelled":
+                    future.cancel()
+                elif isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(None)
+                created.append(future)
+            return created
+
+        crash = SirilCrashError("register lights", "gone")
+        pipeline_results = [futures([None, crash, "cancelled"]), futures([None, None])]
+        with (
+            patch.object(cli, "pipeline", side_effect=lambda *_args, **_kwargs: pipeline_results.pop(0)) as mock_pipe,
+            patch.object(cli, "restart", new_callable=AsyncMock) as mock_restart,
+        ):
+            await cli.command(["cd lights", "register lights", "stack r_lights"], pipelined=True)
+
+        mock_restart.assert_called_once()
+        assert mock_pipe.call_args_list[1].args[0] == ["register lights", "stack r_lights"]
+        assert cli.session_state.directory == Path("/data/lights")
+
+    @pytest.mark.asyncio
+    async def test_restart_replays_session_state(self, mock_version_probe, mock_siril_exe_exists):
+        cli = self.supervised_cli(RestartPolicy())
+        cli.session_state.track("cd lights")
+        cli.session_state.track("set32bits")
+        cli.set_session_timeout(60)
+        deadline = cli._session_deadline
+        old_consumer = cli._consumer
+
+        with (
+            patch.object(cli, "_stop", new_callable=AsyncMock) as mock_stop,
+            patch.object(cli, "_start", new_callable=AsyncMock) as mock_start,
+            patch.object(cli, "pipeline", new_callable=AsyncMock, return_value=[]) as mock_pipeline,
+        ):
+            await cli.restart()
+
+        mock_stop.assert_called_once()
+        mock_start.assert_called_once()
+        assert cli._consumer is not old_consumer
+        mock_pipeline.assert_called_once_with(["cd '/data/lights'", "set32bits"])
+        assert cli._session_deadline == deadline
+        assert cli.restarts == 1
+
+    @contextlib.contextmanager
+    def restart_with_mocks(self, cli):
+        """Restarts run the real `_start` with a mocked process, the commands go through `_run_command`"""
+        ready_future = asyncio.Future()
+        ready_future.set_result(None)
+        cli._consumer.siril_ready = ready_future
+        with (
+            patch("asyncio.create_subprocess_exec", return_value=Mock()),
+            patch.object(cli._consumer, "start"),
+            patch.object(cli._producer, "start"),
+            patch.object(cli, "_stop", new_callable=AsyncMock),
+            patch.object(cli, "_create_pipes"),
+            patch.object(cli, "_log_stream", new_callable=Mock),
+            patch("asyncio.create_task"),
+            patch.object(cli, "_start", wraps=cli._start) as mock_start,
+        ):
+            yield mock_start
+
+    @pytest.mark.asyncio
+    async def test_crash_on_every_start_counts_restart_attempts(self, mock_version_probe, mock_siril_exe_exists):
+        cli = self.supervised_cli(RestartPolicy(max_restarts=2, backoff=0.5))
+        cli._run_command = AsyncMock(side_effect=SirilCrashError("stack lights", "gone"))  # type: ignore
+
+        with (
+            self.restart_with_mocks(cli) as mock_start,
+            patch("async_siril.siril.asyncio.sleep", new_callable=AsyncMock) as mock_sleep,
+        ):
+            with pytest.raises(SirilCrashError):
+                await cli.command("stack lights")
+
+        # Each failed restart is an attempt of the command, the startup commands are never supervised
+        assert mock_start.call_count == 2
+        assert [c.args[0] for c in mock_sleep.call_args_list] == [0.5, 1.0]
+        assert [c.args[0] for c in cli._run_command.call_args_list] == ["stack lights"] + ["requires 0.99.10"] * 2
+        assert cli.restarts == 0
+
+    @pytest.mark.asyncio
+    async def test_restart_keeps_user_settings(self, mock_version_probe, mock_siril_exe_exists):
+        cli = self.supervised_cli(RestartPolicy(backoff=0))
+        cli._run_command = AsyncMock()  # type: ignore
+        await cli.set(SirilSetting.MEM_RATIO, "0.5")
+
+        with (
+            self.restart_with_mocks(cli),
+            patch.object(cli, "pipeline", new_callable=AsyncMock, return_value=[]) as mock_pipeline,
+        ):
+            await cli.restart()
+            await cli.restart()
+
+        # The startup `set core.mem_ratio` isn't tracked as session state
+        assert mock_pipeline.call_args.args[0] == ["cd '/data'", "set core.mem_ratio=0.5"]
+        assert cli.session_state.replay_commands() == ["cd '/data'", "set core.mem_ratio=0.5"]
+        assert cli.restarts == 2
+
+    @pytest.mark.asyncio
+    async def test_command_returns_result(self, siril_cli):
+        with patch.object(siril_cli, "_run_command", new_callable=AsyncMock):
+            result = await siril_cli.command(["load a", "save b"], priority=Priority.INTERACTIVE)
+
+        assert isinstance(result, CommandResult)
+        assert result.commands == ["load a", "save b"]
+        assert result.priority == Priority.INTERACTIVE
+        assert result.queue_wait >= 0.0
+        assert result.duration >= 0.0
+
+    @pytest.mark.asyncio
+    async def test_concurrent_commands_are_serialized(self, siril_cli):
+        siril_cli._consumer.queue = asyncio.Queue()
+        order = []
+
+        async def send(cmd):
+            order.append(f"send {cmd}")
+            # Siril answers a while after the command was written
+            asyncio.get_running_loop().call_later(0.01, siril_cli._consumer.queue.put_nowait, SirilEvent(f"log: {cmd}"))
+            asyncio.get_running_loop().call_later(
+                0.02, siril_cli._consumer.queue.put_nowait, self.status_event("success")
+            )
+
+        siril_cli._producer.send = AsyncMock(side_effect=send)
+
+        async def run(cmd, priority=Priority.NORMAL):
+            result = await siril_cli.command(cmd, priority=priority)
+            order.append(f"done {cmd}")
+            return result
+
+        results = await asyncio.gather(
+            run("stack lights"),
+            run("stack flats", priority=Priority.BACKGROUND),
+            run("savejpg preview", priority=Priority.INTERACTIVE),
+        )
+
+        # One command at a time, the interactive export jumps ahead of the background stack
+        assert order == [
+            "send stack lights",
+            "done stack lights",
+            "send savejpg preview",
+            "done savejpg preview",
+            "send stack flats",
+            "done stack flats",
+        ]
+        assert results[0].queue_wait < results[2].queue_wait < results[1].queue_wait
+
+    @pytest.mark.asyncio
+    async def test_pipeline_and_command_are_serialized(self, siril_cli):
+        siril_cli._consumer.queue = asyncio.Queue()
+        order = []
+
+        async def send(cmd):
+            order.append(f"send {cmd}")
+            asyncio.get_running_loop().call_later(0.01, siril_cli._consumer.queue.put_nowait, SirilEvent(f"log: {cmd}"))
+            asyncio.get_running_loop().call_later(
+                0.02, siril_cli._consumer.queue.put_nowait, self.status_event("success")
+            )
+
+        siril_cli._producer.send = AsyncMock(side_effect=send)
+
+        async def run_pipeline():
+            futures = await siril_cli.pipeline(["convert lights", "register lights"], depth=1)
+            order.append("done pipeline")
+            return futures
+
+        async def run_command():
+            await siril_cli.command("stack flats")
+            order.append("done stack flats")
+
+        futures, _ = await asyncio.wait_for(asyncio.gather(run_pipeline(), run_command()), timeout=1.0)
+
+        # The command waits for the whole pipeline instead of taking its events
+        assert order == [
+            "send convert lights",
+            "send register lights",
+            "done pipeline",
+            "send stack flats",
+            "done stack flats",
+        ]
+        assert all(future.result() is None for future in futures)
+
+    @pytest.mark.asyncio
+    async def test_restart_waits_for_running_command(self, siril_cli):
+        gate = asyncio.Event()
+        order = []
+
+        async def slow_command(cmd, **_kwargs):
+            order.append(f"start {cmd}")
+            await gate.wait()
+            order.append(f"done {cmd}")
+
+        async def restarted():
+            order.append("restart")
+
+        with (
+            patch.object(siril_cli, "_run_command", side_effect=slow_command),
+            patch.object(siril_cli, "_restart", side_effect=restarted),
+        ):
+            command = asyncio.create_task(siril_cli.command("stack lights"))
+            await asyncio.sleep(0)
+            restart = asyncio.create_task(siril_cli.restart())
+            await asyncio.sleep(0.01)
+            gate.set()
+            await asyncio.wait_for(asyncio.gather(command, restart), timeout=1.0)
+
+        assert order == ["start stack lights", "done stack lights", "restart"]
+
+    @pytest.mark.asyncio
+    async def test_command_reserves_memory(self, mock_version_probe, mock_siril_exe_exists):
+        admission = MemoryAdmission(capacity=1024)
+        with patch.object(SirilCli, "_find_siril_cli", return_value="siril-cli"):
+            cli = SirilCli(admission=admission)
+
+        async def run_command(_command, timeout=None):
+            assert admission.reserved == 512
+
+        with patch.object(cli, "_run_command", side_effect=run_command) as mock_run:
+            result = await cli.command("stack lights rej 3 3", memory=512)
+
+        mock_run.assert_called_once()
+        assert result.memory_wait >= 0.0
+        assert admission.reserved == 0
+
+    @pytest.mark.asyncio
+    async def test_command_memory_ignored_without_admission(self, siril_cli):
+        with patch.object(siril_cli, "_run_command", new_callable=AsyncMock) as mock_run:
+            result = await siril_cli.command("stack lights", memory=512)
+
+        mock_run.assert_called_once()
+        assert result.memory_wait == 0.0
+
+    @pytest.mark.asyncio
+    async def test_thread_policy_sets_threads_per_command(self, mock_version_probe, mock_siril_exe_exists):
+        with patch.object(SirilCli, "_find_siril_cli", return_value="siril-cli"):
+            cli = SirilCli(thread_policy=ThreadPolicy(total_threads=8, io_threads=2))
+        cli._threads = 8
+
+        with patch.object(cli, "_run_command", new_callable=AsyncMock) as mock_run:
+            await cli.command(["convert lights", "setext fit", "register lights", "stack r_lights"])
+
+        assert [c.args[0] for c in mock_run.call_args_list] == [
+            "setcpu 2",
+            "convert lights",
+            "setext fit",
+            "setcpu 8",
+            "register lights",
+            "stack r_lights",
+        ]
+        assert cli._thread_policy.allocated == 0
+
+    @pytest.mark.asyncio
+    async def test_thread_policy_pipelined_batch(self, mock_version_probe, mock_siril_exe_exists):
+        with patch.object(SirilCli, "_find_siril_cli", return_value="siril-cli"):
+            cli = SirilCli(thread_policy=ThreadPolicy(total_threads=4))
+
+        with (
+            patch.object(cli, "_run_command", new_callable=AsyncMock) as mock_run,
+            patch.object(cli, "_run_supervised_pipeline", new_callable=AsyncMock) as mock_pipeline,
+        ):
+            await cli.command(["cd lights", "stack lights"], pipelined=True)
+
+        mock_run.assert_called_once_with("setcpu 4", timeout=None)
+        mock_pipeline.assert_called_once_with(["cd lights", "stack lights"], None)
+
+    @pytest.mark.asyncio
+    async def test_setcpu_updates_applied_threads(self, mock_version_probe, mock_siril_exe_exists):
+        with patch.object(SirilCli, "_find_siril_cli", return_value="siril-cli"):
+            cli = SirilCli(thread_policy=ThreadPolicy(total_threads=8))
+        cli._threads = 8
+
+        with patch.object(cli, "_run_command", new_callable=AsyncMock) as mock_run:
+            await cli.command("setcpu 2")
+            await cli.command("stack lights")
+
+        # The policy sees that 2 threads are set and brings it back to 8
+        assert [c.args[0] for c in mock_run.call_args_list] == ["setcpu 2", "setcpu 8", "stack lights"]
+        assert cli._threads == 8
+
+    @pytest.mark.asyncio
+    async def test_autotune_bypasses_thread_policy(self, mock_version_probe, mock_siril_exe_exists):
+        with patch.object(SirilCli, "_find_siril_cli", return_value="siril-cli"):
+            cli = SirilCli(thread_policy=ThreadPolicy(total_threads=8))
+        cli._threads = 8
+
+        with patch.object(cli, "_run_command", new_callable=AsyncMock) as mock_run:
+            await autotune(cli, {"stack": "stack bench"}, thread_counts=[1, 2])
+            await cli.command("stack lights")
+
+        assert [c.args[0] for c in mock_run.call_args_list] == [
+            "setcpu 1",
+            "stack bench",
+            "setcpu 2",
+            "stack bench",
+            "setcpu 8",
+            "stack lights",
+        ]
+        assert cli._thread_policy is not None
+
+    @pytest.mark.asyncio
+    async def test_command_records_usage(self, siril_cli):
+        sampler = ProcessSampler(1234)
+        sampler._process = Mock()
+        siril_cli._sampler = sampler
+
+        with (
+            patch.object(siril_cli, "_run_command", new_callable=AsyncMock),
+            patch.object(sampler, "_read", return_value=None),
+        ):
+            result = await siril_cli.command(["register lights", "stack r_lights"])
+
+        assert [usage.commands for usage in result.usage] == [["register lights"], ["stack r_lights"]]
+
+    def test_result_usage_totals(self):
+        result = CommandResult(
+            commands=["register lights", "stack r_lights"],
+            usage=[
+                CommandUsage(["register lights"], peak_rss=300, cpu_seconds=2.0, read_bytes=10, write_bytes=20),
+                CommandUsage(["stack r_lights"], peak_rss=900, cpu_seconds=5.0, read_bytes=30, write_bytes=1),
+            ],
+        )
+
+        assert result.peak_rss == 900
+        assert result.cpu_seconds == 7.0
+        assert result.read_bytes == 40
+        assert result.write_bytes == 21
+        assert CommandResult(commands=[]).peak_rss == 0
+
+    @pytest.mark.asyncio
+    async def test_no_thread_policy_leaves_threads(self, siril_cli):
+        with patch.object(siril_cli, "_run_command", new_callable=AsyncMock) as mock_run:
+            await siril_cli.command("stack lights")
+
+        mock_run.assert_called_once_with("stack lights", timeout=None)
+
+    def test_parse_settings(self):
+        settings = parse_settings(
+            [
+                "core.extension = .fit",
+                "core.mem_ratio=0.9",
+                "  core.wd = /data/my night  ",
+                "not a setting",
+            ]
+        )
+
+        assert settings == {"core.extension": ".fit", "core.mem_ratio": "0.9", "core.wd": "/data/my night"}
+
+    @pytest.mark.asyncio
+    async def test_snapshot_settings(self, siril_cli):
+        async def list_settings(_command, on_event=None):
+            for line in ["core.extension = .fits", "core.force_16bit = FALSE", "gui.theme = dark", "log: done"]:
+                on_event(SirilEvent(f"log: {line}"))
+
+        with patch.object(siril_cli, "_run_command", side_effect=list_settings) as mock_run:
+            snapshot = await siril_cli.snapshot_settings()
+
+        assert mock_run.call_args.args[0] == "get -a"
+        assert snapshot == {"core.extension": ".fits", "core.force_16bit": "FALSE"}
+        assert siril_cli.settings_snapshot == snapshot
+
+    @pytest.mark.asyncio
+    async def test_snapshot_settings_custom_keys(self, siril_cli):
+        async def list_settings(_command, on_event=None):
+            on_event(SirilEvent("log: core.extension = .fits"))
+            on_event(SirilEvent("log: gui.theme = dark"))
+
+        with patch.object(siril_cli, "_run_command", side_effect=list_settings):
+            snapshot = await siril_cli.snapshot_settings(keys=["gui.theme", SirilSetting.MEM_RATIO])
+
+        assert snapshot == {"gui.theme": "dark"}
+
+    @pytest.mark.asyncio
+    async def test_reset(self, siril_cli):
+        siril_cli._start_directory = Path("/data/start dir")
+        siril_cli.settings_snapshot = {"core.extension": ".fits", "core.force_16bit": "FALSE"}
+        siril_cli.startup_timings = StartupTimings(version_probe=0.1, ready=0.5, settings=0.2, capabilities=0.2)
+
+        with patch.object(siril_cli, "command") as mock_command:
+            report = await siril_cli.reset()
+
+        commands, kwargs = mock_command.call_args
+        assert kwargs == {"pipelined": True}
+        assert [str(c) for c in commands[0]] == [
+            "close",
+            "cd '/data/start dir'",
+            "set core.extension=.fits",
+            "set core.force_16bit=false",
+        ]
+        assert report.restart_duration == pytest.approx(1.0)
+        assert report.duration < report.restart_duration
+        assert report.saved == pytest.approx(report.restart_duration - report.duration)
+
+    @pytest.mark.asyncio
+    async def test_start_records_start_directory(self, siril_cli):
+        siril_cli._cwd = Path("/custom/dir")
+        await self.start_with_mocks(siril_cli)
+
+        assert siril_cli._start_directory == Path("/custom/dir")
+
+    @pytest.mark.asyncio
+    async def test_start_directory_defaults_to_cwd(self, siril_cli):
+        await self.start_with_mocks(siril_cli)
 
-            assert cli.version == "siril-cli 1.4.0-beta"
-            mock_popen.assert_called_once_with(["siril-cli", "--version"], stdout=subprocess.PIPE)
+        assert siril_cli._start_directory == Path.cwd()
 
     @pytest.mark.asyncio
-    async def test_integration_context_manager_flow(self, mock_subprocess_popen, mock_siril_exe_exists):
+    async def test_integration_context_manager_flow(self, mock_version_probe, mock_siril_exe_exists):
         """Test complete context manager flow"""
 
         with patch.object(SirilCli, "_find_siril_cli", return_value="siril-cli"):
@@ -0,0 +1,207 @@
+import pytest
+import asyncio
+from unittest.mock import Mock, patch
+
+from async_siril import MemoryAdmission
+from async_siril.admission import (
+    GB,
+    SIRIL_BASE_MEMORY,
+    MemorySettings,
+    estimate_register_memory,
+    estimate_stack_memory,
+)
+from async_siril.command_types import stack_type
+
+MB = 1024 * 1024
+
+
+class TestMemorySettings:
+    def test_defaults(self):
+        settings = MemorySettings()
+
+        assert settings.mem_mode == 0
+        assert settings.bit_depth == 32
+        assert settings.bytes_per_sample == 4
+
+    def test_from_settings(self):
+        settings = MemorySettings.from_settings(
+            {
+                "core.mem_mode": "1",
+                "core.mem_ratio": "0.5",
+                "core.mem_amount": "8.5",
+                "core.force_16bit": "TRUE",
+                "core.extension": ".fit",
+            }
+        )
+
+        assert settings == MemorySettings(mem_mode=1, mem_ratio=0.5, mem_amount_gb=8.5, bit_depth=16)
+        assert settings.bytes_per_sample == 2
+
+    def test_siril_limit_fixed_amount(self):
+        assert MemorySettings(mem_mode=1, mem_amount_gb=2).siril_limit() == 2 * GB
+
+    @patch("async_siril.admission.available_memory", return_value=10 * GB)
+    def test_siril_limit_ratio_of_available(self, _available):
+        assert MemorySettings(mem_ratio=0.5).siril_limit() == 5 * GB
+        # Without an amount mode 1 falls back to the ratio
+        assert MemorySettings(mem_mode=1, mem_ratio=0.5).siril_limit() == 5 * GB
+
+
+class TestEstimates:
+    def test_rejection_stack_fits_in_memory(self):
+        settings = MemorySettings(mem_mode=1, mem_amount_gb=16)
+
+        estimate = estimate_stack_memory(frames=50, width=1000, height=1000, settings=settings)
+
+        assert estimate == SIRIL_BASE_MEMORY + 1000 * 1000 * 4 + 50 * 1000 * 1000 * 4
+
+    def test_rejection_stack_limited_by_siril_memory(self):
+        settings = MemorySettings(mem_mode=1, mem_amount_gb=1)
+
+        estimate = estimate_stack_memory(frames=200, width=6000, height=4000, settings=settings)
+
+        assert estimate == SIRIL_BASE_MEMORY + 6000 * 4000 * 4 + 1 * GB
+
+    def test_rejection_stack_needs_at_least_a_block(self):
+        settings = MemorySettings(mem_mode=1, mem_amount_gb=0.0001)
+
+        estimate = estimate_stack_memory(frames=100, width=4000, height=3000, threads=8, settings=settings)
+
+        assert estimate == SIRIL_BASE_MEMORY + 4000 * 3000 * 4 + 100 * 4000 * 4 * 8
+
+    def test_16_bit_halves_the_stack(self):
+        big = MemorySettings(mem_mode=1, mem_amount_gb=64)
+        small = MemorySettings(mem_mode=1, mem_amount_gb=64, bit_depth=16)
+
+        stack_32 = estimate_stack_memory(frames=40, width=2000, height=2000, channels=3, settings=big)
+        stack_16 = estimate_stack_memory(frames=40, width=2000, height=2000, channels=3, settings=small)
+
+        assert stack_32 - stack_16 == 40 * 2000 * 2000 * 3 * 2
+
+    def test_median_uses_the_stack_like_rejection(self):
+        settings = MemorySettings(mem_mode=1, mem_amount_gb=16)
+
+        median = estimate_stack_memory(10, 1000, 1000, method=stack_type.STACK_MED, settings=settings)
+        rejection = estimate_stack_memory(10, 1000, 1000, method=stack_type.STACK_REJ, settings=settings)
+
+        assert median == rejection
+
+    @pytest.mark.parametrize("method", [stack_type.STACK_SUM, stack_type.STACK_MIN, stack_type.STACK_MAX])
+    def test_streaming_stacks_do_not_depend_on_frames(self, method):
+        few = estimate_stack_memory(frames=10, width=1000, height=1000, method=method)
+        many = estimate_stack_memory(frames=1000, width=1000, height=1000, method=method)
+
+        assert few == many
+        assert few < estimate_stack_memory(frames=10, width=1000, height=1000, settings=MemorySettings(1, 0.9, 64))
+
+    def test_register_scales_with_threads(self):
+        one = estimate_register_memory(width=1000, height=1000, threads=1)
+        four = estimate_register_memory(width=1000, height=1000, threads=4)
+
+        assert four - one == 3 * 2 * 1000 * 1000 * 4
+
+
+class TestMemoryAdmission:
+    @pytest.fixture(autouse=True)
+    def plenty_available(self):
+        with patch("async_siril.admission.available_memory", return_value=64 * GB) as mock_available:
+            yield mock_available
+
+    def test_default_capacity_uses_cgroup_limit(self):
+        with patch("async_siril.admission.container_aware_memory_limit_bytes", return_value=3 * GB):
+            assert MemoryAdmission().capacity == 3 * GB
+
+        with (
+            patch("async_siril.admission.container_aware_memory_limit_bytes", return_value=None),
+            patch("async_siril.admission.total_memory", return_value=32 * GB),
+        ):
+            assert MemoryAdmission().capacity == 32 * GB
+
+    @pytest.mark.asyncio
+    async def test_jobs_within_capacity_run_together(self):
+        admission = MemoryAdmission(capacity=10 * GB)
+
+        async with admission.reserve(4 * GB):
+            async with asyncio.timeout(1.0):
+                async with admission.reserve(4 * GB) as memory_wait:
+                    assert admission.running == 2
+                    assert admission.reserved == 8 * GB
+                    assert memory_wait < 0.1
+
+        assert admission.running == 0
+        assert admission.reserved == 0
+
+    @pytest.mark.asyncio
+    async def test_jobs_over_capacity_wait(self):
+        admission = MemoryAdmission(capacity=10 * GB)
+        order = []
+
+        async def job(name: str, memory: int, hold: float):
+            async with admission.reserve(memory):
+                order.append(f"start {name}")
+                await asyncio.sleep(hold)
+                order.append(f"end {name}")
+
+        await asyncio.gather(job("a", 6 * GB, 0.05), job("b", 6 * GB, 0), job("c", 2 * GB, 0))
+
+        # c fits next to a but waits its turn behind b, then runs next to b
+        assert order[:3] == ["start a", "end a", "start b"]
+        assert order.index("start c") < order.index("end b")
+
+    @pytest.mark.asyncio
+    async def test_job_larger_than_capacity_runs_alone(self):
+        admission = MemoryAdmission(capacity=4 * GB)
+
+        async with asyncio.timeout(1.0):
+            async with admission.reserve(8 * GB):
+                assert admission.running == 1
+                assert not admission.fits(1 * GB)
+
+    @pytest.mark.asyncio
+    async def test_waits_for_available_memory(self, plenty_available):
+        admission = MemoryAdmission(capacity=64 * GB, poll_interval=0.01)
+        plenty_available.return_value = 1 * GB
+
+        async with admission.reserve(1 * GB):
+            waiting = asyncio.create_task(admission.reserve(2 * GB).__aenter__())
+            await asyncio.sleep(0.03)
+            assert not waiting.done()
+            assert admission.waiting == 1
+
+            # Another process freed memory
+            plenty_available.return_value = 8 * GB
+            memory_wait = await asyncio.wait_for(waiting, timeout=1.0)
+
+        assert memory_wait >= 0.03
+        assert admission.reserved == 2 * GB
+
+    @pytest.mark.asyncio
+    async def test_cancelled_waiter_leaves_the_queue(self):
+        admission = MemoryAdmission(capacity=4 * GB)
+
+        async with admission.reserve(4 * GB):
+            waiting = asyncio.create_task(admission.reserve(4 * GB).__aenter__())
+            await asyncio.sleep(0)
+            waiting.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await waiting
+
+            assert admission.waiting == 0
+
+        assert admission.running == 0
+
+    @pytest.mark.asyncio
+    async def test_memory_pressure_pauses_admission(self):
+        pressure = Mock(memory_pressure=True)
+        admission = MemoryAdmission(capacity=64 * GB, poll_interval=0.01, pressure=pressure)
+
+        # Nothing else running, the job is admitted anyway
+        async with admission.reserve(1 * GB):
+            waiting = asyncio.create_task(admission.reserve(1 * GB).__aenter__())
+            await asyncio.sleep(0.03)
+            assert not waiting.done()
+
+            pressure.memory_pressure = False
+            await asyncio.wait_for(waiting, timeout=1.0)
+
+        assert admission.running == 1
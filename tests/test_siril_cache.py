@@ -0,0 +1,140 @@
+import pytest
+import asyncio
+import os
+import sys
+from unittest.mock import patch
+
+from async_siril.cache import SirilCache, default_cache_directory, probe_version, read_json, write_json
+
+
+@pytest.fixture
+def fake_siril(tmp_path):
+    """A stand-in executable that answers `--version`"""
+    exe = tmp_path / "siril-cli"
+    exe.write_text('#!/bin/sh\necho "siril-cli 1.4.0"\n')
+    exe.chmod(0o755)
+    return str(exe)
+
+
+class TestDefaultCacheDirectory:
+    @patch("sys.platform", "linux")
+    def test_xdg_cache_home(self):
+        with patch.dict(os.environ, {"XDG_CACHE_HOME": "/custom/cache"}):
+            assert str(default_cache_directory()) == "/custom/cache/async_siril"
+
+    @patch("sys.platform", "win32")
+    def test_windows_local_app_data(self):
+        with patch.dict(os.environ, {"LOCALAPPDATA": "C:/Users/me/AppData/Local"}):
+            assert default_cache_directory().name == "async_siril"
+            assert str(default_cache_directory()).startswith("C:/Users/me/AppData/Local")
+
+
+class TestSirilCache:
+    def test_memory_get_set(self, fake_siril):
+        cache = SirilCache()
+
+        assert cache.get(fake_siril, "version") is None
+        cache.set(fake_siril, "version", "siril-cli 1.4.0")
+        assert cache.get(fake_siril, "version") == "siril-cli 1.4.0"
+
+    def test_memory_cache_does_not_write_to_disk(self, fake_siril, tmp_path):
+        cache = SirilCache(directory=tmp_path / "cache")
+        cache.set(fake_siril, "version", "siril-cli 1.4.0")
+
+        assert not cache.path.exists()
+
+    def test_executable_key_changes_with_mtime(self, fake_siril):
+        before = SirilCache.executable_key(fake_siril)
+        stat = os.stat(fake_siril)
+        os.utime(fake_siril, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+        assert SirilCache.executable_key(fake_siril) != before
+
+    def test_upgraded_executable_misses(self, fake_siril):
+        cache = SirilCache()
+        cache.set(fake_siril, "version", "siril-cli 1.2.0")
+        stat = os.stat(fake_siril)
+        os.utime(fake_siril, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+        assert cache.get(fake_siril, "version") is None
+
+    def test_executable_key_missing_file(self):
+        assert SirilCache.executable_key("/does/not/exist/siril-cli").endswith(":0")
+
+    def test_persist_round_trip(self, fake_siril, tmp_path):
+        directory = tmp_path / "cache"
+        SirilCache(persist=True, directory=directory).set(fake_siril, "version", "siril-cli 1.4.0")
+
+        assert (directory / SirilCache.FILE_NAME).exists()
+        assert SirilCache(persist=True, directory=directory).get(fake_siril, "version") == "siril-cli 1.4.0"
+
+    def test_persist_corrupt_file(self, fake_siril, tmp_path):
+        directory = tmp_path / "cache"
+        directory.mkdir()
+        (directory / SirilCache.FILE_NAME).write_text("not json")
+
+        cache = SirilCache(persist=True, directory=directory)
+        assert cache.get(fake_siril, "version") is None
+
+    def test_clear(self, fake_siril, tmp_path):
+        cache = SirilCache(persist=True, directory=tmp_path)
+        cache.set(fake_siril, "version", "siril-cli 1.4.0")
+        cache.clear()
+
+        assert cache.get(fake_siril, "version") is None
+        assert not cache.path.exists()
+
+
+class TestJsonFiles:
+    def test_round_trip(self, tmp_path):
+        path = tmp_path / "nested" / "data.json"
+        write_json(path, {"a": 1})
+
+        assert read_json(path, "data") == {"a": 1}
+        assert list(path.parent.iterdir()) == [path]
+
+    def test_missing_file_is_empty(self, tmp_path):
+        assert read_json(tmp_path / "missing.json", "data") == {}
+
+    def test_unreadable_file_is_empty(self, tmp_path):
+        path = tmp_path / "data.json"
+        path.write_text("{not json")
+
+        assert read_json(path, "data") == {}
+
+    def test_non_object_is_empty(self, tmp_path):
+        path = tmp_path / "data.json"
+        path.write_text("[1, 2]")
+
+        assert read_json(path, "data") == {}
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="uses a shell script as the executable")
+class TestProbeVersion:
+    @pytest.mark.asyncio
+    async def test_probe_version(self, fake_siril):
+        cache = SirilCache()
+
+        assert await probe_version(fake_siril, cache) == "siril-cli 1.4.0"
+        assert cache.get(fake_siril, "version") == "siril-cli 1.4.0"
+
+    @pytest.mark.asyncio
+    async def test_probe_version_cache_hit_does_not_spawn(self, fake_siril):
+        cache = SirilCache()
+        cache.set(fake_siril, "version", "siril-cli 1.3.0")
+
+        with patch("asyncio.create_subprocess_exec") as mock_exec:
+            assert await probe_version(fake_siril, cache) == "siril-cli 1.3.0"
+
+        mock_exec.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_concurrent_probes_spawn_once(self, fake_siril):
+        cache = SirilCache()
+        original = asyncio.create_subprocess_exec
+
+        with patch("asyncio.create_subprocess_exec", side_effect=original) as mock_exec:
+            versions = await asyncio.gather(*(probe_version(fake_siril, cache) for _ in range(16)))
+
+        assert versions == ["siril-cli 1.4.0"] * 16
+        mock_exec.assert_called_once()
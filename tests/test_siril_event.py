@@ -1,4 +1,7 @@
-from async_siril.event import SirilEvent
+import asyncio
+import pytest
+
+from async_siril.event import EventQueuePolicy, EventQueueStats, SirilEvent, SirilEventQueue
 
 
 class TestSirilEvent:
@@ -190,7 +193,123 @@ class TestSirilEvent:
         assert event.status is None  # No match due to regex behavior
         assert event.message == " success    Multiple spaces in message"
 
+    def test_progress_with_trailing_text(self):
+        assert SirilEvent("progress: 42% (3/7)").progress == 42
+        assert SirilEvent("progress:42%").progress is None
+
+    def test_events_have_no_dict(self):
+        event = SirilEvent("log: Reading sequence")
+
+        assert not hasattr(event, "__dict__")
+        with pytest.raises(AttributeError):
+            event.extra = 1
+
+    def test_parsing_is_lazy(self):
+        event = SirilEvent("status: success stack")
+        assert not event._parsed
+
+        assert event.completed
+        assert event._parsed
+        assert SirilEvent("log: Stacking").status is None
+
     def test_constants_values(self):
         assert SirilEvent.LOG == "log"
         assert SirilEvent.PROGRESS == "progress"
         assert SirilEvent.STATUS == "status"
+
+
+def drain(queue: asyncio.Queue):
+    events = []
+    while not queue.empty():
+        events.append(str(queue.get_nowait()))
+        queue.task_done()
+    return events
+
+
+class TestSirilEventQueue:
+    def test_consecutive_progress_is_coalesced(self):
+        queue = SirilEventQueue()
+
+        for event in ["log: Registering", "progress: 10%", "progress: 20%", "progress: 30%", "log: Done"]:
+            queue.put_nowait(SirilEvent(event))
+        queue.put_nowait(SirilEvent("progress: 40%"))
+
+        assert drain(queue) == ["log: Registering", "progress: 30%", "log: Done", "progress: 40%"]
+        assert queue.stats.coalesced == 2
+
+    def test_progress_is_not_coalesced_once_consumed(self):
+        queue = SirilEventQueue()
+
+        queue.put_nowait(SirilEvent("progress: 10%"))
+        assert drain(queue) == ["progress: 10%"]
+        queue.put_nowait(SirilEvent("progress: 20%"))
+
+        assert drain(queue) == ["progress: 20%"]
+        assert queue.stats.coalesced == 0
+
+    def test_coalescing_can_be_disabled(self):
+        queue = SirilEventQueue(EventQueuePolicy(coalesce_progress=False))
+
+        queue.put_nowait(SirilEvent("progress: 10%"))
+        queue.put_nowait(SirilEvent("progress: 20%"))
+
+        assert drain(queue) == ["progress: 10%", "progress: 20%"]
+
+    def test_logs_past_high_water_are_dropped(self):
+        queue = SirilEventQueue(EventQueuePolicy(high_water=2))
+
+        for index in range(5):
+            queue.put_nowait(SirilEvent(f"log: line {index}"))
+        queue.put_nowait(SirilEvent("status: success done"))
+
+        assert drain(queue) == ["log: line 0", "log: line 1", "status: success done"]
+        assert queue.stats == EventQueueStats(dropped=3, peak_size=3)
+
+    def test_logs_past_high_water_are_sampled(self):
+        queue = SirilEventQueue(EventQueuePolicy(high_water=1, log_sample=3))
+
+        for index in range(8):
+            queue.put_nowait(SirilEvent(f"log: line {index}"))
+
+        assert drain(queue) == ["log: line 0", "log: line 3", "log: line 6"]
+        assert queue.stats.sampled == 2
+        assert queue.stats.dropped == 5
+
+    def test_status_events_are_never_dropped(self):
+        queue = SirilEventQueue(EventQueuePolicy(high_water=0))
+
+        queue.put_nowait(SirilEvent("log: dropped"))
+        for _ in range(3):
+            queue.put_nowait(SirilEvent("status: success done"))
+
+        assert drain(queue) == ["status: success done"] * 3
+
+    def test_stays_bounded(self):
+        queue = SirilEventQueue(EventQueuePolicy(high_water=100, log_sample=10, max_size=150))
+
+        for index in range(50000):
+            queue.put_nowait(SirilEvent(f"log: frame {index}"))
+            queue.put_nowait(SirilEvent(f"progress: {index % 100}%"))
+
+        assert queue.qsize() <= 151
+        assert queue.stats.peak_size == queue.qsize()
+
+    def test_stats_are_shared(self):
+        stats = EventQueueStats()
+        first, second = SirilEventQueue(stats=stats), SirilEventQueue(stats=stats)
+
+        for queue in (first, second):
+            queue.put_nowait(SirilEvent("progress: 1%"))
+            queue.put_nowait(SirilEvent("progress: 2%"))
+
+        assert stats.coalesced == 2
+
+    @pytest.mark.asyncio
+    async def test_get_waits_for_events(self):
+        queue = SirilEventQueue()
+        waiting = asyncio.create_task(queue.get())
+        await asyncio.sleep(0)
+
+        queue.put_nowait(SirilEvent("status: success done"))
+
+        assert str(await asyncio.wait_for(waiting, timeout=1.0)) == "status: success done"
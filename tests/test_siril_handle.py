@@ -0,0 +1,124 @@
+import asyncio
+import pytest
+import time
+
+from async_siril.event import SirilEvent
+from async_siril.handle import CommandEvent, CommandHandle
+from async_siril.progress import DurationHistory
+from async_siril.siril import CommandResult
+
+
+class TestCommandHandle:
+    @pytest.mark.asyncio
+    async def test_events_end_with_the_call(self):
+        handle = CommandHandle()
+
+        async def call():
+            handle._on_event("stack lights", SirilEvent("progress: 40%"))
+            await asyncio.sleep(0)
+            handle._on_event("stack lights", SirilEvent("log: Stacking done"))
+            return CommandResult(commands=["stack lights"])
+
+        handle._start(call())
+        items = [item async for item in handle]
+
+        assert [str(item.event) for item in items] == ["progress: 40%", "log: Stacking done"]
+        assert items[0] == CommandEvent("stack lights", items[0].event)
+        assert handle.progress == 40
+        assert handle.done()
+        assert (await handle).commands == ["stack lights"]
+
+    @pytest.mark.asyncio
+    async def test_progress_is_coalesced(self):
+        handle = CommandHandle(progress_interval=60)
+
+        async def call():
+            for progress in range(1, 100):
+                handle._on_event("register lights", SirilEvent(f"progress: {progress}%"))
+            handle._on_event("register lights", SirilEvent("log: Registration finished"))
+            for progress in (10, 20):
+                handle._on_event("stack r_lights", SirilEvent(f"progress: {progress}%"))
+            return CommandResult(commands=["register lights", "stack r_lights"])
+
+        handle._start(call())
+        items = [(item.command, str(item.event)) async for item in handle]
+
+        # The first update of each command is published, then only the latest one
+        assert items == [
+            ("register lights", "progress: 1%"),
+            ("register lights", "progress: 99%"),
+            ("register lights", "log: Registration finished"),
+            ("stack r_lights", "progress: 10%"),
+            ("stack r_lights", "progress: 20%"),
+        ]
+
+    @pytest.mark.asyncio
+    async def test_estimate_and_history(self):
+        history = DurationHistory()
+        history.record("stack lights", 50.0, frames=20)
+        handle = CommandHandle(history=history, frames=20)
+        assert handle.estimate is None
+
+        handle._on_event("stack lights", SirilEvent("progress: 10%"))
+        estimate = handle.estimate
+
+        assert estimate is not None
+        assert estimate.command == "stack lights"
+        assert estimate.progress == 10
+        assert estimate.expected_duration == 50.0
+
+        handle._on_event("stack lights", SirilEvent("status: success stack"))
+        assert handle.estimate is None
+        assert len(history.entries["stack:20"]) == 2
+
+    @pytest.mark.asyncio
+    async def test_failed_commands_are_not_recorded(self):
+        history = DurationHistory()
+        handle = CommandHandle(history=history)
+
+        handle._on_event("stack lights", SirilEvent("status: error stack failed"))
+
+        assert history.entries == {}
+
+    @pytest.mark.asyncio
+    async def test_duration_starts_when_command_was_sent(self):
+        history = DurationHistory()
+        sent = time.monotonic() - 30.0
+        handle = CommandHandle(history=history, sent=lambda: sent)
+
+        handle._on_event("stack lights", SirilEvent("status: success stack"))
+
+        assert history.entries["stack:0"][0] >= 30.0
+
+    @pytest.mark.asyncio
+    async def test_events_are_bounded_without_consumer(self):
+        handle = CommandHandle(max_events=3)
+
+        async def call():
+            for i in range(10):
+                handle._on_event("stack lights", SirilEvent(f"log: line {i}"))
+            handle._on_event("stack lights", SirilEvent("status: success stack"))
+            return CommandResult(commands=["stack lights"])
+
+        handle._start(call())
+        await handle
+        items = [str(item.event) async for item in handle]
+
+        # Logs past the bound are dropped, the status and the end of the call make room for themselves
+        assert items == ["log: line 2", "status: success stack"]
+        assert handle.dropped == 9
+
+    @pytest.mark.asyncio
+    async def test_cancel(self):
+        handle = CommandHandle()
+        handle._start(asyncio.sleep(10))
+
+        handle.cancel()
+
+        assert [item async for item in handle] == []
+        with pytest.raises(asyncio.CancelledError):
+            await handle.result()
+
+    def test_not_started(self):
+        with pytest.raises(AssertionError):
+            CommandHandle().done()
@@ -0,0 +1,30 @@
+import pytest
+
+from async_siril.inflight import InFlightCommands
+
+
+class TestInFlightCommands:
+    def test_commands_complete_in_order(self):
+        in_flight = InFlightCommands()
+        assert in_flight.oldest is None
+
+        first = in_flight.open("register lights")
+        second = in_flight.open("stack r_lights")
+
+        assert len(in_flight) == 2
+        assert (first.id, second.id) == (1, 2)
+        assert in_flight.oldest is first
+        assert in_flight.complete() is first
+        assert [record.command for record in in_flight] == ["stack r_lights"]
+
+    def test_ids_are_not_reused(self):
+        in_flight = InFlightCommands()
+        in_flight.open("load a")
+        in_flight.clear()
+
+        assert not in_flight
+        assert in_flight.open("load b").id == 2
+
+    def test_complete_without_commands(self):
+        with pytest.raises(IndexError):
+            InFlightCommands().complete()
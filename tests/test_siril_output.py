@@ -0,0 +1,81 @@
+import asyncio
+import pytest
+from unittest.mock import patch
+
+from async_siril.output import OutputPolicy, OutputRing, StreamMode, read_stream
+
+
+def stream_of(*chunks: bytes) -> asyncio.StreamReader:
+    stream = asyncio.StreamReader()
+    for chunk in chunks:
+        stream.feed_data(chunk)
+    stream.feed_eof()
+    return stream
+
+
+class TestOutputRing:
+    def test_keeps_latest_lines(self):
+        ring = OutputRing(size=3)
+        ring.extend(["a", "b", "c", "d"])
+
+        assert len(ring) == 3
+        assert ring.tail() == ["b", "c", "d"]
+        assert ring.tail(2) == ["c", "d"]
+        assert ring.tail(0) == []
+
+    def test_clear(self):
+        ring = OutputRing()
+        ring.extend(["a"])
+        ring.clear()
+
+        assert ring.tail() == []
+
+
+class TestReadStream:
+    @pytest.mark.asyncio
+    async def test_lines_split_across_chunks(self):
+        ring = OutputRing()
+        stream = stream_of(b"Reading seq", b"uence\nStacking ", b"done\nno newline")
+
+        await read_stream(stream, "stdout", OutputPolicy(mode=StreamMode.RING, chunk_size=20), ring)
+
+        assert ring.tail() == ["Reading sequence", "Stacking done", "no newline"]
+
+    @pytest.mark.asyncio
+    async def test_long_lines_are_split(self):
+        ring = OutputRing()
+
+        await read_stream(stream_of(b"x" * 20), "stdout", OutputPolicy(mode=StreamMode.RING, chunk_size=8), ring)
+
+        assert "".join(ring.tail()) == "x" * 20
+
+    @pytest.mark.asyncio
+    async def test_stderr_lines_are_prefixed(self):
+        ring = OutputRing()
+
+        await read_stream(stream_of(b"Gtk-WARNING\n"), "stderr", OutputPolicy(mode=StreamMode.RING), ring)
+
+        assert ring.tail() == ["stderr: Gtk-WARNING"]
+
+    @pytest.mark.asyncio
+    async def test_invalid_utf8_is_replaced(self):
+        ring = OutputRing()
+
+        await read_stream(stream_of(b"caf\xe9\n"), "stdout", OutputPolicy(mode=StreamMode.RING), ring)
+
+        assert ring.tail() == ["caf�"]
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize(
+        "mode, logged",
+        [(StreamMode.RING, 0), (StreamMode.SAMPLED, 3), (StreamMode.FULL, 25)],
+    )
+    async def test_logging_modes(self, mode, logged):
+        ring = OutputRing()
+        lines = b"".join(f"line {i}\n".encode() for i in range(25))
+
+        with patch("async_siril.output.logger") as mock_logger:
+            await read_stream(stream_of(lines), "stdout", OutputPolicy(mode=mode, sample=10), ring)
+
+        assert mock_logger.info.call_count == logged
+        assert len(ring) == 25
@@ -100,6 +100,7 @@ class TestAsyncSirilEventConsumer:
             await consumer._run()
 
             consumer._pipe.connect.assert_called_once()
+            assert consumer.pipe_opened.done()
             assert consumer.siril_ready.done()
 
     @pytest.mark.asyncio
@@ -132,6 +133,19 @@ class TestAsyncSirilEventConsumer:
         assert events[1]._raw_string == "status: success"
         assert consumer.fifo_closed.done()
 
+    @pytest.mark.asyncio
+    async def test_consumer_queues_pipe_closed_on_eof(self, consumer):
+        consumer._running = True
+        consumer._pipe.connect = AsyncMock()
+        consumer._pipe.read_line = AsyncMock(side_effect=["status: success done", ""])
+
+        await consumer._run()
+
+        assert consumer.queue.get_nowait().completed
+        closed = consumer.queue.get_nowait()
+        assert closed.closed
+        assert not closed.completed
+
     @pytest.mark.asyncio
     async def test_consumer_aiter_events_not_running(self, consumer):
         consumer._running = False
@@ -173,6 +187,7 @@ class TestAsyncSirilCommandProducer:
             mock_instance.path = "/tmp/test_pipe"
             mock_instance.connect = AsyncMock()
             mock_instance.write_line = AsyncMock()
+            mock_instance.write_lines = AsyncMock()
             mock_instance.close = Mock()
             mock_pipe_client.return_value = mock_instance
             producer_instance = AsyncSirilCommandProducer()
@@ -259,7 +274,7 @@ class TestAsyncSirilCommandProducer:
     async def test_producer_run_successful(self, producer):
         producer._running = True
         producer._pipe.connect = AsyncMock()
-        producer._pipe.write_line = AsyncMock()
+        producer._pipe.write_lines = AsyncMock()
         producer._pipe.close = Mock()
 
         # Mock the queue to return one command then stop
@@ -273,14 +288,14 @@ class TestAsyncSirilCommandProducer:
                 producer._running = False
                 raise asyncio.CancelledError()
 
-        with patch.object(producer._queue, "get", side_effect=mock_get):
+        with patch.object(producer._queue, "get", side_effect=mock_get), patch.object(producer._queue, "task_done"):
             try:
                 await producer._run()
             except asyncio.CancelledError:
                 pass
 
         producer._pipe.connect.assert_called_once()
-        producer._pipe.write_line.assert_called_with("test command")
+        producer._pipe.write_lines.assert_called_with(["test command"])
         producer._pipe.close.assert_called_once()
 
     @pytest.mark.asyncio
@@ -299,7 +314,7 @@ class TestAsyncSirilCommandProducer:
     async def test_producer_multiple_commands(self, producer):
         producer._running = True
         producer._pipe.connect = AsyncMock()
-        producer._pipe.write_line = AsyncMock()
+        producer._pipe.write_lines = AsyncMock()
         producer._pipe.close = Mock()
 
         commands = ["command1", "command2", "command3"]
@@ -314,16 +329,62 @@ class TestAsyncSirilCommandProducer:
                 producer._running = False
                 raise asyncio.CancelledError()
 
-        with patch.object(producer._queue, "get", side_effect=mock_get):
+        with patch.object(producer._queue, "get", side_effect=mock_get), patch.object(producer._queue, "task_done"):
             try:
                 await producer._run()
             except asyncio.CancelledError:
                 pass
 
         # Should have written all commands
-        assert producer._pipe.write_line.call_count == len(commands)
+        assert producer._pipe.write_lines.call_count == len(commands)
         for cmd in commands:
-            producer._pipe.write_line.assert_any_call(cmd)
+            producer._pipe.write_lines.assert_any_call([cmd])
+
+    @pytest.mark.asyncio
+    async def test_producer_batches_queued_commands(self, producer):
+        producer._running = True
+        producer._pipe.connect = AsyncMock()
+        producer._pipe.close = Mock()
+
+        async def stop_after_write(_batch):
+            producer._running = False
+
+        producer._pipe.write_lines = AsyncMock(side_effect=stop_after_write)
+
+        for cmd in ["command1", "command2", "command3"]:
+            await producer.send(cmd)
+
+        await producer._run()
+
+        # Everything queued before the write is coalesced into one batch
+        producer._pipe.write_lines.assert_called_once_with(["command1", "command2", "command3"])
+        assert producer._queue.empty()
+        await asyncio.wait_for(producer._queue.join(), timeout=1.0)
+
+    @pytest.mark.asyncio
+    async def test_producer_write_failure_fails_sends(self, producer):
+        events = asyncio.Queue()
+        producer._events = events
+        producer._running = True
+        producer._pipe.write_lines = AsyncMock(side_effect=BrokenPipeError(32, "Broken pipe"))
+
+        await producer.send("command1")
+        await asyncio.wait_for(producer._run(), timeout=1.0)
+
+        assert producer._running is False
+        assert isinstance(producer.error, BrokenPipeError)
+        assert producer.fifo_closed.done()
+        producer._pipe.close.assert_called_once()
+        await asyncio.wait_for(producer._queue.join(), timeout=1.0)
+
+        # Whoever waits on Siril is told it can't be written to anymore
+        event = events.get_nowait()
+        assert event.closed
+        assert "Could not write to Siril" in event.message
+
+        with pytest.raises(BrokenPipeError):
+            await producer.send("command2")
+        assert producer._queue.empty()
 
 
 class TestIntegrationScenarios:
@@ -402,31 +463,56 @@ class TestIntegrationScenarios:
 
             # Check that events were processed correctly
             assert consumer.siril_ready.done()
-            assert consumer.queue.qsize() == 3  # log, progress, status events
+            assert consumer.queue.qsize() == 4  # log, progress, status events & pipe closed
 
             # Verify events in queue
             events = []
             while not consumer.queue.empty():
                 events.append(consumer.queue.get_nowait())
 
-            assert len(events) == 3
+            assert len(events) == 4
             assert events[0].value == SirilEvent.LOG
             assert events[1].value == SirilEvent.PROGRESS
             assert events[2].value == SirilEvent.STATUS
+            assert events[3].closed
 
     def test_consumer_uses_read_pipe_mode(self):
         with patch("async_siril.event.PipeClient") as mock_pipe_client:
             AsyncSirilEventConsumer()
 
             # Verify PipeClient was called with READ mode
-            mock_pipe_client.assert_called_once_with(mode=PipeMode.READ)
+            mock_pipe_client.assert_called_once_with(mode=PipeMode.READ, directory=None)
 
     def test_producer_uses_write_pipe_mode(self):
         with patch("async_siril.event.PipeClient") as mock_pipe_client:
             AsyncSirilCommandProducer()
 
             # Verify PipeClient was called with WRITE mode
-            mock_pipe_client.assert_called_once_with(mode=PipeMode.WRITE)
+            mock_pipe_client.assert_called_once_with(mode=PipeMode.WRITE, directory=None)
+
+    def test_consumer_producer_share_pipe_directory(self):
+        with patch("async_siril.event.PipeClient") as mock_pipe_client:
+            AsyncSirilEventConsumer(pipe_dir="/tmp/async_siril_test")
+            AsyncSirilCommandProducer(pipe_dir="/tmp/async_siril_test")
+
+            mock_pipe_client.assert_any_call(mode=PipeMode.READ, directory="/tmp/async_siril_test")
+            mock_pipe_client.assert_any_call(mode=PipeMode.WRITE, directory="/tmp/async_siril_test")
+
+    def test_start_creates_pipes(self):
+        with patch("async_siril.event.PipeClient", side_effect=lambda **_kwargs: Mock()):
+            consumer = AsyncSirilEventConsumer()
+            producer = AsyncSirilCommandProducer()
+
+            with (
+                patch("asyncio.create_task"),
+                patch.object(consumer, "_run", new=Mock()),
+                patch.object(producer, "_run", new=Mock()),
+            ):
+                consumer.start()
+                producer.start()
+
+            consumer._pipe.create.assert_called_once()  # type: ignore
+            producer._pipe.create.assert_called_once()  # type: ignore
 
     @pytest.mark.asyncio
     async def test_exception_handling_in_consumer(self):
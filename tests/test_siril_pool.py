@@ -0,0 +1,425 @@
+import pytest
+import asyncio
+from unittest.mock import Mock, AsyncMock, patch
+
+from async_siril import EventQueuePolicy, MemoryAdmission, RestartPolicy, SirilPool, SirilResource, ThreadPolicy
+from async_siril import OutputPolicy, StreamMode, WorkerPlan
+from async_siril.event import EventQueueStats
+
+
+def make_worker():
+    worker = Mock()
+    worker.start = AsyncMock()
+    worker.stop = AsyncMock()
+    worker.command = AsyncMock()
+    worker.reset = AsyncMock()
+    worker.snapshot_settings = AsyncMock()
+    worker.drain = AsyncMock()
+    worker.in_flight = []
+    worker.event_stats = EventQueueStats()
+    return worker
+
+
+class TestSirilPool:
+    @pytest.fixture
+    def mock_siril_cli(self):
+        with patch("async_siril.pool.SirilCli") as mock_cli:
+            mock_cli.side_effect = lambda **_kwargs: make_worker()
+            yield mock_cli
+
+    def test_pool_initialization(self):
+        pool = SirilPool(size=3)
+
+        assert pool.size == 3
+        assert pool.workers == []
+        assert pool.available == 0
+        assert len(pool._resources) == 3
+
+    def test_pool_from_plan(self):
+        plan = WorkerPlan.plan(cpus=6, memory_gb=12)
+        pool = SirilPool.from_plan(plan, reset_on_release=True)
+
+        assert pool.size == 3
+        assert pool._resources == plan.resources
+        assert pool._reset_on_release
+
+    def test_pool_invalid_size(self):
+        with pytest.raises(ValueError, match="at least 1 worker"):
+            SirilPool(size=0)
+
+    def test_pool_resources_list_length_mismatch(self):
+        with pytest.raises(ValueError, match="one entry per worker"):
+            SirilPool(size=2, resources=[SirilResource(cpu_limit=2)])
+
+    @pytest.mark.asyncio
+    async def test_pool_start_creates_workers_with_resources(self, mock_siril_cli):
+        resources = [SirilResource(cpu_limit=2), SirilResource(cpu_limit=4)]
+        pool = SirilPool(size=2, resources=resources)
+
+        await pool.start()
+
+        assert len(pool.workers) == 2
+        assert pool.available == 2
+        for worker in pool.workers:
+            worker.start.assert_called_once()
+        assert mock_siril_cli.call_args_list[0].kwargs["resources"] == resources[0]
+        assert mock_siril_cli.call_args_list[1].kwargs["resources"] == resources[1]
+
+    @pytest.mark.asyncio
+    async def test_pool_start_failure_stops_workers(self, mock_siril_cli):
+        failing = make_worker()
+        failing.start = AsyncMock(side_effect=RuntimeError("boom"))
+        healthy = make_worker()
+        mock_siril_cli.side_effect = [healthy, failing]
+
+        pool = SirilPool(size=2)
+        with pytest.raises(RuntimeError, match="boom"):
+            await pool.start()
+
+        healthy.stop.assert_called_once()
+        failing.stop.assert_called_once()
+        assert pool.workers == []
+
+    @pytest.mark.asyncio
+    async def test_pool_acquire_not_started(self):
+        pool = SirilPool(size=1)
+
+        with pytest.raises(RuntimeError, match="Pool not started"):
+            await pool.acquire()
+
+    @pytest.mark.asyncio
+    async def test_pool_acquire_and_release(self, mock_siril_cli):
+        pool = SirilPool(size=2)
+        await pool.start()
+
+        worker = await pool.acquire()
+        assert pool.available == 1
+
+        pool.release(worker)
+        assert pool.available == 2
+
+    @pytest.mark.asyncio
+    async def test_pool_release_foreign_worker(self, mock_siril_cli):
+        pool = SirilPool(size=1)
+        await pool.start()
+
+        with pytest.raises(ValueError, match="does not belong"):
+            pool.release(make_worker())
+
+    @pytest.mark.asyncio
+    async def test_pool_session_releases_on_error(self, mock_siril_cli):
+        pool = SirilPool(size=1)
+        await pool.start()
+
+        with pytest.raises(ValueError):
+            async with pool.session() as siril:
+                assert pool.available == 0
+                assert siril in pool.workers
+                raise ValueError("job failed")
+
+        assert pool.available == 1
+
+    @pytest.mark.asyncio
+    async def test_pool_acquire_waits_for_release(self, mock_siril_cli):
+        pool = SirilPool(size=1)
+        await pool.start()
+
+        worker = await pool.acquire()
+        waiter = asyncio.create_task(pool.acquire())
+        await asyncio.sleep(0)
+        assert not waiter.done()
+
+        pool.release(worker)
+        assert await asyncio.wait_for(waiter, timeout=1.0) is worker
+
+    @pytest.mark.asyncio
+    async def test_pool_commands_run_concurrently(self, mock_siril_cli):
+        pool = SirilPool(size=2)
+        await pool.start()
+
+        started = []
+        gate = asyncio.Event()
+
+        async def slow_command(cmd, **_kwargs):
+            started.append(cmd)
+            await gate.wait()
+
+        for worker in pool.workers:
+            worker.command = AsyncMock(side_effect=slow_command)
+
+        tasks = [asyncio.create_task(pool.command(f"stack {i}")) for i in range(2)]
+        await asyncio.sleep(0.01)
+        assert sorted(started) == ["stack 0", "stack 1"]
+
+        gate.set()
+        await asyncio.gather(*tasks)
+        assert pool.available == 2
+
+    @pytest.mark.asyncio
+    async def test_pool_context_manager(self, mock_siril_cli):
+        async with SirilPool(size=2) as pool:
+            workers = pool.workers
+            assert len(workers) == 2
+
+        for worker in workers:
+            worker.stop.assert_called_once()
+        assert pool.workers == []
+
+    @pytest.mark.asyncio
+    async def test_pool_reset_on_release(self, mock_siril_cli):
+        pool = SirilPool(size=1, reset_on_release=True)
+        await pool.start()
+        worker = pool.workers[0]
+        worker.snapshot_settings.assert_called_once()
+
+        async with pool.session():
+            pass
+        # The worker is only available again after the reset
+        assert pool.available == 0
+        assert await asyncio.wait_for(pool.acquire(), timeout=1.0) is worker
+        worker.reset.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_pool_no_reset_by_default(self, mock_siril_cli):
+        pool = SirilPool(size=1)
+        await pool.start()
+
+        async with pool.session() as siril:
+            pass
+
+        siril.reset.assert_not_called()
+        siril.snapshot_settings.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_pool_drains_cancelled_commands(self, mock_siril_cli):
+        pool = SirilPool(size=1)
+        await pool.start()
+        worker = pool.workers[0]
+        worker.in_flight = [Mock()]
+
+        pool.release(await pool.acquire())
+
+        # The same worker comes back once its cancelled commands completed
+        assert await asyncio.wait_for(pool.acquire(), timeout=1.0) is worker
+        worker.drain.assert_called_once()
+        worker.reset.assert_not_called()
+        worker.stop.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_pool_respawns_worker_when_reset_fails(self, mock_siril_cli):
+        pool = SirilPool(size=1, reset_on_release=True, resources=SirilResource(cpu_limit=3))
+        await pool.start()
+        broken = pool.workers[0]
+        broken.reset = AsyncMock(side_effect=RuntimeError("pipe closed"))
+
+        pool.release(await pool.acquire())
+        replacement = await asyncio.wait_for(pool.acquire(), timeout=1.0)
+
+        assert replacement is not broken
+        broken.stop.assert_called_once()
+        replacement.start.assert_called_once()
+        assert pool.workers == [replacement]
+        assert mock_siril_cli.call_args.kwargs["resources"] == SirilResource(cpu_limit=3)
+
+    @pytest.mark.asyncio
+    async def test_pool_retries_failed_respawn(self, mock_siril_cli):
+        pool = SirilPool(size=1, reset_on_release=True, restart_policy=RestartPolicy(max_restarts=2, backoff=0))
+        await pool.start()
+        pool.workers[0].reset = AsyncMock(side_effect=RuntimeError("pipe closed"))
+
+        failing = make_worker()
+        failing.start = AsyncMock(side_effect=RuntimeError("siril did not start"))
+        mock_siril_cli.side_effect = [failing, make_worker()]
+
+        pool.release(await pool.acquire())
+        replacement = await asyncio.wait_for(pool.acquire(), timeout=1.0)
+
+        # The half started process is stopped and the next attempt takes its place
+        failing.stop.assert_called_once()
+        assert replacement is not failing
+        assert pool.workers == [replacement]
+
+    @pytest.mark.asyncio
+    async def test_pool_stop_during_respawn_stops_replacement(self, mock_siril_cli):
+        pool = SirilPool(size=1)
+        await pool.start()
+        worker = await pool.acquire()
+        worker.running = False
+
+        starting = asyncio.Event()
+        replacement = make_worker()
+
+        async def slow_start():
+            starting.set()
+            await asyncio.sleep(10)
+
+        replacement.start = AsyncMock(side_effect=slow_start)
+        mock_siril_cli.side_effect = [replacement]
+
+        pool.release(worker)
+        await asyncio.wait_for(starting.wait(), timeout=1.0)
+        await pool.stop()
+
+        # The replacement wasn't in the pool yet, cancelling its start still stops it
+        replacement.stop.assert_called_once()
+        worker.stop.assert_called()
+
+    @pytest.mark.asyncio
+    async def test_pool_fails_waiters_when_workers_cannot_respawn(self, mock_siril_cli):
+        pool = SirilPool(size=1, restart_policy=RestartPolicy(max_restarts=1, backoff=0))
+        await pool.start()
+        worker = await pool.acquire()
+        worker.running = False
+
+        def failing_worker(**_kwargs):
+            replacement = make_worker()
+            replacement.start = AsyncMock(side_effect=RuntimeError("siril did not start"))
+            return replacement
+
+        mock_siril_cli.side_effect = failing_worker
+        waiters = [asyncio.create_task(pool.acquire()) for _ in range(2)]
+        await asyncio.sleep(0)
+        pool.release(worker)
+
+        for waiter in waiters:
+            with pytest.raises(RuntimeError, match="No Siril worker left"):
+                await asyncio.wait_for(waiter, timeout=1.0)
+        assert pool.workers == []
+        assert pool.available == 0
+        assert pool.busy == 0
+        with pytest.raises(RuntimeError, match="No Siril worker left"):
+            await pool.acquire()
+
+    @pytest.mark.asyncio
+    async def test_pool_passes_command_timeout(self, mock_siril_cli):
+        pool = SirilPool(size=1, command_timeout=30)
+        await pool.start()
+
+        assert mock_siril_cli.call_args.kwargs["command_timeout"] == 30
+
+    @pytest.mark.asyncio
+    async def test_pool_shares_admission(self, mock_siril_cli):
+        admission = MemoryAdmission(capacity=1024)
+        pool = SirilPool(size=2, admission=admission)
+        await pool.start()
+
+        assert all(c.kwargs["admission"] is admission for c in mock_siril_cli.call_args_list)
+
+        await pool.command("stack lights", memory=256)
+        assert any(
+            w.command.call_args == (("stack lights",), {"timeout": None, "memory": 256, "on_event": None})
+            for w in pool.workers
+        )
+
+    @pytest.mark.asyncio
+    async def test_pool_shares_thread_policy(self, mock_siril_cli):
+        policy = ThreadPolicy(total_threads=8)
+        pool = SirilPool(size=2, thread_policy=policy)
+        await pool.start()
+
+        assert all(c.kwargs["thread_policy"] is policy for c in mock_siril_cli.call_args_list)
+
+    @pytest.mark.asyncio
+    async def test_pool_passes_sample_interval(self, mock_siril_cli):
+        pool = SirilPool(size=2, sample_interval=0.5)
+        await pool.start()
+
+        assert all(c.kwargs["sample_interval"] == 0.5 for c in mock_siril_cli.call_args_list)
+
+    @pytest.mark.asyncio
+    async def test_memory_pressure_pauses_acquire(self, mock_siril_cli):
+        pressure = Mock(memory_pressure=True, interval=0.01)
+        pool = SirilPool(size=2, pressure=pressure)
+        await pool.start()
+
+        # Nothing is busy, a worker is handed out anyway
+        first = await asyncio.wait_for(pool.acquire(), timeout=1.0)
+        waiting = asyncio.create_task(pool.acquire())
+        await asyncio.sleep(0.03)
+        assert not waiting.done()
+
+        pressure.memory_pressure = False
+        second = await asyncio.wait_for(waiting, timeout=1.0)
+        assert second is not first
+        assert pool.busy == 2
+
+    @pytest.mark.asyncio
+    async def test_metrics(self, mock_siril_cli):
+        pressure = Mock()
+        pressure.metrics.return_value = {"memory_some_avg10": 1.5, "memory_pressure": 0.0}
+        pool = SirilPool(size=2, pressure=pressure)
+        await pool.start()
+        await pool.acquire()
+
+        pool.workers[0].event_stats.dropped = 3
+        pool.workers[1].event_stats.dropped = 2
+        pool.workers[1].event_stats.coalesced = 10
+
+        assert pool.metrics() == {
+            "workers": 2.0,
+            "busy_workers": 1.0,
+            "events_dropped": 5.0,
+            "events_coalesced": 10.0,
+            "events_sampled": 0.0,
+            "pressure_memory_some_avg10": 1.5,
+            "pressure_memory_pressure": 0.0,
+        }
+        assert SirilPool(size=1).metrics() == {
+            "workers": 0.0,
+            "busy_workers": 0.0,
+            "events_dropped": 0.0,
+            "events_coalesced": 0.0,
+            "events_sampled": 0.0,
+        }
+
+    @pytest.mark.asyncio
+    async def test_pool_passes_event_policy(self, mock_siril_cli):
+        policy = EventQueuePolicy(high_water=100)
+        pool = SirilPool(size=2, event_policy=policy)
+        await pool.start()
+
+        assert all(c.kwargs["event_policy"] is policy for c in mock_siril_cli.call_args_list)
+
+    @pytest.mark.asyncio
+    async def test_pool_passes_output_policy(self, mock_siril_cli):
+        policy = OutputPolicy(mode=StreamMode.RING)
+        pool = SirilPool(size=2, output_policy=policy)
+        await pool.start()
+
+        assert all(c.kwargs["output_policy"] is policy for c in mock_siril_cli.call_args_list)
+
+    @pytest.mark.asyncio
+    async def test_pool_passes_restart_policy(self, mock_siril_cli):
+        policy = RestartPolicy(max_restarts=1)
+        pool = SirilPool(size=1, restart_policy=policy)
+        await pool.start()
+
+        assert mock_siril_cli.call_args.kwargs["restart_policy"] is policy
+
+    @pytest.mark.asyncio
+    async def test_pool_session_timeout(self, mock_siril_cli):
+        pool = SirilPool(size=1, session_timeout=60)
+        await pool.start()
+
+        async with pool.session() as siril:
+            siril.set_session_timeout.assert_called_once_with(60)
+        siril.set_session_timeout.assert_called_with(None)
+
+        async with pool.session(timeout=5) as siril:
+            siril.set_session_timeout.assert_called_with(5)
+
+    @pytest.mark.asyncio
+    async def test_pool_respawns_worker_killed_by_timeout(self, mock_siril_cli):
+        pool = SirilPool(size=1)
+        await pool.start()
+
+        async with pool.session() as siril:
+            # The watchdog killed the process
+            siril.running = False
+
+        replacement = await asyncio.wait_for(pool.acquire(), timeout=1.0)
+
+        assert replacement is not siril
+        siril.stop.assert_called_once()
+        siril.reset.assert_not_called()
+        assert pool.workers == [replacement]
@@ -0,0 +1,121 @@
+import pytest
+from unittest.mock import patch
+
+from async_siril import PressureMonitor, PressureThresholds
+from async_siril.pressure import CPU_PRESSURE_FILE, MEMORY_PRESSURE_FILE, PressureReading
+
+GB = 1024**3
+
+
+def psi(some_avg10, full_avg10=0.0):
+    return {
+        "some": {"avg10": some_avg10, "avg60": 0.0, "avg300": 0.0, "total": 0.0},
+        "full": {"avg10": full_avg10, "avg60": 0.0, "avg300": 0.0, "total": 0.0},
+    }
+
+
+@pytest.fixture
+def cgroup():
+    """Patch the cgroup files read by the monitor, values can be changed by the test"""
+    values = {
+        "memory_current": 2 * GB,
+        "memory_limit": 8 * GB,
+        MEMORY_PRESSURE_FILE: psi(0.0),
+        CPU_PRESSURE_FILE: psi(0.0),
+    }
+    with (
+        patch("async_siril.pressure.read_pressure", side_effect=lambda path: values[path]),
+        patch("async_siril.pressure.container_memory_current", side_effect=lambda: values["memory_current"]),
+        patch("async_siril.pressure.container_aware_memory_limit_bytes", side_effect=lambda: values["memory_limit"]),
+    ):
+        yield values
+
+
+class TestPressureReading:
+    def test_no_information_is_no_pressure(self):
+        reading = PressureReading()
+
+        assert reading.memory_usage is None
+        assert not reading.memory_pressure(PressureThresholds())
+        assert not reading.cpu_pressure(PressureThresholds())
+
+    @pytest.mark.parametrize(
+        "reading",
+        [
+            PressureReading(memory_some_avg10=12.0),
+            PressureReading(memory_full_avg10=2.5),
+            PressureReading(memory_current=95, memory_limit=100),
+        ],
+    )
+    def test_memory_pressure(self, reading):
+        assert reading.memory_pressure(PressureThresholds())
+
+    def test_memory_usage_without_limit(self):
+        assert PressureReading(memory_current=95, memory_limit=None).memory_usage is None
+
+    def test_cpu_pressure(self):
+        thresholds = PressureThresholds(cpu_some_avg10=30.0)
+
+        assert PressureReading(cpu_some_avg10=30.0).cpu_pressure(thresholds)
+        assert not PressureReading(cpu_some_avg10=29.9).cpu_pressure(thresholds)
+
+
+class TestPressureMonitor:
+    def test_reads_cgroup_files(self, cgroup):
+        cgroup[MEMORY_PRESSURE_FILE] = psi(3.5, 0.5)
+        cgroup[CPU_PRESSURE_FILE] = psi(60.0)
+
+        reading = PressureMonitor().refresh()
+
+        assert reading.memory_current == 2 * GB
+        assert reading.memory_limit == 8 * GB
+        assert reading.memory_usage == 0.25
+        assert reading.memory_some_avg10 == 3.5
+        assert reading.memory_full_avg10 == 0.5
+        assert reading.cpu_some_avg10 == 60.0
+
+    def test_pressure(self, cgroup):
+        monitor = PressureMonitor(interval=0)
+        assert not monitor.memory_pressure
+        assert not monitor.cpu_pressure
+
+        cgroup["memory_current"] = 7.5 * GB
+        cgroup[CPU_PRESSURE_FILE] = psi(75.0)
+
+        assert monitor.memory_pressure
+        assert monitor.cpu_pressure
+
+    def test_without_cgroup_v2(self, cgroup):
+        cgroup.update(
+            {"memory_current": None, "memory_limit": None, MEMORY_PRESSURE_FILE: None, CPU_PRESSURE_FILE: None}
+        )
+        monitor = PressureMonitor()
+
+        assert not monitor.memory_pressure
+        assert not monitor.cpu_pressure
+        assert monitor.metrics() == {"memory_pressure": 0.0, "cpu_pressure": 0.0}
+
+    def test_reads_at_most_once_per_interval(self, cgroup):
+        monitor = PressureMonitor(interval=60)
+        assert not monitor.memory_pressure
+
+        cgroup[MEMORY_PRESSURE_FILE] = psi(50.0)
+
+        assert not monitor.memory_pressure
+        monitor.refresh()
+        assert monitor.memory_pressure
+
+    def test_metrics(self, cgroup):
+        cgroup[MEMORY_PRESSURE_FILE] = psi(12.0, 1.0)
+        cgroup[CPU_PRESSURE_FILE] = psi(5.0)
+
+        assert PressureMonitor().metrics() == {
+            "memory_current_bytes": 2 * GB,
+            "memory_limit_bytes": 8 * GB,
+            "memory_usage_ratio": 0.25,
+            "memory_some_avg10": 12.0,
+            "memory_full_avg10": 1.0,
+            "cpu_some_avg10": 5.0,
+            "memory_pressure": 1.0,
+            "cpu_pressure": 0.0,
+        }
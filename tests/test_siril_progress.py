@@ -0,0 +1,105 @@
+import pytest
+from unittest.mock import patch
+
+from async_siril.progress import DurationHistory, ProgressTracker
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    fake = FakeClock()
+    with patch("async_siril.progress.time.monotonic", fake):
+        yield fake
+
+
+class TestDurationHistory:
+    def test_expected_is_the_median(self):
+        history = DurationHistory()
+        for duration in [10.0, 30.0, 12.0]:
+            history.record("stack lights rej 3 3", duration, frames=40)
+
+        assert history.expected("stack r_lights", frames=40) == 12.0
+        assert history.expected("stack lights", frames=80) is None
+        assert history.expected("register lights", frames=40) is None
+
+    def test_keeps_latest_durations(self):
+        history = DurationHistory(keep=3)
+        for duration in range(5):
+            history.record("register lights", float(duration))
+
+        assert history.entries == {"register:0": [2.0, 3.0, 4.0]}
+
+    def test_save_and_load(self, tmp_path):
+        path = tmp_path / "durations.json"
+        history = DurationHistory()
+        history.record("stack lights", 42.0, frames=10)
+
+        history.save(path)
+
+        assert DurationHistory.load(path).expected("stack lights", frames=10) == 42.0
+
+    def test_load_missing_or_invalid(self, tmp_path):
+        assert DurationHistory.load(tmp_path / "missing.json").entries == {}
+
+        invalid = tmp_path / "invalid.json"
+        invalid.write_text("{not json")
+        assert DurationHistory.load(invalid).entries == {}
+
+
+class TestProgressTracker:
+    def test_updates_are_coalesced(self, clock):
+        tracker = ProgressTracker("stack lights", interval=0.5)
+
+        assert tracker.update(1)
+        clock.now += 0.1
+        assert not tracker.update(2)
+        clock.now += 0.1
+        assert not tracker.update(3)
+        clock.now += 0.4
+        assert tracker.update(4)
+        assert tracker.progress == 4
+
+    def test_eta_from_progress_curve(self, clock):
+        tracker = ProgressTracker("stack lights")
+        clock.now += 20.0
+        tracker.update(25)
+
+        estimate = tracker.estimate()
+
+        assert estimate.elapsed == 20.0
+        assert estimate.rate == 1.25
+        assert estimate.eta == 60.0
+        assert estimate.expected_duration is None
+
+    def test_eta_from_history_before_any_progress(self, clock):
+        tracker = ProgressTracker("stack lights", expected=100.0)
+        clock.now += 30.0
+
+        assert tracker.estimate().eta == 70.0
+
+    def test_eta_blends_history_and_curve(self, clock):
+        tracker = ProgressTracker("stack lights", expected=100.0)
+        clock.now += 20.0
+        tracker.update(25)
+
+        # 25% of the curve (60s left) and 75% of the history (80s left)
+        assert tracker.estimate().eta == pytest.approx(75.0)
+
+    def test_overrun_history(self, clock):
+        tracker = ProgressTracker("stack lights", expected=10.0)
+        clock.now += 30.0
+
+        assert tracker.estimate().eta == 0.0
+
+    def test_no_estimate_without_information(self, clock):
+        estimate = ProgressTracker("stack lights").estimate()
+
+        assert estimate.progress == 0
+        assert estimate.eta is None
@@ -1,5 +1,6 @@
+import pytest
 from unittest.mock import patch
-from async_siril import SirilResource
+from async_siril import SirilResource, WorkerPlan
 
 
 class TestSirilResource:
@@ -196,3 +197,124 @@ class TestSirilResource:
         assert resource1.cpu_limit == resource2.cpu_limit
         assert resource1.memory_limit == resource2.memory_limit
         assert resource1 is not resource2
+
+    def test_threads(self):
+        assert SirilResource().threads is None
+        assert SirilResource(cpu_affinity=[0, 1, 2]).threads == 3
+        assert SirilResource(cpu_limit=2, cpu_affinity=[0, 1, 2]).threads == 2
+
+    def test_process_environment_inherits_by_default(self):
+        assert SirilResource().process_environment() is None
+
+    def test_process_environment_sizes_thread_pools(self):
+        with patch.dict("os.environ", {"HOME": "/home/astro", "OMP_NUM_THREADS": "64"}, clear=True):
+            environment = SirilResource(cpu_limit=4, environment={"MKL_NUM_THREADS": "1"}).process_environment()
+
+        assert environment == {
+            "HOME": "/home/astro",
+            "OMP_NUM_THREADS": "4",
+            "OPENBLAS_NUM_THREADS": "4",
+            "MKL_NUM_THREADS": "1",
+        }
+
+    @patch("async_siril.resources.set_process_scheduling")
+    def test_apply_scheduling(self, mock_set_scheduling):
+        SirilResource(cpu_affinity=[4, 5], nice=10, io_class=2, io_priority=7).apply_scheduling(1234)
+
+        mock_set_scheduling.assert_called_once_with(1234, cpu_affinity=[4, 5], nice=10, io_class=2, io_priority=7)
+
+    @patch("async_siril.resources.set_process_scheduling")
+    def test_apply_scheduling_nothing_to_do(self, mock_set_scheduling):
+        SirilResource(cpu_limit=4).apply_scheduling(1234)
+
+        mock_set_scheduling.assert_not_called()
+
+
+class TestWorkerPlan:
+    def test_plan_splits_cpus_and_memory(self):
+        plan = WorkerPlan.plan(cpus=8, memory_gb=16)
+
+        assert plan.workers == 4
+        assert [r.cpu_limit for r in plan.resources] == [2, 2, 2, 2]
+        assert [r.memory_limit for r in plan.resources] == ["3.60"] * 4
+
+    def test_plan_fractional_quota_does_not_oversubscribe(self):
+        plan = WorkerPlan.plan(cpus=2.5, memory_gb=16)
+
+        assert plan.workers == 1
+        assert plan.resources[0].cpu_limit == 2
+
+    def test_plan_spreads_remaining_threads(self):
+        plan = WorkerPlan.plan(cpus=7.5, memory_gb=64, cpus_per_worker=2)
+
+        assert plan.workers == 3
+        assert [r.cpu_limit for r in plan.resources] == [3, 2, 2]
+        assert sum(r.cpu_limit for r in plan.resources) <= 7.5
+
+    def test_plan_limited_by_memory(self):
+        plan = WorkerPlan.plan(cpus=16, memory_gb=5, memory_gb_per_worker=2)
+
+        assert plan.workers == 2
+        assert [r.cpu_limit for r in plan.resources] == [8, 8]
+        assert [r.memory_limit for r in plan.resources] == ["2.25", "2.25"]
+
+    def test_plan_max_workers(self):
+        plan = WorkerPlan.plan(cpus=32, memory_gb=128, max_workers=3)
+
+        assert plan.workers == 3
+        assert sum(r.cpu_limit for r in plan.resources) == 32
+
+    def test_plan_always_has_one_worker(self):
+        plan = WorkerPlan.plan(cpus=0.5, memory_gb=1)
+
+        assert plan.workers == 1
+        assert plan.resources[0].cpu_limit == 1
+        assert plan.resources[0].memory_limit == "0.90"
+
+    def test_plan_invalid_values(self):
+        with pytest.raises(ValueError):
+            WorkerPlan.plan(cpus=0, memory_gb=4)
+
+    @patch("async_siril.resources.total_memory", return_value=64 * 1024**3)
+    @patch("async_siril.resources.host_cpu_count", return_value=32)
+    @patch("async_siril.resources.container_aware_memory_limit_bytes", return_value=8 * 1024**3)
+    @patch("async_siril.resources.container_aware_cpu_quota", return_value=4.5)
+    def test_container_aware_plan(self, _quota, _memory, _cpus, _total):
+        plan = WorkerPlan.container_aware()
+
+        assert plan.cpus == 4.5
+        assert plan.memory_gb == 8
+        assert plan.workers == 2
+        assert [r.cpu_limit for r in plan.resources] == [2, 2]
+        assert [r.memory_limit for r in plan.resources] == ["3.60", "3.60"]
+
+    @patch("async_siril.resources.total_memory", return_value=16 * 1024**3)
+    @patch("async_siril.resources.host_cpu_count", return_value=6)
+    @patch("async_siril.resources.container_aware_memory_limit_bytes", return_value=None)
+    @patch("async_siril.resources.container_aware_cpu_quota", return_value=None)
+    def test_container_aware_plan_without_limits(self, _quota, _memory, _cpus, _total):
+        plan = WorkerPlan.container_aware(max_workers=2)
+
+        assert plan.cpus == 6
+        assert plan.memory_gb == 16
+        assert [r.cpu_limit for r in plan.resources] == [3, 3]
+
+    def test_pin_disjoint_cpus(self):
+        plan = WorkerPlan.plan(cpus=7.5, memory_gb=64, cpus_per_worker=2)
+
+        plan.pin(cpus=[0, 1, 2, 3, 4, 5, 6, 7])
+
+        assert [r.cpu_affinity for r in plan.resources] == [[0, 1, 2], [3, 4], [5, 6]]
+
+    def test_pin_wraps_around(self):
+        plan = WorkerPlan.plan(cpus=8, memory_gb=16)
+
+        plan.pin(cpus=[10, 11, 12])
+
+        assert [r.cpu_affinity for r in plan.resources] == [[10, 11], [10, 12], [11, 12], [10, 11]]
+
+    @patch("async_siril.resources.host_cpus", return_value=[0, 2, 4, 6])
+    def test_plan_pin_cpus(self, _cpus):
+        plan = WorkerPlan.plan(cpus=4, memory_gb=16, pin_cpus=True)
+
+        assert [r.cpu_affinity for r in plan.resources] == [[0, 2], [4, 6]]
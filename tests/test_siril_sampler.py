@@ -0,0 +1,104 @@
+import asyncio
+import os
+import psutil
+import pytest
+from unittest.mock import MagicMock, patch
+
+from async_siril.sampler import CommandUsage, ProcessSampler
+
+
+def fake_process(rss, threads, user, system, read_bytes=0, write_bytes=0, children=()):
+    process = MagicMock()
+    process.memory_info.return_value.rss = rss
+    process.num_threads.return_value = threads
+    process.cpu_times.return_value = MagicMock(user=user, system=system, children_user=0.0, children_system=0.0)
+    process.io_counters.return_value = MagicMock(read_bytes=read_bytes, write_bytes=write_bytes)
+    process.children.return_value = list(children)
+    return process
+
+
+class TestProcessSampler:
+    def test_measure_counts_the_difference(self):
+        before = fake_process(rss=100, threads=2, user=1.0, system=0.5, read_bytes=1000, write_bytes=10)
+        after = fake_process(rss=300, threads=8, user=4.0, system=1.5, read_bytes=6000, write_bytes=510)
+        sampler = ProcessSampler(1234)
+        sampler._process = before
+
+        with sampler.measure(["stack lights"]) as usage:
+            sampler._process = after
+
+        assert usage.commands == ["stack lights"]
+        assert usage.peak_rss == 300
+        assert usage.peak_threads == 8
+        assert usage.cpu_seconds == pytest.approx(4.0)
+        assert usage.read_bytes == 5000
+        assert usage.write_bytes == 500
+        assert len(usage.samples) == 1
+
+    def test_children_are_included(self):
+        child = fake_process(rss=500, threads=4, user=2.0, system=0.0)
+        sampler = ProcessSampler(1234)
+        sampler._process = fake_process(rss=100, threads=2, user=1.0, system=0.0, children=[child])
+
+        with sampler.measure(["starnet"]) as usage:
+            pass
+
+        assert usage.peak_rss == 600
+        assert usage.peak_threads == 6
+
+    def test_peak_is_kept_between_samples(self):
+        sampler = ProcessSampler(1234)
+        sampler._process = fake_process(rss=100, threads=1, user=0.0, system=0.0)
+
+        with sampler.measure(["register lights"]) as usage:
+            sampler._process = fake_process(rss=900, threads=1, user=1.0, system=0.0)
+            sampler._sample()
+            sampler._process = fake_process(rss=200, threads=1, user=2.0, system=0.0)
+
+        assert [sample.rss for sample in usage.samples] == [900, 200]
+        assert usage.peak_rss == 900
+        assert usage.cpu_seconds == pytest.approx(2.0)
+
+    def test_process_gone(self):
+        sampler = ProcessSampler(1234)
+        sampler._process = fake_process(rss=100, threads=1, user=1.0, system=0.0)
+
+        with sampler.measure(["stack lights"]) as usage:
+            sampler._process.children.side_effect = psutil.NoSuchProcess(1234)
+
+        assert usage.samples == []
+        assert usage == CommandUsage(commands=["stack lights"])
+
+    def test_not_sampling_between_commands(self):
+        sampler = ProcessSampler(1234)
+        sampler._process = fake_process(rss=100, threads=1, user=1.0, system=0.0)
+
+        sampler._sample()
+
+        sampler._process.memory_info.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_samples_in_the_background(self):
+        sampler = ProcessSampler(os.getpid(), interval=0.01)
+        sampler.start()
+
+        with sampler.measure(["stack lights"]) as usage:
+            await asyncio.sleep(0.1)
+
+        await sampler.stop()
+        assert len(usage.samples) > 2
+        assert usage.peak_rss > 0
+        assert usage.peak_threads >= 1
+        assert [sample.elapsed for sample in usage.samples] == sorted(sample.elapsed for sample in usage.samples)
+
+    @pytest.mark.asyncio
+    async def test_start_missing_process(self):
+        with patch("async_siril.sampler.psutil.Process", side_effect=psutil.NoSuchProcess(1234)):
+            sampler = ProcessSampler(1234)
+            sampler.start()
+
+        with sampler.measure(["stack lights"]) as usage:
+            pass
+
+        await sampler.stop()
+        assert usage.samples == []
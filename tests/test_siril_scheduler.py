@@ -0,0 +1,130 @@
+import pytest
+import asyncio
+
+from async_siril import Priority
+from async_siril.scheduler import CommandScheduler
+
+
+class TestCommandScheduler:
+    @pytest.mark.asyncio
+    async def test_free_slot_is_acquired_immediately(self):
+        scheduler = CommandScheduler()
+
+        async with scheduler.slot() as queue_wait:
+            assert scheduler.busy
+            assert queue_wait < 0.1
+
+        assert not scheduler.busy
+        assert scheduler.waiting == 0
+
+    @pytest.mark.asyncio
+    async def test_callers_are_serialized_in_fifo_order(self):
+        scheduler = CommandScheduler()
+        order = []
+
+        async def caller(name: str):
+            async with scheduler.slot():
+                order.append(f"start {name}")
+                await asyncio.sleep(0)
+                order.append(f"end {name}")
+
+        await asyncio.gather(*(caller(name) for name in ["a", "b", "c"]))
+
+        assert order == ["start a", "end a", "start b", "end b", "start c", "end c"]
+
+    @pytest.mark.asyncio
+    async def test_priority_jumps_ahead_of_waiting_callers(self):
+        scheduler = CommandScheduler()
+        order = []
+        release = asyncio.Event()
+
+        async def holder():
+            async with scheduler.slot():
+                await release.wait()
+
+        async def caller(name: str, priority: Priority):
+            async with scheduler.slot(priority):
+                order.append(name)
+
+        task = asyncio.create_task(holder())
+        await asyncio.sleep(0)
+        callers = [
+            asyncio.create_task(caller("stack 1", Priority.BACKGROUND)),
+            asyncio.create_task(caller("stack 2", Priority.BACKGROUND)),
+            asyncio.create_task(caller("normal", Priority.NORMAL)),
+            asyncio.create_task(caller("preview", Priority.INTERACTIVE)),
+        ]
+        await asyncio.sleep(0)
+        assert scheduler.waiting == 4
+
+        release.set()
+        await asyncio.gather(task, *callers)
+
+        assert order == ["preview", "normal", "stack 1", "stack 2"]
+
+    @pytest.mark.asyncio
+    async def test_queue_wait_is_recorded(self):
+        scheduler = CommandScheduler()
+        waits = []
+
+        async def caller(hold: float):
+            async with scheduler.slot() as queue_wait:
+                waits.append(queue_wait)
+                await asyncio.sleep(hold)
+
+        await asyncio.gather(caller(0.05), caller(0))
+
+        assert waits[0] < 0.05
+        assert waits[1] >= 0.04
+
+    @pytest.mark.asyncio
+    async def test_slot_is_reentrant_for_the_holder(self):
+        scheduler = CommandScheduler()
+
+        async with scheduler.slot():
+            async with asyncio.timeout(1.0):
+                async with scheduler.slot() as queue_wait:
+                    assert queue_wait == 0.0
+            assert scheduler.busy
+
+        assert not scheduler.busy
+
+    @pytest.mark.asyncio
+    async def test_cancelled_waiter_is_skipped(self):
+        scheduler = CommandScheduler()
+        release = asyncio.Event()
+        order = []
+
+        async def holder():
+            async with scheduler.slot():
+                await release.wait()
+
+        async def caller(name: str):
+            async with scheduler.slot():
+                order.append(name)
+
+        task = asyncio.create_task(holder())
+        await asyncio.sleep(0)
+        cancelled = asyncio.create_task(caller("cancelled"))
+        waiting = asyncio.create_task(caller("waiting"))
+        await asyncio.sleep(0)
+
+        cancelled.cancel()
+        await asyncio.sleep(0)
+        assert scheduler.waiting == 1
+
+        release.set()
+        await asyncio.gather(task, waiting)
+
+        assert order == ["waiting"]
+        assert not scheduler.busy
+
+    @pytest.mark.asyncio
+    async def test_slot_released_on_error(self):
+        scheduler = CommandScheduler()
+
+        with pytest.raises(RuntimeError):
+            async with scheduler.slot():
+                raise RuntimeError("boom")
+
+        assert not scheduler.busy
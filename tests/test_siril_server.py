@@ -0,0 +1,294 @@
+import pytest
+import asyncio
+import json
+import os
+import shutil
+import sys
+import tempfile
+from unittest.mock import Mock, AsyncMock, patch
+
+from async_siril import Priority, SirilClient, SirilError, SirilPool
+from async_siril.server import SirilServer, default_socket_path, encode_message
+from async_siril.siril import CommandResult, SirilTimeoutError
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="unix sockets are not available on windows")
+
+
+def make_worker():
+    worker = Mock()
+    worker.start = AsyncMock()
+    worker.stop = AsyncMock()
+    worker.command = AsyncMock(side_effect=lambda commands, **_kwargs: CommandResult(commands=commands, duration=0.5))
+    worker.in_flight = []
+    return worker
+
+
+@pytest.fixture
+def socket_path():
+    # Unix socket paths have a short length limit so avoid the deep pytest tmp_path
+    directory = tempfile.mkdtemp(prefix="siril_test_")
+    yield os.path.join(directory, "siril.sock")
+    shutil.rmtree(directory, ignore_errors=True)
+
+
+@pytest.fixture
+def mock_siril_cli():
+    with patch("async_siril.pool.SirilCli") as mock_cli:
+        mock_cli.side_effect = lambda **_kwargs: make_worker()
+        yield mock_cli
+
+
+@pytest.fixture
+async def server(mock_siril_cli, socket_path):
+    async with SirilServer(SirilPool(size=2), socket_path) as server:
+        yield server
+
+
+class TestDefaultSocketPath:
+    def test_default_socket_path_is_per_user(self):
+        path = default_socket_path()
+
+        assert path.startswith(tempfile.gettempdir())
+        assert path.endswith(f"async_siril_{os.getuid()}.sock")
+
+
+class TestSirilServer:
+    @pytest.mark.asyncio
+    async def test_server_start_and_stop(self, mock_siril_cli, socket_path):
+        pool = SirilPool(size=1)
+        server = SirilServer(pool, socket_path)
+
+        await server.start()
+        assert os.path.exists(socket_path)
+        assert oct(os.stat(socket_path).st_mode & 0o777) == oct(0o600)
+        assert len(pool.workers) == 1
+
+        await server.stop()
+        assert not os.path.exists(socket_path)
+        assert pool.workers == []
+
+    @pytest.mark.asyncio
+    async def test_server_replaces_stale_socket(self, mock_siril_cli, socket_path):
+        open(socket_path, "w").close()
+
+        async with SirilServer(SirilPool(size=1), socket_path):
+            assert os.path.exists(socket_path)
+
+    @pytest.mark.asyncio
+    async def test_server_refuses_running_socket(self, mock_siril_cli, socket_path):
+        async with SirilServer(SirilPool(size=1), socket_path):
+            pool = SirilPool(size=1)
+            second = SirilServer(pool, socket_path)
+            with pytest.raises(RuntimeError, match="already running"):
+                await second.start()
+            assert pool.workers == []
+
+            # Stopping the server that failed to start leaves the running server's socket
+            await second.stop()
+            assert os.path.exists(socket_path)
+            async with SirilClient(socket_path) as siril:
+                await siril.command("setext fits")
+
+    @pytest.mark.asyncio
+    async def test_server_keeps_replaced_socket(self, mock_siril_cli, socket_path):
+        first = SirilServer(SirilPool(size=1), socket_path)
+        await first.start()
+        os.unlink(socket_path)
+
+        async with SirilServer(SirilPool(size=1), socket_path):
+            await first.stop()
+            assert os.path.exists(socket_path)
+
+    @pytest.mark.asyncio
+    async def test_serve_forever_not_started(self, socket_path):
+        with pytest.raises(RuntimeError, match="Server not started"):
+            await SirilServer(SirilPool(size=1), socket_path).serve_forever()
+
+    @pytest.mark.asyncio
+    async def test_invalid_request(self, server, socket_path):
+        reader, writer = await asyncio.open_unix_connection(socket_path)
+        writer.write(b"not json\n")
+        await writer.drain()
+
+        response = json.loads(await reader.readline())
+        assert response["ok"] is False
+        assert "invalid request" in response["error"]["message"]
+        writer.close()
+
+    @pytest.mark.asyncio
+    async def test_raw_protocol(self, server, socket_path):
+        reader, writer = await asyncio.open_unix_connection(socket_path)
+        writer.write(encode_message({"id": 7, "command": ["setext fits", "convert bias"], "pipelined": True}))
+        await writer.drain()
+
+        assert json.loads(await reader.readline()) == {
+            "id": 7,
+            "ok": True,
+            "result": {
+                "commands": ["setext fits", "convert bias"],
+                "priority": Priority.NORMAL,
+                "queue_wait": 0.0,
+                "memory_wait": 0.0,
+                "duration": 0.5,
+                "usage": [],
+            },
+        }
+        writer.close()
+
+
+class TestSirilClient:
+    @pytest.mark.asyncio
+    async def test_client_not_connected(self, socket_path):
+        with pytest.raises(RuntimeError, match="Client not connected"):
+            await SirilClient(socket_path).command("setext fits")
+
+    @pytest.mark.asyncio
+    async def test_client_commands_run_on_one_worker(self, server, socket_path):
+        async with SirilClient(socket_path) as siril:
+            await siril.command("setext fits")
+            await siril.command(["convert bias", "stack bias"], pipelined=True)
+
+        busy = [worker for worker in server._pool.workers if worker.command.called]
+        assert len(busy) == 1
+        assert busy[0].command.call_args_list[0].args[0] == ["setext fits"]
+        assert busy[0].command.call_args_list[1].args[0] == ["convert bias", "stack bias"]
+        assert busy[0].command.call_args_list[1].kwargs == {"pipelined": True}
+
+    @pytest.mark.asyncio
+    async def test_client_returns_command_result(self, server, socket_path):
+        async with SirilClient(socket_path) as siril:
+            result = await siril.command("stack bias", timeout=30.0, priority=Priority.BACKGROUND)
+
+        assert result.commands == ["stack bias"]
+        assert result.duration == 0.5
+        busy = [worker for worker in server._pool.workers if worker.command.called]
+        assert busy[0].command.call_args.kwargs == {
+            "pipelined": False,
+            "timeout": 30.0,
+            "priority": Priority.BACKGROUND,
+        }
+
+    @pytest.mark.asyncio
+    async def test_client_raises_siril_error(self, server, socket_path):
+        for worker in server._pool.workers:
+            worker.command = AsyncMock(side_effect=SirilError("stack bias", "no sequence"))
+
+        async with SirilClient(socket_path) as siril:
+            with pytest.raises(SirilError) as exc_info:
+                await siril.command("stack bias")
+
+        assert exc_info.value.command == "stack bias"  # type: ignore
+        assert exc_info.value.message == "no sequence"  # type: ignore
+
+    @pytest.mark.asyncio
+    async def test_client_failable_command(self, server, socket_path):
+        for worker in server._pool.workers:
+            worker.command = AsyncMock(side_effect=SirilError("stack bias", "no sequence"))
+
+        async with SirilClient(socket_path) as siril:
+            assert await siril.failable_command("stack bias") is False
+
+    @pytest.mark.asyncio
+    async def test_invalid_option_keeps_connection(self, server, socket_path):
+        reader, writer = await asyncio.open_unix_connection(socket_path)
+        writer.write(encode_message({"id": 3, "command": "stack bias", "timeout": "x"}))
+        writer.write(encode_message({"id": 4, "command": "stack bias"}))
+        await writer.drain()
+
+        response = json.loads(await reader.readline())
+        assert response["id"] == 3
+        assert response["ok"] is False
+        assert "invalid request" in response["error"]["message"]
+        assert json.loads(await reader.readline())["ok"] is True
+        writer.close()
+
+    @pytest.mark.asyncio
+    async def test_pool_errors_are_reported(self, server, socket_path):
+        with patch.object(server._pool, "acquire", AsyncMock(side_effect=RuntimeError("No Siril worker left"))):
+            async with SirilClient(socket_path) as siril:
+                with pytest.raises(SirilError, match="No Siril worker left"):
+                    await siril.command("stack bias")
+
+    @pytest.mark.asyncio
+    async def test_lost_worker_is_replaced(self, server, socket_path):
+        def timeout_once(worker):
+            async def command(commands, **_kwargs):
+                if commands != ["stack bias"]:
+                    return CommandResult(commands=commands)
+                # Killed by the deadline
+                worker.running = False
+                raise SirilTimeoutError(commands[0], 60.0)
+
+            return command
+
+        original = list(server._pool.workers)
+        for worker in original:
+            worker.command = AsyncMock(side_effect=timeout_once(worker))
+
+        async with SirilClient(socket_path) as siril:
+            with pytest.raises(SirilError, match="timed out"):
+                await siril.command("stack bias")
+            # The timed out worker went back to the pool, the next request runs on another one
+            result = await siril.command("stack flats")
+
+        timed_out = [worker for worker in original if worker.running is False]
+        assert len(timed_out) == 1
+        assert timed_out[0].command.call_count == 1
+        timed_out[0].stop.assert_called_once()
+        assert timed_out[0] not in server._pool.workers
+        assert result.commands == ["stack flats"]
+
+    @pytest.mark.asyncio
+    async def test_worker_released_on_disconnect(self, server, socket_path):
+        async with SirilClient(socket_path) as siril:
+            await siril.command("setext fits")
+            assert server._pool.available == 1
+
+        await asyncio.sleep(0.01)
+        assert server._pool.available == 2
+
+    @pytest.mark.asyncio
+    async def test_exit_ends_session_without_stopping_worker(self, server, socket_path):
+        siril = SirilClient(socket_path)
+        await siril.start()
+        await siril.command(["setext fits", "exit"])
+        await asyncio.sleep(0.01)
+
+        worker = next(worker for worker in server._pool.workers if worker.command.called)
+        worker.command.assert_called_once_with(["setext fits"], pipelined=False)
+        worker.stop.assert_not_called()
+        assert server._pool.available == 2
+        await siril.stop()
+
+    @pytest.mark.asyncio
+    async def test_client_exit_command_disconnects(self, server, socket_path):
+        siril = SirilClient(socket_path)
+        await siril.start()
+        await siril.command("exit")
+
+        with pytest.raises(RuntimeError, match="Client not connected"):
+            await siril.command("setext fits")
+
+    @pytest.mark.asyncio
+    async def test_clients_run_in_parallel(self, server, socket_path):
+        gate = asyncio.Event()
+        started = []
+
+        async def slow_command(commands, pipelined=False):
+            started.append(commands)
+            await gate.wait()
+            return CommandResult(commands=commands)
+
+        for worker in server._pool.workers:
+            worker.command = AsyncMock(side_effect=slow_command)
+
+        async def run(name):
+            async with SirilClient(socket_path) as siril:
+                await siril.command(f"stack {name}")
+
+        tasks = [asyncio.create_task(run(name)) for name in ["red", "green"]]
+        await asyncio.sleep(0.05)
+        assert sorted(started) == [["stack green"], ["stack red"]]
+
+        gate.set()
+        await asyncio.wait_for(asyncio.gather(*tasks), timeout=1.0)
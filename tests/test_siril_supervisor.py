@@ -0,0 +1,113 @@
+import pytest
+from pathlib import Path
+
+from async_siril import RestartPolicy
+from async_siril.command import cd, set as siril_set, setcompress, setext
+from async_siril.command_types import SirilSetting, compression_type, fits_extension
+from async_siril.supervisor import SessionState
+
+
+class TestRestartPolicy:
+    def test_defaults(self):
+        policy = RestartPolicy()
+
+        assert policy.max_restarts == 3
+        assert policy.retry_command is True
+
+    def test_delay_backs_off_exponentially(self):
+        policy = RestartPolicy(backoff=0.5, max_backoff=3.0)
+
+        assert [policy.delay(attempt) for attempt in range(1, 6)] == [0.5, 1.0, 2.0, 3.0, 3.0]
+
+    def test_no_backoff(self):
+        assert RestartPolicy(backoff=0).delay(4) == 0
+
+
+class TestSessionState:
+    def test_empty_state_replays_nothing(self):
+        assert SessionState().replay_commands() == []
+
+    def test_untracked_commands_are_ignored(self):
+        state = SessionState()
+
+        state.track("stack lights rej 3 3")
+        state.track("convert bias")
+        state.track("setcpu 4")
+
+        assert state.replay_commands() == []
+
+    def test_cd_absolute_and_relative(self):
+        state = SessionState(directory=Path("/data/night"))
+
+        state.track(str(cd("lights")))
+        assert state.directory == Path("/data/night/lights")
+
+        state.track("cd ../darks")
+        assert state.directory == Path("/data/night/darks")
+
+        state.track(str(cd(Path("/other/with space"))))
+        assert state.directory == Path("/other/with space")
+        assert state.replay_commands() == ["cd '/other/with space'"]
+
+    def test_cd_expands_home(self):
+        state = SessionState(directory=Path("/data"))
+
+        state.track("cd ~/astro")
+
+        assert state.directory == Path.home() / "astro"
+
+    def test_settings_keep_latest_value(self):
+        state = SessionState()
+
+        state.track(str(setext(fits_extension.FITS_EXT_FIT)))
+        state.track("set32bits")
+        state.track(str(siril_set(key=SirilSetting.EXTENSION, value=".fit")))
+        state.track(str(setcompress(True, compression_type.COMPRESSION_RICE, 16)))
+        state.track("set16bits")
+        state.track("setext fits")
+        state.track(str(siril_set(key=SirilSetting.EXTENSION, value=".fits")))
+        state.track("setcompress 0")
+
+        assert state.replay_commands() == [
+            "setext fits",
+            "set16bits",
+            "setcompress 0",
+            "set core.extension=.fits",
+        ]
+
+    def test_set_values_with_spaces_and_import(self):
+        state = SessionState()
+
+        state.track("set 'core.wd=/data/my night'")
+        state.track("set -import=settings.ini")
+
+        assert state.settings == {
+            "core.wd": "set 'core.wd=/data/my night'",
+            "-import=settings.ini": "set -import=settings.ini",
+        }
+
+    def test_replay_order(self):
+        state = SessionState(directory=Path("/data"))
+
+        state.track("set core.mem_ratio=0.5")
+        state.track("setext fit")
+        state.track("set32bits")
+
+        assert state.replay_commands() == ["cd '/data'", "setext fit", "set32bits", "set core.mem_ratio=0.5"]
+
+    def test_malformed_command_is_ignored(self):
+        state = SessionState()
+
+        state.track("cd 'unterminated")
+        state.track("setext")
+
+        assert state.replay_commands() == []
+
+
+@pytest.mark.parametrize("command", ["set32bits", "set16bits"])
+def test_bit_depth(command):
+    state = SessionState()
+
+    state.track(command)
+
+    assert state.bit_depth == command
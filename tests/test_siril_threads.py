@@ -0,0 +1,189 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock, Mock, patch
+
+from async_siril import ThreadPolicy, ThreadTable
+from async_siril.siril import CommandResult
+from async_siril.threads import CommandClass, autotune, classify
+
+
+class TestClassify:
+    @pytest.mark.parametrize(
+        "command, expected",
+        [
+            ("stack lights rej 3 3", CommandClass.COMPUTE),
+            ("register pp_lights -2pass", CommandClass.COMPUTE),
+            ("denoise -mod=0.5", CommandClass.COMPUTE),
+            ("convert bias -out=../process", CommandClass.IO),
+            ("savetif result", CommandClass.IO),
+            ("setext fit", CommandClass.LIGHT),
+            ("cd lights", CommandClass.LIGHT),
+            ("", CommandClass.LIGHT),
+        ],
+    )
+    def test_classify(self, command, expected):
+        assert classify(command) == expected
+
+
+class TestThreadTable:
+    def test_record_picks_where_scaling_stops(self):
+        table = ThreadTable()
+
+        threads = table.record("stack", {1: 40.0, 2: 21.0, 4: 14.0, 8: 11.5, 16: 11.0})
+
+        assert threads == 8
+        assert table.best_threads("stack") == 8
+        assert table.entries["stack"]["durations"]["16"] == 11.0
+
+    def test_record_io_bound(self):
+        table = ThreadTable()
+
+        assert table.record("convert", {1: 10.0, 2: 9.8, 4: 9.9}, efficiency=0.95) == 1
+
+    def test_unknown_command(self):
+        assert ThreadTable().best_threads("stack") is None
+
+    def test_save_and_load(self, tmp_path):
+        path = tmp_path / "tables" / ThreadTable.FILE_NAME
+        table = ThreadTable()
+        table.record("register", {1: 8.0, 4: 2.0})
+
+        table.save(path)
+        loaded = ThreadTable.load(path)
+
+        assert loaded.best_threads("register") == 4
+        assert loaded.entries == table.entries
+
+    def test_load_missing_or_invalid(self, tmp_path):
+        assert ThreadTable.load(tmp_path / "missing.json").entries == {}
+
+        invalid = tmp_path / "invalid.json"
+        invalid.write_text("{not json")
+        assert ThreadTable.load(invalid).entries == {}
+
+    def test_default_path_in_cache_directory(self, tmp_path):
+        with patch("async_siril.threads.default_cache_directory", return_value=tmp_path):
+            assert ThreadTable.default_path() == tmp_path / ThreadTable.FILE_NAME
+
+
+class TestThreadPolicy:
+    def test_default_total_uses_container_limit(self):
+        with patch("async_siril.threads.container_aware_cpu_limit", return_value=3):
+            assert ThreadPolicy().total_threads == 3
+
+        with (
+            patch("async_siril.threads.container_aware_cpu_limit", return_value=None),
+            patch("async_siril.threads.host_cpu_count", return_value=12),
+        ):
+            assert ThreadPolicy().total_threads == 12
+
+    def test_threads_per_command_class(self):
+        policy = ThreadPolicy(total_threads=8, io_threads=2)
+
+        assert policy.threads_for(["stack lights"]) == 8
+        assert policy.threads_for(["convert lights"]) == 2
+        assert policy.threads_for(["setext fit"]) is None
+        # A batch uses its heaviest command
+        assert policy.threads_for(["cd lights", "convert lights", "register lights"]) == 8
+
+    def test_tuned_threads(self):
+        table = ThreadTable()
+        table.record("register", {1: 8.0, 2: 4.0, 4: 3.9, 8: 3.9})
+        policy = ThreadPolicy(total_threads=8, table=table)
+
+        assert policy.threads_for(["register lights"]) == 2
+        assert policy.threads_for(["stack lights"]) == 8
+
+    def test_lease_tracks_allocation(self):
+        policy = ThreadPolicy(total_threads=8)
+
+        with policy.lease(["stack lights"]) as threads:
+            assert threads == 8
+            assert policy.allocated == 8
+            assert policy.running == 1
+
+        assert policy.allocated == 0
+        assert policy.running == 0
+
+    def test_light_lease_holds_nothing(self):
+        policy = ThreadPolicy(total_threads=8)
+
+        with policy.lease(["set32bits"]) as threads:
+            assert threads is None
+            assert policy.running == 0
+
+    def test_rebalances_between_concurrent_commands(self):
+        policy = ThreadPolicy(total_threads=8)
+
+        first = policy.lease(["stack red"])
+        assert first.__enter__() == 8
+        # Everything is taken, the next command still gets a thread
+        second = policy.lease(["stack green"])
+        assert second.__enter__() == 1
+
+        # The first worker moves to its next command and gets an equal share
+        first.__exit__(None, None, None)
+        third = policy.lease(["stack blue"])
+        assert third.__enter__() == 4
+        second.__exit__(None, None, None)
+        fourth = policy.lease(["register green"])
+        assert fourth.__enter__() == 4
+
+        assert policy.allocated == 8
+
+    def test_never_oversubscribes_with_many_workers(self):
+        policy = ThreadPolicy(total_threads=6)
+        leases = [policy.lease(["stack lights"]) for _ in range(3)]
+        granted = [lease.__enter__() for lease in leases]
+
+        assert granted == [6, 1, 1]
+        leases[0].__exit__(None, None, None)
+        assert policy.threads_for(["stack lights"]) == 2
+
+    def test_cpu_pressure_halves_threads(self):
+        pressure = Mock(cpu_pressure=True)
+        policy = ThreadPolicy(total_threads=8, io_threads=1, pressure=pressure)
+
+        assert policy.threads_for(["stack lights"]) == 4
+        assert policy.threads_for(["convert lights"]) == 1
+
+        pressure.cpu_pressure = False
+        assert policy.threads_for(["stack lights"]) == 8
+
+
+@pytest.mark.asyncio
+async def test_autotune_records_table():
+    durations = {1: 10.0, 2: 5.5, 4: 3.0}
+    siril = MagicMock()
+    current = {}
+
+    async def command(cmd):
+        if str(cmd).startswith("setcpu"):
+            current["threads"] = int(str(cmd).split(" ")[1])
+            return CommandResult(commands=[str(cmd)])
+        return CommandResult(commands=[cmd], duration=durations[current["threads"]])
+
+    siril.command = AsyncMock(side_effect=command)
+
+    table = await autotune(siril, {"stack": "stack bench rej 3 3"}, thread_counts=[1, 2, 4])
+
+    assert table.best_threads("stack") == 4
+    assert [str(c.args[0]) for c in siril.command.call_args_list] == [
+        "setcpu 1",
+        "stack bench rej 3 3",
+        "setcpu 2",
+        "stack bench rej 3 3",
+        "setcpu 4",
+        "stack bench rej 3 3",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_autotune_default_thread_counts():
+    siril = MagicMock()
+    siril.command = AsyncMock(return_value=CommandResult(commands=[], duration=1.0))
+
+    with patch("async_siril.threads.container_aware_cpu_limit", return_value=6):
+        table = await autotune(siril, {"convert": ["convert bench"]})
+
+    assert list(table.entries["convert"]["durations"]) == ["1", "2", "4", "6"]
+    assert table.best_threads("convert") == 1
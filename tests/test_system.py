@@ -1,5 +1,6 @@
 import pytest
 import os
+import psutil
 import tempfile
 from unittest.mock import patch, mock_open, MagicMock
 
@@ -10,9 +11,16 @@ from async_siril.system import (
     process_info,
     container_aware_memory_limit_gb,
     container_aware_cpu_limit,
+    container_aware_cpu_quota,
+    container_aware_memory_limit_bytes,
     read_int,
+    read_pressure,
+    container_memory_current,
+    set_process_scheduling,
 )
 
+CGROUP1_CPU_FILES = ["/sys/fs/cgroup/cpu/cpu.cfs_quota_us", "/sys/fs/cgroup/cpu/cpu.cfs_period_us"]
+
 
 class TestHumanReadableByteSize:
     def test_bytes(self):
@@ -177,6 +185,15 @@ class TestContainerAwareMemoryLimitGb:
         result = container_aware_memory_limit_gb()
         assert result is None
 
+    @patch("async_siril.system.read_int")
+    def test_memory_limit_cgroup1_unlimited(self, mock_read_int):
+        # cgroup v1 reports no limit as a value close to the max int64
+        mock_read_int.side_effect = [9223372036854771712, None, None, None, None, None, 3221225472]
+
+        assert container_aware_memory_limit_bytes() == 3221225472
+        mock_read_int.side_effect = [9223372036854771712, None, None, None, None, None, None]
+        assert container_aware_memory_limit_gb() is None
+
 
 class TestContainerAwareCpuLimit:
     @patch("async_siril.system.os.path.exists")
@@ -241,3 +258,156 @@ class TestContainerAwareCpuLimit:
         with patch("builtins.open", side_effect=OSError("File read error")):
             with pytest.raises(OSError):
                 container_aware_cpu_limit()
+
+    @patch("async_siril.system.os.path.exists")
+    def test_cgroup2_fractional_cpu_limit(self, mock_exists):
+        mock_exists.side_effect = lambda path: path == "/sys/fs/cgroup/cpu.max"
+
+        with patch("builtins.open", mock_open(read_data="250000 100000\n")):
+            assert container_aware_cpu_quota() == 2.5
+            assert container_aware_cpu_limit() == 2
+
+    @patch("async_siril.system.os.path.exists")
+    def test_cpu_limit_below_one_cpu(self, mock_exists):
+        mock_exists.side_effect = lambda path: path == "/sys/fs/cgroup/cpu.max"
+
+        with patch("builtins.open", mock_open(read_data="50000 100000\n")):
+            assert container_aware_cpu_quota() == 0.5
+            assert container_aware_cpu_limit() == 1
+
+    @patch("async_siril.system.os.path.exists")
+    def test_cgroup2_cpu_limit_max(self, mock_exists):
+        mock_exists.side_effect = lambda path: path == "/sys/fs/cgroup/cpu.max"
+
+        with patch("builtins.open", mock_open(read_data="max 100000\n")):
+            assert container_aware_cpu_quota() is None
+            assert container_aware_cpu_limit() is None
+
+    @patch("async_siril.system.os.path.exists")
+    @patch("async_siril.system.read_int")
+    def test_cgroup1_cpu_limit_unlimited(self, mock_read_int, mock_exists):
+        mock_exists.side_effect = lambda path: path in CGROUP1_CPU_FILES
+        mock_read_int.side_effect = [-1, 100000]
+
+        assert container_aware_cpu_quota() is None
+
+    @patch("async_siril.system.os.path.exists")
+    @patch("async_siril.system.read_int")
+    def test_cgroup1_fractional_cpu_limit(self, mock_read_int, mock_exists):
+        mock_exists.side_effect = lambda path: path in CGROUP1_CPU_FILES
+        mock_read_int.side_effect = [150000, 100000]
+
+        assert container_aware_cpu_quota() == 1.5
+
+
+class TestSetProcessScheduling:
+    @patch("async_siril.system.psutil.Process")
+    def test_applies_to_every_thread(self, mock_process_class):
+        threads = {tid: MagicMock() for tid in (100, 101, 102)}
+        parent = MagicMock()
+        parent.threads.return_value = [MagicMock(id=tid) for tid in threads]
+        mock_process_class.side_effect = {99: parent, **threads}.__getitem__
+
+        set_process_scheduling(99, cpu_affinity=[2, 3], nice=10, io_class=3)
+
+        for thread in threads.values():
+            thread.cpu_affinity.assert_called_once_with([2, 3])
+            thread.nice.assert_called_once_with(10)
+            thread.ionice.assert_called_once_with(3, None)
+
+    @patch("async_siril.system.psutil.Process")
+    def test_only_given_settings_are_changed(self, mock_process_class):
+        process = MagicMock()
+        process.threads.return_value = [MagicMock(id=100)]
+        mock_process_class.return_value = process
+
+        set_process_scheduling(100, nice=5)
+
+        process.nice.assert_called_once_with(5)
+        process.cpu_affinity.assert_not_called()
+        process.ionice.assert_not_called()
+
+    @patch("async_siril.system.logger")
+    @patch("async_siril.system.psutil.Process")
+    def test_permission_errors_are_logged(self, mock_process_class, mock_logger):
+        process = MagicMock()
+        process.threads.return_value = [MagicMock(id=100)]
+        process.nice.side_effect = psutil.AccessDenied(100)
+        mock_process_class.return_value = process
+
+        set_process_scheduling(100, nice=-5)
+
+        mock_logger.warning.assert_called_once()
+        assert "Could not set the nice level of process 100" in mock_logger.warning.call_args.args[0]
+
+    @patch("async_siril.system.psutil.Process")
+    def test_failed_setting_does_not_skip_the_others(self, mock_process_class):
+        threads = {tid: MagicMock() for tid in (100, 101)}
+        for thread in threads.values():
+            thread.nice.side_effect = psutil.AccessDenied(100)
+        parent = MagicMock()
+        parent.threads.return_value = [MagicMock(id=tid) for tid in threads]
+        mock_process_class.side_effect = {99: parent, **threads}.__getitem__
+
+        set_process_scheduling(99, cpu_affinity=[2, 3], nice=-5, io_class=3)
+
+        for thread in threads.values():
+            thread.cpu_affinity.assert_called_once_with([2, 3])
+            thread.nice.assert_called_once_with(-5)
+            thread.ionice.assert_called_once_with(3, None)
+
+    @patch("async_siril.system.psutil.Process")
+    def test_exited_thread_is_skipped(self, mock_process_class):
+        thread = MagicMock()
+        parent = MagicMock()
+        parent.threads.return_value = [MagicMock(id=100), MagicMock(id=101)]
+
+        def process(tid):
+            if tid == 100:
+                raise psutil.NoSuchProcess(100)
+            return {99: parent, 101: thread}[tid]
+
+        mock_process_class.side_effect = process
+
+        set_process_scheduling(99, nice=10)
+
+        thread.nice.assert_called_once_with(10)
+
+    def test_current_process(self):
+        nice = os.nice(0)
+        set_process_scheduling(os.getpid(), nice=nice)
+
+        assert os.nice(0) == nice
+        assert psutil.Process().nice() == nice
+
+
+class TestPressure:
+    def test_read_pressure(self, tmp_path):
+        pressure_file = tmp_path / "memory.pressure"
+        pressure_file.write_text(
+            "some avg10=1.50 avg60=0.80 avg300=0.20 total=123456\nfull avg10=0.25 avg60=0.00 avg300=0.00 total=789\n"
+        )
+
+        assert read_pressure(pressure_file) == {
+            "some": {"avg10": 1.5, "avg60": 0.8, "avg300": 0.2, "total": 123456},
+            "full": {"avg10": 0.25, "avg60": 0.0, "avg300": 0.0, "total": 789},
+        }
+
+    def test_read_pressure_missing(self, tmp_path):
+        assert read_pressure(tmp_path / "cpu.pressure") is None
+
+    @patch("async_siril.system.read_int")
+    def test_memory_current_cgroup2(self, mock_read_int):
+        mock_read_int.side_effect = lambda path: 1024 if path == "/sys/fs/cgroup/memory.current" else None
+
+        assert container_memory_current() == 1024
+
+    @patch("async_siril.system.read_int")
+    def test_memory_current_cgroup1(self, mock_read_int):
+        mock_read_int.side_effect = lambda path: 2048 if path.endswith("memory.usage_in_bytes") else None
+
+        assert container_memory_current() == 2048
+
+    @patch("async_siril.system.read_int", return_value=None)
+    def test_memory_current_outside_cgroup(self, _read_int):
+        assert container_memory_current() is None